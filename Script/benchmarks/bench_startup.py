@@ -0,0 +1,124 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+'''
+界面启动耗时：各模块的导入耗时（-X importtime，新进程中测量取中位数）及带入的重依赖，
+以及到主窗口首次显示的时间（没有图形界面时跳过）；--save-baseline 保存基线供之后对比
+'''
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline_startup.json"
+MODULES = [
+    "gui_app", "cli_app", "download_module", "merge_module", "reload_module", "search_module",
+    "metadata_module", "remux_module", "process_module", "log_module"
+]
+HEAVY_MODULES = ["tkinter", "requests", "asyncio", "sqlite3", "concurrent.futures"]
+
+# 子进程：创建主窗口，第一次映射到屏幕时输出 perf_counter 后正常关闭
+FIRST_FRAME_CHILD = """
+import sys, time
+import tkinter as tk
+import gui_app
+root = tk.Tk()
+app = None
+def on_map(event):
+    if event.widget is root:
+        root.unbind("<Map>")
+        sys.stdout.write(repr(time.perf_counter()))
+        sys.stdout.flush()
+        root.after(0, app.on_close)
+root.bind("<Map>", on_map)
+app = gui_app.BilibiliToolkitGUI(root)
+root.mainloop()
+"""
+
+
+def _run(args):
+    return subprocess.run([sys.executable, *args], cwd=SCRIPT_DIR, capture_output=True,
+                          text=True, encoding="utf-8", errors="replace")
+
+
+def interpreter_startup(repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _run(["-c", "pass"])
+        samples.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(samples), 1)
+
+
+def import_cost(module, repeat):
+    """返回 {"ms": 累计导入耗时中位数, "pulls": 带入的重依赖}"""
+    samples = []
+    pulls = []
+    for _ in range(repeat):
+        proc = _run(["-X", "importtime", "-c", f"import {module}"])
+        if proc.returncode:
+            return {"error": (proc.stderr.strip().splitlines() or ["导入失败"])[-1]}
+        loaded = {}
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[0].startswith("import time:") and parts[1].strip().isdigit():
+                loaded[parts[2].strip()] = int(parts[1])
+        samples.append(loaded.get(module, 0) / 1000)
+        pulls = [name for name in HEAVY_MODULES if name in loaded and name != module]
+    return {"ms": round(statistics.median(samples), 2), "pulls": pulls}
+
+
+def first_frame(repeat):
+    """返回首帧时间中位数（毫秒），没有图形界面环境时返回 {"error": ...}"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = _run(["-c", FIRST_FRAME_CHILD])
+        try:
+            samples.append((float(proc.stdout.strip()) - start) * 1000)
+        except ValueError:
+            return {"error": (proc.stderr.strip().splitlines() or ["未输出首帧时间"])[-1]}
+    return {"ms": round(statistics.median(samples), 1)}
+
+
+def compare(results, baseline):
+    rows = {}
+    pairs = [("first_frame", results["first_frame"], baseline.get("first_frame", {}))]
+    pairs += [(name, cost, baseline.get("imports", {}).get(name, {})) for name, cost in results["imports"].items()]
+    for name, current, base in pairs:
+        if "ms" in current and base.get("ms"):
+            rows[name] = {"baseline_ms": base["ms"], "current_ms": current["ms"],
+                          "ratio": round(current["ms"] / base["ms"], 2)}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="界面启动耗时与各模块导入耗时")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--save-baseline", action="store_true", help=f"保存为基线（{BASELINE_PATH.name}）")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="对比的基线文件")
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "platform": sys.platform,
+        "interpreter_ms": interpreter_startup(args.repeat),
+        "imports": {module: import_cost(module, args.repeat) for module in args.modules},
+        "first_frame": first_frame(args.repeat)
+    }
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    elif baseline_path.exists():
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            results["compare"] = compare(results, json.load(f))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import merge_module
+from download_module import BilibiliDownloader
+from merge_module import merge_m4s_files, process_file
+from search_module import AdvancedSearchEngine
+
+from benchmarks import synthetic
+
+'''
+热点路径的合成数据基准：下载记录（records）、缓存目录索引（cache_index）、去前缀（process_file）与合并（merge）
+数据都写在临时目录，合并用 synthetic 中的假 ffmpeg，只测流程本身的开销
+结果为 JSON，--output 保存，--compare 与之前保存的结果逐项对比（ratio = 本次 / 之前）
+'''
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+SEARCH_KEYWORDS = {
+    "bvid_exact": None,     # 运行时取最后一条记录的 bvid
+    "title_common": "合成视频",
+    "title_rare": "视频4242 ",
+    "short": "集",
+    "miss": "不存在的关键词",
+}
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def git_commit():
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, timeout=10)
+    except Exception:
+        return None
+    return proc.stdout.strip() or None
+
+
+@contextmanager
+def isolated_records(tmp):
+    """让下载记录、缓存索引与搜索索引的共享实例使用 tmp 下的数据库，退出时关闭并还原"""
+    saved = (BilibiliDownloader.__dict__["_get_db_path"], BilibiliDownloader.__dict__["_get_record_path"])
+    db_path, record_path = Path(tmp) / "downloaded.db", Path(tmp) / "downloaded.txt"
+    BilibiliDownloader._get_db_path = staticmethod(lambda: db_path)
+    BilibiliDownloader._get_record_path = staticmethod(lambda: record_path)
+    BilibiliDownloader._store = BilibiliDownloader._cache_index = AdvancedSearchEngine._index = None
+    BilibiliDownloader._fingerprint_index = None
+    try:
+        yield record_path
+    finally:
+        if BilibiliDownloader._store is not None:
+            BilibiliDownloader._store.close()
+        BilibiliDownloader._store = BilibiliDownloader._cache_index = AdvancedSearchEngine._index = None
+        BilibiliDownloader._fingerprint_index = None
+        BilibiliDownloader._get_db_path, BilibiliDownloader._get_record_path = saved
+
+
+def bench_records(count, lookups):
+    with tempfile.TemporaryDirectory() as tmp, isolated_records(tmp) as record_path:
+        file_bytes = synthetic.make_record_file(record_path, count)
+        result = {
+            "records": count,
+            "legacy_file_bytes": file_bytes,
+            "legacy_import_s": timed(BilibiliDownloader.get_record_store),
+            "search_index_build_s": timed(AdvancedSearchEngine._get_index),
+        }
+
+        keywords = dict(SEARCH_KEYWORDS, bvid_exact=synthetic.bvid_for(count - 1))
+        search = {}
+        for name, keyword in keywords.items():
+            hits = []
+            elapsed = timed(lambda: hits.append(len(AdvancedSearchEngine.search_cache(keyword, None, tmp))))
+            search[name] = {"keyword": keyword, "s": elapsed, "hits": hits[-1]}
+        result["search_cache"] = search
+
+        rng = random.Random(count)
+        present = [synthetic.bvid_for(rng.randrange(count)) for _ in range(lookups)]
+        missing = [synthetic.bvid_for(count + rng.randrange(count)) for _ in range(lookups)]
+        result["is_downloaded_hit_us"] = timed(
+            lambda: [BilibiliDownloader.is_downloaded(bvid) for bvid in present]) / lookups * 1e6
+        result["is_downloaded_miss_us"] = timed(
+            lambda: [BilibiliDownloader.is_downloaded(bvid) for bvid in missing]) / lookups * 1e6
+
+        new = [(synthetic.bvid_for(count + i), str(synthetic.FIRST_FOLDER + count + i), synthetic.title_for(i))
+               for i in range(lookups)]
+        store = BilibiliDownloader.get_record_store()
+        start = time.perf_counter()
+        for bvid, folder, title in new:
+            BilibiliDownloader._record_download(bvid, folder, title)
+        result["record_download_us"] = (time.perf_counter() - start) / lookups * 1e6
+        result["record_flush_s"] = timed(store.flush)
+        return result
+
+
+def bench_cache_index(count, lookups):
+    with tempfile.TemporaryDirectory() as tmp, isolated_records(tmp):
+        cache_root = Path(tmp) / "cache"
+        folders = synthetic.make_cache_tree(cache_root, count)
+        rng = random.Random(count)
+        targets = [bvid for _, bvid in rng.sample(folders, min(lookups, count))]
+        lookup = BilibiliDownloader._get_cache_folder_name
+        return {
+            "folders": count,
+            "cold_s": timed(lambda: lookup(str(cache_root), folders[-1][1])),
+            "hit_us": timed(lambda: [lookup(str(cache_root), bvid) for bvid in targets]) / len(targets) * 1e6,
+            # 未命中时会增量刷新一次索引
+            "miss_s": timed(lambda: lookup(str(cache_root), synthetic.bvid_for(count)), repeat=3),
+        }
+
+
+def set_subfile(enabled):
+    os.environ["FAKE_FFMPEG_SUBFILE"] = "1" if enabled else "0"
+    merge_module.ffmpeg_supports_subfile.cache_clear()
+
+
+def bench_process_file(tmp, seconds, bitrate, repeat):
+    result = {}
+    for prefixed in (True, False):
+        folder = Path(tmp) / ("prefixed" if prefixed else "plain")
+        folder.mkdir()
+        video, _ = synthetic.make_m4s_pair(folder, 1, prefixed, seconds, bitrate)
+        for subfile in ((True, False) if prefixed else (True,)):
+            set_subfile(subfile)
+            merge_module.ffmpeg_supports_subfile()  # 探测结果有缓存，不计入
+            temp_files = []
+            elapsed = timed(lambda: process_file(str(video), temp_files), repeat)
+            for path in temp_files:
+                os.remove(path)
+            name = ("prefixed_" + ("subfile" if subfile else "temp_copy")) if prefixed else "plain"
+            result[name] = {"input_bytes": os.path.getsize(video), "s": elapsed}
+    return result
+
+
+def bench_merge(tmp, seconds, bitrate, repeat):
+    folder = Path(tmp) / "merge"
+    folder.mkdir()
+    video, audio = synthetic.make_m4s_pair(folder, 1, True, seconds, bitrate)
+    out_dir = Path(tmp) / "out"
+    result = {"input_bytes": os.path.getsize(video) + os.path.getsize(audio)}
+    for name, engine, subfile in (("ffmpeg_subfile", "ffmpeg", True), ("ffmpeg_temp_copy", "ffmpeg", False),
+                                  ("python", "python", False)):
+        set_subfile(subfile)
+        merge_module.ffmpeg_supports_subfile()
+        try:
+            result[name] = {"s": timed(lambda: merge_m4s_files([str(video), str(audio)], out_dir, name, engine=engine),
+                                       repeat)}
+        except Exception as e:
+            result[name] = {"error": str(e)}
+    return result
+
+
+def flatten(results, prefix=""):
+    """把嵌套结果展开为 {"a.b.c": 数值}，用于对比"""
+    flat = {}
+    for key, value in results.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(results, previous):
+    """只对比耗时类指标（_s / _us 结尾），其余数值（条数、字节数）用于确认两次的数据规模一致"""
+    current, before = flatten(results["benchmarks"]), flatten(previous.get("benchmarks", {}))
+    rows = {}
+    for key, value in current.items():
+        if not (key.endswith("_s") or key.endswith("_us") or key.endswith(".s")):
+            continue
+        if before.get(key):
+            rows[key] = {"before": before[key], "current": value, "ratio": round(value / before[key], 3)}
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载记录、缓存索引与合并热点路径的合成数据基准")
+    parser.add_argument("--records", type=int, nargs="+", default=[10_000, 100_000],
+                        help="downloaded.txt 行数（可加上 1000000）")
+    parser.add_argument("--folders", type=int, nargs="+", default=[1000, 10_000], help="缓存文件夹数")
+    parser.add_argument("--lookups", type=int, default=1000, help="单次查询类指标的调用次数")
+    parser.add_argument("--m4s-seconds", type=int, default=60, help="process_file / 合并用的合成 m4s 时长(秒)")
+    parser.add_argument("--m4s-kbps", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=["records", "cache_index", "process_file", "merge"])
+    parser.add_argument("-o", "--output", help="把结果保存为 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的结果对比")
+    args = parser.parse_args()
+    only = set(args.only or ["records", "cache_index", "process_file", "merge"])
+
+    benchmarks = {}
+    if "records" in only:
+        benchmarks["records"] = {str(count): bench_records(count, args.lookups) for count in args.records}
+    if "cache_index" in only:
+        benchmarks["cache_index"] = {str(count): bench_cache_index(count, args.lookups) for count in args.folders}
+    if only & {"process_file", "merge"}:
+        saved_path, saved_flag = os.environ.get("PATH", ""), os.environ.get("FAKE_FFMPEG_SUBFILE")
+        with tempfile.TemporaryDirectory() as tmp:
+            try:
+                synthetic.install_fake_ffmpeg(tmp)
+                bitrate = args.m4s_kbps * 1000
+                if "process_file" in only:
+                    benchmarks["process_file"] = bench_process_file(tmp, args.m4s_seconds, bitrate, args.repeat)
+                if "merge" in only:
+                    benchmarks["merge"] = bench_merge(tmp, args.m4s_seconds, bitrate, args.repeat)
+            except RuntimeError as e:
+                benchmarks["merge"] = {"error": str(e)}
+            finally:
+                os.environ["PATH"] = saved_path
+                if saved_flag is None:
+                    os.environ.pop("FAKE_FFMPEG_SUBFILE", None)
+                else:
+                    os.environ["FAKE_FFMPEG_SUBFILE"] = saved_flag
+                merge_module.ffmpeg_supports_subfile.cache_clear()
+
+    results = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "params": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "benchmarks": benchmarks,
+    }
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            results["compare"] = compare(results, json.load(f))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json
+import os
+import stat
+import sys
+from pathlib import Path
+
+from benchmarks.bench_remux import make_fragmented
+
+'''
+基准测试用的合成数据：电脑缓存目录树、旧格式的 downloaded.txt、只拼接输入的假 ffmpeg
+（FAKE_FFMPEG_SUBFILE=1 时声明支持 subfile 协议）；数据按序号确定生成，不同提交上的结果可以直接对比
+'''
+
+FIRST_FOLDER = 100000
+VIDEO_CODE = 30080
+AUDIO_CODE = 30280
+
+FAKE_FFMPEG = """\
+import os, shutil, sys
+args = sys.argv[1:]
+if '-protocols' in args:
+    print('Input:')
+    print('  file')
+    if os.environ.get('FAKE_FFMPEG_SUBFILE') == '1':
+        print('  subfile')
+    sys.exit(0)
+inputs = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '-i']
+with open(args[-1], 'wb') as out:
+    for spec in inputs:
+        offset = 0
+        if spec.startswith('subfile,'):
+            offset = int(spec.split(',start,', 1)[1].split(',', 1)[0])
+            spec = spec.split(':file:', 1)[1]
+        with open(spec, 'rb') as f:
+            f.seek(offset)
+            shutil.copyfileobj(f, out, 1024 * 1024)
+"""
+
+
+def bvid_for(i):
+    return f"BV1{i:09d}"
+
+
+def title_for(i):
+    return f"合成视频{i} 第{i % 7 + 1}集"
+
+
+def make_cache_tree(root, count, with_m4s=False, prefixed=True, seconds=1, bitrate=200_000):
+    """
+    在 root 下生成 count 个缓存文件夹，返回 [(folder, bvid)]
+    with_m4s 时每个文件夹写入一对合成 m4s（<cid>-1-<编码>.m4s），prefixed 决定是否带9个零前缀
+    """
+    root = Path(root)
+    folders = []
+    for i in range(count):
+        folder = root / str(FIRST_FOLDER + i)
+        folder.mkdir(parents=True, exist_ok=True)
+        bvid = bvid_for(i)
+        with open(folder / ".videoInfo", "w", encoding="utf-8") as f:
+            json.dump({"bvid": bvid, "groupTitle": title_for(i), "title": title_for(i)}, f, ensure_ascii=False)
+        if with_m4s:
+            make_m4s_pair(folder, i, prefixed, seconds, bitrate)
+        folders.append((folder, bvid))
+    return folders
+
+
+def make_m4s_pair(folder, cid, prefixed=True, seconds=1, bitrate=200_000):
+    """写入一对合成 m4s，返回 (视频路径, 音频路径)"""
+    video = Path(folder) / f"{cid}-1-{VIDEO_CODE}.m4s"
+    audio = Path(folder) / f"{cid}-1-{AUDIO_CODE}.m4s"
+    make_fragmented(video, 'vide', seconds, bitrate, prefix=prefixed)
+    make_fragmented(audio, 'soun', seconds, max(bitrate // 8, 8000), prefix=prefixed)
+    return video, audio
+
+
+def make_record_file(path, count):
+    """写入 count 行旧格式下载记录，返回文件大小（字节）"""
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        batch = []
+        for i in range(count):
+            folder = "网络" if i % 10 == 0 else str(FIRST_FOLDER + i)
+            batch.append(f"{bvid_for(i)}|{folder}|{title_for(i)}\n")
+            if len(batch) >= 10000:
+                f.write("".join(batch))
+                batch = []
+        f.write("".join(batch))
+    return os.path.getsize(path)
+
+
+def install_fake_ffmpeg(bin_dir):
+    """在 bin_dir 中写入假 ffmpeg 并放到 PATH 最前面（仅支持 POSIX），返回其路径"""
+    if os.name != "posix":
+        raise RuntimeError("假 ffmpeg 只支持 POSIX 系统")
+    path = Path(bin_dir) / "ffmpeg"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"#!{sys.executable}\n{FAKE_FFMPEG}")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+    return path
@@ -0,0 +1,327 @@
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+
+from config_module import load_config
+
+'''
+命令行入口（无界面，适合在服务器上运行）：在 Script 目录下执行
+    python -m cli_app download BV1xx411c7mD --quality 80
+    python -m cli_app reload --threads 4
+    python -m cli_app merge video.m4s audio.m4s -n 输出名
+    python -m cli_app merge --batch 缓存目录
+    python -m cli_app search 关键词
+    python -m cli_app records count|export|delete|rename
+标准输出每行一个 JSON 事件（progress/log/result 等），日志写到标准错误；
+--metrics 文件 在结束时写出各阶段耗时统计（.json 为 JSON 快照，其余为 Prometheus 文本格式）；
+--trace 文件 在结束时写出任务时间线（Chrome trace JSON，可在 ui.perfetto.dev 打开）；
+各子命令只在执行时才导入对应模块，不导入 tkinter
+退出码：0 成功，1 有任务失败，2 参数错误，130 被中断（Ctrl+C / SIGTERM，正在运行的子进程会被结束）
+'''
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+_emit_lock = threading.Lock()
+
+
+def emit(event, **fields):
+    """向标准输出写一行 JSON 事件（多线程安全）"""
+    line = json.dumps({"event": event, **fields}, ensure_ascii=False, default=str)
+    with _emit_lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def log(message):
+    emit("log", message=message)
+
+
+def run_stoppable(target, stop_event):
+    """
+    在工作线程中执行 target()，主线程等待；Ctrl+C 或 SIGTERM 时置位 stop_event 并等待工作线程收尾
+    返回 (target 的返回值, 是否被中断)
+    """
+    result = {}
+
+    def runner():
+        try:
+            result["value"] = target()
+        except BaseException as e:
+            result["error"] = e
+
+    if threading.current_thread() is threading.main_thread() and hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    thread = threading.Thread(target=runner, name="cli-worker", daemon=True)
+    thread.start()
+    while thread.is_alive():
+        try:
+            thread.join(0.2)
+        except KeyboardInterrupt:
+            stop_event.set()
+    if "error" in result:
+        raise result["error"]
+    return result.get("value"), stop_event.is_set()
+
+
+# ---------- 子命令 ----------
+
+def cmd_download(args, config):
+    from download_module import BilibiliDownloader
+
+    quality = args.quality or config.get('download_quality', 80)
+    output_dir = args.output or config.get('output_dir') or '.'
+    stop_event = threading.Event()
+
+    def task():
+        failed = 0
+        for url in args.urls:
+            if stop_event.is_set():
+                break
+            bvid = BilibiliDownloader._get_bvid_from_url(url)
+            if bvid and not args.force and BilibiliDownloader.is_downloaded(bvid):
+                emit("skipped", url=url, bvid=bvid, reason="already downloaded")
+                continue
+            emit("start", url=url, bvid=bvid)
+            ok = BilibiliDownloader.download_video(
+                url, quality, args.collection, output_dir, config.get('cache_root', ''),
+                config.get('sessdata', ''),
+                progress_callback=lambda p, url=url: emit("progress", url=url, percent=p),
+                log_callback=log,
+                stop_event=stop_event,
+                status_callback=lambda e, url=url: emit(
+                    "status", url=url, downloaded=e.downloaded, total=e.total, speed=e.speed,
+                    eta=e.eta, episode=e.episode, episodes=e.episodes
+                )
+            )
+            failed += not ok
+            emit("result", url=url, bvid=bvid, ok=ok)
+        return failed
+
+    failed, interrupted = run_stoppable(task, stop_event)
+    if interrupted:
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_reload(args, config):
+    from reload_module import CacheReloader
+
+    if args.cache_root:
+        config['cache_root'] = args.cache_root
+    if args.output:
+        config['output_dir'] = args.output
+    if args.duplicates:
+        config['duplicate_mode'] = args.duplicates
+    if args.device == "computer" and not config.get('cache_root'):
+        emit("error", message="未设置缓存目录（--cache-root 或配置文件中的 cache_root）")
+        return EXIT_USAGE
+    if args.device == "phone" and not args.phone_file:
+        emit("error", message="手机模式需要 --phone-file")
+        return EXIT_USAGE
+
+    stop_event = threading.Event()
+    reloader = CacheReloader(
+        config, stop_event,
+        progress_callback=lambda p: emit("progress", percent=p),
+        log_callback=log,
+        device_type=args.device,
+        phone_file=args.phone_file,
+        max_threads=args.threads or config.get('thread_count', 1)
+    )
+    _, interrupted = run_stoppable(
+        lambda: reloader.start_reload(args.quality or config.get('reload_quality', 80)), stop_event
+    )
+    emit("result", total=reloader.total, succeeded=reloader.succeeded,
+         skipped=reloader.skipped, failed=reloader.failed, duplicates=reloader.duplicates)
+    if interrupted:
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if reloader.failed else EXIT_OK
+
+
+def cmd_merge(args, config):
+    from merge_module import batch_merge, find_merge_pairs, merge_m4s_files
+
+    output_dir = args.output or config.get('output_dir') or '.'
+    stop_event = threading.Event()
+
+    if args.batch:
+        duplicate_mode = args.duplicates or config.get('duplicate_mode', 'link')
+
+        def task():
+            from download_module import BilibiliDownloader
+
+            pairs = find_merge_pairs(args.batch)
+            emit("found", total=len(pairs))
+            failed = 0
+            fingerprints = BilibiliDownloader.get_fingerprint_index() if duplicate_mode != "off" else None
+            results = batch_merge(pairs, output_dir, args.workers, stop_event, fingerprints, duplicate_mode)
+            for done, result in enumerate(results, 1):
+                failed += not result["ok"]
+                emit("result", done=done, total=len(pairs), **result)
+            return failed
+    else:
+        if len(args.files) != 2:
+            emit("error", message="需要一个视频文件和一个音频文件，或使用 --batch 目录")
+            return EXIT_USAGE
+
+        def task():
+            result = merge_m4s_files(
+                args.files, output_dir, args.name, stop_event=stop_event, engine=args.engine,
+                stage_callback=lambda stage: emit("stage", stage=stage)
+            )
+            emit("result", ok=True, **result)
+            return 0
+
+    try:
+        failed, interrupted = run_stoppable(task, stop_event)
+    except InterruptedError:
+        return EXIT_INTERRUPTED
+    except Exception as e:
+        emit("result", ok=False, error=str(e))
+        return EXIT_FAILED
+    if interrupted:
+        return EXIT_INTERRUPTED
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def cmd_search(args, config):
+    from search_module import RESULT_COLUMNS, AdvancedSearchEngine
+
+    count = 0
+    for batch in AdvancedSearchEngine.iter_search(
+        args.keyword, args.cache_root or config.get('cache_root', ''),
+        progress_callback=lambda p: emit("progress", percent=p)
+    ):
+        for row in batch:
+            emit("match", **dict(zip(RESULT_COLUMNS, row)))
+            count += 1
+            if args.limit and count >= args.limit:
+                emit("result", count=count, truncated=True)
+                return EXIT_OK
+    emit("result", count=count, truncated=False)
+    return EXIT_OK
+
+
+def cmd_records(args, config):
+    from download_module import BilibiliDownloader
+
+    store = BilibiliDownloader.get_record_store()
+    if args.action == "count":
+        emit("result", count=store.count())
+    elif args.action == "export":
+        emit("result", path=str(store.export_text(args.path)))
+    elif args.action == "delete":
+        deleted = store.delete_many(args.bvids)
+        emit("result", deleted=deleted)
+        return EXIT_OK if deleted == len(set(args.bvids)) else EXIT_FAILED
+    elif args.action == "rename":
+        if not store.update_title(args.bvid, args.title):
+            emit("result", ok=False, error=f"记录不存在：{args.bvid}")
+            return EXIT_FAILED
+        emit("result", ok=True, bvid=args.bvid, title=args.title)
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli_app", description="B站缓存工具箱命令行版")
+    parser.add_argument("--config", help="配置文件（默认与界面共用脚本目录下的 config.json）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="在标准错误输出详细日志")
+    parser.add_argument("--metrics", metavar="FILE", help="结束时写出各阶段耗时统计（.json 或 Prometheus 文本）")
+    parser.add_argument("--trace", metavar="FILE", help="结束时写出任务时间线（Chrome trace JSON）")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("download", help="用 yutto 下载视频")
+    p.add_argument("urls", nargs="+", help="视频链接或 BV/AV 号")
+    p.add_argument("-q", "--quality", type=int, help="画质代码，如 80=1080P")
+    p.add_argument("-b", "--collection", action="store_true", help="下载整个合集")
+    p.add_argument("-o", "--output", help="输出目录")
+    p.add_argument("--force", action="store_true", help="已有下载记录时也重新下载")
+    p.set_defaults(func=cmd_download)
+
+    p = commands.add_parser("reload", help="把缓存重载为 MP4（中断后再次执行会从断点继续）")
+    p.add_argument("--device", choices=["computer", "phone"], default="computer")
+    p.add_argument("--phone-file", help="手机导出的AV号列表文件")
+    p.add_argument("--cache-root", help="缓存目录（默认取配置文件）")
+    p.add_argument("-o", "--output", help="输出目录")
+    p.add_argument("-q", "--quality", type=int, help="画质代码")
+    p.add_argument("-t", "--threads", type=int, help="并发线程数")
+    p.add_argument("--duplicates", choices=["link", "skip", "off"],
+                   help="与已合并条目内容相同时：硬链接已有输出（默认）、跳过或照常合并")
+    p.set_defaults(func=cmd_reload)
+
+    p = commands.add_parser("merge", help="合并 m4s 视频与音频")
+    p.add_argument("files", nargs="*", help="视频 m4s 与音频 m4s")
+    p.add_argument("--batch", metavar="DIR", help="批量合并目录下的所有缓存条目")
+    p.add_argument("-o", "--output", help="输出目录")
+    p.add_argument("-n", "--name", help="输出文件名（不含扩展名）")
+    p.add_argument("--engine", choices=["auto", "ffmpeg", "python"], default="auto")
+    p.add_argument("-w", "--workers", type=int, help="批量合并的并发数")
+    p.add_argument("--duplicates", choices=["link", "skip", "off"],
+                   help="批量合并时与已合并条目内容相同：硬链接已有输出（默认）、跳过或照常合并")
+    p.set_defaults(func=cmd_merge)
+
+    p = commands.add_parser("search", help="搜索下载记录")
+    p.add_argument("keyword")
+    p.add_argument("--cache-root", help="缓存目录（用于显示路径）")
+    p.add_argument("--limit", type=int, default=0, help="最多输出的条数，0 为不限")
+    p.set_defaults(func=cmd_search)
+
+    p = commands.add_parser("records", help="管理下载记录")
+    actions = p.add_subparsers(dest="action", required=True)
+    actions.add_parser("count", help="记录条数")
+    export = actions.add_parser("export", help="导出为 bvid|folder|title 文本")
+    export.add_argument("path", nargs="?")
+    delete = actions.add_parser("delete", help="删除记录")
+    delete.add_argument("bvids", nargs="+")
+    rename = actions.add_parser("rename", help="修改标题")
+    rename.add_argument("bvid")
+    rename.add_argument("title")
+    p.set_defaults(func=cmd_records)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        stream=sys.stderr
+    )
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        emit("error", message=f"读取配置失败：{str(e)}")
+        return EXIT_USAGE
+    metrics_file = args.metrics or config.get('metrics_file')
+    trace_file = args.trace or config.get('trace_file')
+    if metrics_file:
+        from metrics_module import metrics
+        metrics.enable()
+    if trace_file:
+        from trace_module import tracer
+        tracer.enable()
+    try:
+        return args.func(args, config)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    finally:
+        if metrics_file:
+            try:
+                metrics.write(metrics_file)
+            except OSError as e:
+                logging.error(f"写入统计文件失败：{str(e)}")
+        if trace_file:
+            try:
+                tracer.write(trace_file)
+            except OSError as e:
+                logging.error(f"写入时间线文件失败：{str(e)}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import json
+import os
+from pathlib import Path
+
+'''
+配置文件读写（界面与命令行共用）
+config.json 固定放在脚本目录，不受启动时工作目录的影响；
+脚本目录下还没有配置文件时，读取旧版本写在当前工作目录下的 config.json
+'''
+
+CONFIG_PATH = Path(__file__).parent / "config.json"
+DEFAULT_CONFIG = {'cache_root': '', 'output_dir': '', 'sessdata': ''}
+
+
+def load_config(path=None):
+    config_path = Path(path) if path else CONFIG_PATH
+    if path is None and not config_path.exists() and Path("config.json").exists():
+        config_path = Path("config.json")
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return {**DEFAULT_CONFIG, **json.load(f)}
+    return dict(DEFAULT_CONFIG)
+
+
+def save_config(config, path=None):
+    """先写临时文件再替换，写入中途崩溃不会留下半个配置文件"""
+    config_path = Path(path) if path else CONFIG_PATH
+    tmp = config_path.with_name(config_path.name + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp, config_path)
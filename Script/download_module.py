@@ -1,39 +1,484 @@
-import subprocess
 import threading
 import logging
-import requests
 from pathlib import Path
 import re
 import os
 import json
+import time
+import sqlite3
+import atexit
 from urllib.parse import unquote
 from datetime import datetime
 
+from av import extract_bvid
+from metadata_module import get_default_client
+from metrics_module import metrics
+from trace_module import tracer
+from process_module import run_process
+
 download_logger = logging.getLogger('DownloadModule')
 
+
+class DownloadRecordStore:
+    """
+    下载记录存储（SQLite），替代对 downloaded.txt 的整文件扫描
+    - bvid 为唯一键，查询为索引查找
+    - 写入先进入缓冲区，按批次/时间间隔合并提交（一次提交一次 fsync）
+    - WAL 模式 + busy_timeout，支持多线程、多进程同时写入
+    - 首次使用时自动导入旧的 bvid|folder|title 文本记录
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bvid TEXT NOT NULL UNIQUE,
+            folder TEXT NOT NULL,
+            title TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_path, legacy_path=None, batch_size=64, commit_interval=0.5):
+        self.db_path = Path(db_path)
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
+        self._lock = threading.RLock()
+        self._pending = {}
+        self._timer = None
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(self.SCHEMA)
+        self._import_legacy()
+        atexit.register(self.close)
+
+    def _get_meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def _import_legacy(self):
+        """导入旧文本记录中尚未导入的部分（按已导入的字节偏移增量读取）"""
+        if not self.legacy_path or not self.legacy_path.exists():
+            return
+        with self._lock:
+            size = self.legacy_path.stat().st_size
+            offset = int(self._get_meta("legacy_offset", 0))
+            if size == offset:
+                return
+            if size < offset:
+                # 文件被外部重写，重新整体导入（已存在的 bvid 保持不变）
+                offset = 0
+            rows = []
+            with open(self.legacy_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # 只导入完整的行，末尾未写完的行留到下次
+            end = data.rfind(b"\n") + 1
+            for raw in data[:end].splitlines():
+                parts = raw.decode("utf-8", errors="ignore").strip().split("|")
+                if len(parts) == 3 and parts[0]:
+                    rows.append(tuple(parts))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO records (bvid, folder, title) VALUES (?, ?, ?)", rows
+                )
+                self._set_meta("legacy_offset", offset + end)
+            if rows:
+                download_logger.info(f"已导入旧下载记录 {len(rows)} 条")
+
+    def add(self, bvid, folder, title):
+        """写入记录（已存在的 bvid 忽略），返回是否为新记录"""
+        if not bvid:
+            return False
+        with self._lock:
+            if bvid in self._pending or self._exists_committed(bvid):
+                return False
+            self._pending[bvid] = (bvid, folder, title)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.commit_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return True
+
+    def flush(self):
+        """将缓冲区中的记录在一个事务中提交"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return
+            rows = list(self._pending.values())
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO records (bvid, folder, title) VALUES (?, ?, ?)", rows
+                )
+            self._pending.clear()
+
+    def _exists_committed(self, bvid):
+        return self._conn.execute("SELECT 1 FROM records WHERE bvid = ?", (bvid,)).fetchone() is not None
+
+    def contains(self, bvid):
+        with self._lock:
+            return bvid in self._pending or self._exists_committed(bvid)
+
+    def get(self, bvid):
+        """返回 (bvid, folder, title)，不存在时返回 None"""
+        with self._lock:
+            if bvid in self._pending:
+                return self._pending[bvid]
+            return self._conn.execute(
+                "SELECT bvid, folder, title FROM records WHERE bvid = ?", (bvid,)
+            ).fetchone()
+
+    def iter_records(self):
+        """按写入顺序遍历所有记录"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute("SELECT bvid, folder, title FROM records ORDER BY id").fetchall()
+        return iter(rows)
+
+    def count(self):
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def update_titles(self, titles):
+        """
+        批量修改标题：titles 为 {bvid: 新标题}，按 bvid 精确匹配（唯一索引），
+        全部修改在一个事务中提交，中途失败则全部回滚；返回实际修改的条数
+        """
+        self.flush()
+        with self._lock, self._conn:
+            return self._conn.executemany(
+                "UPDATE records SET title = ? WHERE bvid = ?", [(title, bvid) for bvid, title in titles.items()]
+            ).rowcount
+
+    def delete_many(self, bvids):
+        """批量删除（单个事务，按 bvid 精确匹配），返回实际删除的条数"""
+        self.flush()
+        with self._lock, self._conn:
+            return self._conn.executemany(
+                "DELETE FROM records WHERE bvid = ?", [(bvid,) for bvid in set(bvids)]
+            ).rowcount
+
+    def update_title(self, bvid, title):
+        return self.update_titles({bvid: title}) > 0
+
+    def delete(self, bvid):
+        return self.delete_many([bvid]) > 0
+
+    def export_text(self, path=None):
+        """导出为 bvid|folder|title 文本（供直接查看），默认覆盖旧记录文件"""
+        target = Path(path) if path else self.legacy_path
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for bvid, folder, title in self.iter_records():
+                f.write(f"{bvid}|{folder}|{title}\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, target)
+        if target == self.legacy_path:
+            with self._lock, self._conn:
+                self._set_meta("legacy_offset", target.stat().st_size)
+        return target
+
+    def close(self):
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self.flush()
+            finally:
+                self._conn.close()
+                self._conn = None
+
+
+class CacheFolderIndex:
+    """
+    缓存目录的 bvid -> 文件夹 反向索引（持久化在记录数据库中）
+    - 每个目录记录其 mtime 和子目录列表；刷新时只重新列出 mtime 变化的目录，
+      只解析变化过的数字文件夹中的 .videoInfo
+    - 查询走 bvid 索引，不再遍历缓存目录
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cache_dirs (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            subdirs TEXT NOT NULL,
+            bvid TEXT
+        );
+        CREATE INDEX IF NOT EXISTS cache_dirs_bvid ON cache_dirs (bvid);
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    @staticmethod
+    def _root_key(cache_root):
+        return os.path.abspath(cache_root)
+
+    @staticmethod
+    def _read_bvid(folder):
+        info_file = os.path.join(folder, ".videoInfo")
+        if not os.path.basename(folder).isdigit() or not os.path.isfile(info_file):
+            return None
+        try:
+            with open(info_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("bvid")
+        except Exception as e:
+            download_logger.warning(f"解析失败: {str(e)}")
+            return None
+
+    def refresh(self, cache_root):
+        """增量刷新 cache_root 下的索引，返回重新扫描的目录数"""
+        root = self._root_key(cache_root)
+        with self._lock:
+            known = {
+                path: (mtime_ns, subdirs)
+                for path, mtime_ns, subdirs in self._conn.execute(
+                    "SELECT path, mtime_ns, subdirs FROM cache_dirs WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (root, len(root) + 1, os.path.join(root, ""))
+                )
+            }
+
+        seen = set()
+        updates = []
+        stack = [root]
+        while stack:
+            path = stack.pop()
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            seen.add(path)
+            cached = known.get(path)
+            if cached and cached[0] == mtime_ns:
+                subdirs = json.loads(cached[1])
+            else:
+                try:
+                    with os.scandir(path) as it:
+                        subdirs = [e.name for e in it if e.is_dir(follow_symlinks=False)]
+                except OSError as e:
+                    download_logger.warning(f"读取目录失败: {str(e)}")
+                    continue
+                updates.append((path, mtime_ns, json.dumps(subdirs, ensure_ascii=False), self._read_bvid(path)))
+            stack.extend(os.path.join(path, name) for name in subdirs)
+
+        removed = [(path,) for path in known if path not in seen]
+        if updates or removed:
+            with self._lock, self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO cache_dirs VALUES (?, ?, ?, ?)", updates)
+                self._conn.executemany("DELETE FROM cache_dirs WHERE path = ?", removed)
+        return len(updates)
+
+    def iter_folders(self, cache_root):
+        """返回 cache_root 下所有带 .videoInfo 的数字文件夹 (路径, bvid)，按路径排序"""
+        root = self._root_key(cache_root)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT path, bvid FROM cache_dirs WHERE bvid IS NOT NULL AND (path = ? OR substr(path, 1, ?) = ?) "
+                "ORDER BY path",
+                (root, len(root) + 1, os.path.join(root, ""))
+            ).fetchall()
+
+    def lookup(self, cache_root, bvid):
+        """返回 bvid 对应的缓存文件夹路径，未收录时返回 None"""
+        root = self._root_key(cache_root)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path FROM cache_dirs WHERE bvid = ? AND (path = ? OR substr(path, 1, ?) = ?) "
+                "ORDER BY path LIMIT 1",
+                (bvid, root, len(root) + 1, os.path.join(root, ""))
+            ).fetchone()
+        return row[0] if row else None
+
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+SIZE_UNITS = {
+    "Bytes": 1, "B": 1,
+    "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3, "TiB": 1024 ** 4,
+    "KB": 1000, "MB": 1000 ** 2, "GB": 1000 ** 3, "TB": 1000 ** 4,
+}
+_SIZE = r"([\d.]+)\s*(Bytes|B|[KMGT]i?B)"
+# yutto 的进度行：[文件名] 进度条 已下载/总大小 速度/s（速度很快时后缀为 /⚡）
+YUTTO_PROGRESS_PATTERN = re.compile(
+    rf"^(?P<label>.*?)[\s━╸]*{_SIZE}\s*/\s*{_SIZE}\s+{_SIZE}\s*(?:/s|/⚡|⚡/s)"
+)
+# 批量模式：「列表里共检测到 N 项」与每一项开始时的「[i/N]」标记
+YUTTO_BATCH_TOTAL_PATTERN = re.compile(r"共检测到\s*(\d+)\s*项")
+YUTTO_BATCH_ITEM_PATTERN = re.compile(r"\[(\d+)/(\d+)\]")
+# yutto 超过这么多秒没有任何输出时视为卡死并终止
+DOWNLOAD_IDLE_TIMEOUT = 600
+# 写入日志的 stderr 最大字符数（完整的末尾部分仍用于判断错误原因）
+STDERR_LOG_CHARS = 2000
+
+
+def _parse_size(value, unit):
+    return int(float(value) * SIZE_UNITS[unit])
+
+
+class ProgressEvent:
+    """一次下载进度：当前分P的已下载/总字节数、速度（字节/秒），以及批量模式下的分P序号"""
+
+    def __init__(self, downloaded, total, speed, episode=1, episodes=1):
+        self.downloaded = downloaded
+        self.total = total
+        self.speed = speed
+        self.episode = episode
+        self.episodes = episodes
+
+    @property
+    def percent(self):
+        """整体进度（0-100），批量模式下按分P数平均分配"""
+        fraction = min(1.0, self.downloaded / self.total) if self.total else 0.0
+        episodes = max(1, self.episodes)
+        return (min(self.episode, episodes) - 1 + fraction) / episodes * 100
+
+    @property
+    def eta(self):
+        """剩余秒数；批量模式下其余分P按当前分P的大小估算，速度未知时为 None"""
+        if not self.speed:
+            return None
+        remaining = max(0, self.total - self.downloaded)
+        remaining += self.total * max(0, self.episodes - self.episode)
+        return remaining / self.speed
+
+
+class YuttoProgressParser:
+    """
+    把 yutto 的输出逐行解析为 ProgressEvent
+    yutto 为每个正在下载的文件（视频流、音频流）各显示一行进度，按文件名分别记录后汇总；
+    批量模式下遇到新的「[i/N]」时切换到下一个分P
+    """
+
+    def __init__(self):
+        self.episode = 1
+        self.episodes = 1
+        self._items = {}
+        # 已完成的分P累计下载的字节数
+        self._finished_bytes = 0
+
+    @property
+    def downloaded(self):
+        """到目前为止下载的总字节数（含已完成的分P）"""
+        return self._finished_bytes + sum(item[0] for item in self._items.values())
+
+    def feed(self, line):
+        """解析一行输出，是进度行时返回 ProgressEvent，否则返回 None（调用方照常输出日志）"""
+        line = ANSI_ESCAPE.sub("", line).strip()
+        match = YUTTO_PROGRESS_PATTERN.search(line)
+        if not match:
+            total_match = YUTTO_BATCH_TOTAL_PATTERN.search(line)
+            if total_match:
+                self.episodes = int(total_match.group(1))
+            item_match = YUTTO_BATCH_ITEM_PATTERN.search(line)
+            if item_match:
+                self.episode, self.episodes = int(item_match.group(1)), int(item_match.group(2))
+                self._finished_bytes = self.downloaded
+                self._items.clear()
+            return None
+
+        label = match.group("label").strip()
+        downloaded = _parse_size(match.group(2), match.group(3))
+        total = _parse_size(match.group(4), match.group(5))
+        speed = _parse_size(match.group(6), match.group(7))
+        self._items[label] = (downloaded, total, speed)
+
+        items = self._items.values()
+        return ProgressEvent(
+            downloaded=sum(item[0] for item in items),
+            total=sum(item[1] for item in items),
+            speed=sum(item[2] for item in items if item[0] < item[1]),
+            episode=self.episode,
+            episodes=self.episodes
+        )
+
+
+class ProgressReporter:
+    """
+    合并进度更新：最多每 interval 秒回调一次，百分比只增不减且下载结束前不超过99
+    （progress_callback(100) 表示下载结束，由 download_video 在完成时调用）
+    """
+
+    def __init__(self, progress_callback, status_callback=None, interval=0.25):
+        self.progress_callback = progress_callback
+        self.status_callback = status_callback
+        self.interval = interval
+        self._last_emit = 0.0
+        self._percent = 0
+        self._pending = None
+
+    def update(self, event):
+        self._pending = event
+        now = time.monotonic()
+        if now - self._last_emit >= self.interval:
+            self._last_emit = now
+            self._emit()
+
+    def flush(self):
+        if self._pending is not None:
+            self._emit()
+
+    def _emit(self):
+        event, self._pending = self._pending, None
+        percent = min(99, int(event.percent))
+        if percent > self._percent:
+            self._percent = percent
+            self.progress_callback(percent)
+        if self.status_callback:
+            self.status_callback(event)
+
+
 class BilibiliDownloader:
+    _store = None
+    _store_lock = threading.Lock()
+    _cache_index = None
+    _fingerprint_index = None
+
     @staticmethod
     def _get_bvid_from_url(url: str) -> str:
+        # 只给出AV号时在本地换算为BV号，不再请求API
         match = re.search(r"BV[0-9A-Za-z]{10}", url)
-        return match.group(0) if match else ""
+        return match.group(0) if match else extract_bvid(url)
 
     @staticmethod
     def _get_record_path():
         return Path(__file__).parent / "downloaded.txt"
 
+    @staticmethod
+    def _get_db_path():
+        return Path(__file__).parent / "downloaded.db"
+
+    @staticmethod
+    def get_record_store() -> DownloadRecordStore:
+        """获取进程内共享的下载记录存储"""
+        with BilibiliDownloader._store_lock:
+            if BilibiliDownloader._store is None:
+                BilibiliDownloader._store = DownloadRecordStore(
+                    BilibiliDownloader._get_db_path(),
+                    legacy_path=BilibiliDownloader._get_record_path()
+                )
+            return BilibiliDownloader._store
+
     @staticmethod
     def _record_download(bvid: str, folder_name: str, title: str):
-        record_file = BilibiliDownloader._get_record_path()
         try:
-            if not record_file.exists():
-                record_file.touch(mode=0o666, exist_ok=True)
-            with open(record_file, "r", encoding="utf-8", errors="ignore") as f:
-                existing = f.read()
-                if bvid and bvid not in existing:
-                    with open(record_file, "a", encoding="utf-8") as f:
-                        f.write(f"{bvid}|{folder_name}|{title}\n")
-                        os.fsync(f.fileno())
-                        download_logger.info(f"成功记录视频号: {bvid}, 存储方式: {folder_name}, 标题: {title}")
+            if BilibiliDownloader.get_record_store().add(bvid, folder_name, title):
+                download_logger.info(f"成功记录视频号: {bvid}, 存储方式: {folder_name}, 标题: {title}")
         except Exception as e:
             download_logger.error(f"记录失败: {str(e)}")
 
@@ -49,35 +494,25 @@ class BilibiliDownloader:
 
     @staticmethod
     def is_downloaded(bvid: str) -> bool:
-        record_file = BilibiliDownloader._get_record_path()
         try:
-            with open(record_file, "r", encoding="utf-8") as f:
-                return bvid in f.read()
-        except FileNotFoundError:
-            return False
+            return BilibiliDownloader.get_record_store().contains(bvid)
         except Exception as e:
             download_logger.error(f"读取失败: {str(e)}")
             return False
 
     @staticmethod
     def _get_bilibili_title(bvid: str) -> str:
-        url = f"https://api.bilibili.com/x/web-interface/view?bvid={bvid}"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            if data.get("code") == 0:
-                return data["data"]["title"]
-            download_logger.warning(f"API返回错误: {data}")
-        except Exception as e:
-            download_logger.error(f"获取标题失败: {str(e)}")
-        return "未知标题"
+        # 共享连接池 + 缓存，同一 bvid 重复调用不会再次请求
+        return get_default_client().get_title(bvid)
 
     @staticmethod
-    def download_video(url, quality, is_collection, output_dir, cache_root, sessdata, progress_callback, log_callback, stop_event):
+    def download_video(url, quality, is_collection, output_dir, cache_root, sessdata, progress_callback, log_callback, stop_event,
+                       status_callback=None):
+        """
+        调用 yutto 下载；进度行解析为 ProgressEvent，合并后驱动 progress_callback(百分比)，
+        status_callback(event) 可取得速度（event.speed，字节/秒）与剩余时间（event.eta，秒）
+        其余输出原样写入日志，下载成功后调用 progress_callback(100)；返回是否下载成功
+        """
         if "%" in sessdata:
             sessdata = unquote(sessdata)
             log_callback("检测到URL编码的SESSDATA，已自动解码")
@@ -98,43 +533,47 @@ class BilibiliDownloader:
         success = False
         title = "未知标题"
 
-        try:
-            proc = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                encoding='utf-8',
-                text=True,
-                bufsize=1
-            )
+        parser = YuttoProgressParser()
+        reporter = ProgressReporter(progress_callback, status_callback)
 
-            while True:
-                if stop_event.is_set():
-                    log_callback("用户中止下载")
-                    proc.terminate()
-                    break
-
-                line = proc.stdout.readline()
-                if not line and proc.poll() is not None:
-                    break
+        def on_stdout(line):
+            if not line.strip():
+                return
+            event = parser.feed(line)
+            if event is not None:
+                reporter.update(event)
+            else:
+                log_callback(f"[下载进度] {ANSI_ESCAPE.sub('', line).strip()}")
 
-                if line:
-                    log_callback(f"[下载进度] {line.strip()}")
+        try:
+            with metrics.stage("yutto") as stage:
+                result = run_process(cmd, on_stdout=on_stdout, stop_event=stop_event, idle_timeout=DOWNLOAD_IDLE_TIMEOUT)
+                stage.add_bytes(parser.downloaded)
+                stage.set(bvid=bvid, pid=result.pid, returncode=result.returncode)
+                if not result.ok:
+                    stage.fail()
+            metrics.record_stage("yutto_spawn", result.spawn_duration)
+            reporter.flush()
 
-            stderr = proc.stderr.read()
+            stderr = result.stderr_tail.strip()
             if stderr:
-                log_callback(f"[错误详情] {stderr}")
+                log_callback(f"[错误详情] {stderr[-STDERR_LOG_CHARS:]}")
                 if "Session expired" in stderr:
                     log_callback("错误：SESSDATA已过期！")
                 elif "404" in stderr:
                     log_callback("错误：视频不存在！")
 
-            if proc.returncode == 0:
+            if result.cancelled:
+                log_callback("用户中止下载")
+            elif result.timed_out:
+                log_callback(f"下载超时：超过 {DOWNLOAD_IDLE_TIMEOUT} 秒没有输出，已终止")
+                BilibiliDownloader._log_error(bvid, title, "下载超时")
+            elif result.returncode == 0:
                 log_callback("下载成功完成")
                 success = True
             else:
-                log_callback(f"下载失败，错误码：{proc.returncode}")
-                BilibiliDownloader._log_error(bvid, title, f"错误码: {proc.returncode}")
+                log_callback(f"下载失败，错误码：{result.returncode}")
+                BilibiliDownloader._log_error(bvid, title, f"错误码: {result.returncode}")
 
         except Exception as e:
             error_msg = f"致命错误：{str(e)}"
@@ -149,29 +588,345 @@ class BilibiliDownloader:
                     progress_callback(100)
                 except Exception:
                     pass
+        return success
+
+    @staticmethod
+    def get_cache_index() -> CacheFolderIndex:
+        """获取进程内共享的缓存目录索引"""
+        BilibiliDownloader.get_record_store()
+        with BilibiliDownloader._store_lock:
+            if BilibiliDownloader._cache_index is None:
+                BilibiliDownloader._cache_index = CacheFolderIndex(BilibiliDownloader._get_db_path())
+            return BilibiliDownloader._cache_index
+
+    @staticmethod
+    def get_fingerprint_index():
+        """获取进程内共享的合并指纹索引（merge_module.FingerprintIndex）"""
+        from merge_module import FingerprintIndex
+
+        BilibiliDownloader.get_record_store()
+        with BilibiliDownloader._store_lock:
+            if BilibiliDownloader._fingerprint_index is None:
+                BilibiliDownloader._fingerprint_index = FingerprintIndex(BilibiliDownloader._get_db_path())
+            return BilibiliDownloader._fingerprint_index
 
     @staticmethod
     def _get_cache_folder_name(cache_root: str, bvid: str) -> str:
-        cache_dir = Path(cache_root)
-        for entry in cache_dir.glob("**/.videoInfo"):
-            folder = entry.parent
-            if not folder.name.isdigit():
-                continue
-            try:
-                with open(entry, "r", encoding="utf-8") as f:
-                    info = json.load(f)
-                    if info.get("bvid") == bvid:
-                        return folder.name
-            except Exception as e:
-                download_logger.warning(f"解析失败: {str(e)}")
-        return "未知文件夹"
+        index = BilibiliDownloader.get_cache_index()
+        folder = index.lookup(cache_root, bvid)
+        if folder is None or not os.path.isdir(folder):
+            # 未命中时增量刷新一次（只重新扫描有变化的目录）
+            index.refresh(cache_root)
+            folder = index.lookup(cache_root, bvid)
+        return os.path.basename(folder) if folder else "未知文件夹"
 
     @staticmethod
-    def start_download(url, quality, is_collection, output_dir, cache_root, sessdata, progress_callback, log_callback, stop_event):
+    def start_download(url, quality, is_collection, output_dir, cache_root, sessdata, progress_callback, log_callback, stop_event,
+                       status_callback=None):
         thread = threading.Thread(
             target=BilibiliDownloader.download_video,
-            args=(url, quality, is_collection, output_dir, cache_root, sessdata, progress_callback, log_callback, stop_event),
+            args=(url, quality, is_collection, output_dir, cache_root, sessdata, progress_callback, log_callback, stop_event,
+                  status_callback),
             daemon=True
         )
         thread.start()
         return thread
+
+
+class RateLimiter:
+    """令牌桶限速：平均每秒 rate 次，最多连续 burst 次；rate 不大于 0 时不限速；所有下载线程共用一个实例"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate) if rate and rate > 0 else 0.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """取得一个令牌，必要时等待；stop_event 置位时放弃并返回 False"""
+        if not self.rate:
+            return stop_event is None or not stop_event.is_set()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop_event is not None:
+                if stop_event.wait(min(wait, 0.5)):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class DownloadQueue:
+    """
+    持久化的下载队列（与下载记录同一个数据库）
+    - workers 个下载线程按优先级（大的优先）、入队顺序取任务
+    - 每个任务启动 yutto 前先经过全局限速器，避免短时间内大量请求B站接口
+    - 入队时跳过已下载的 bvid 和已在队列中的 bvid
+    - 每个任务有独立的停止事件，可单独取消；状态为 queued/running/done/failed/cancelled
+    - 程序退出时仍在运行的任务，下次启动时重新排队
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS download_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            url TEXT NOT NULL,
+            bvid TEXT,
+            quality INTEGER NOT NULL,
+            is_collection INTEGER NOT NULL,
+            output_dir TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS download_jobs_pending ON download_jobs (status, priority, id);
+    """
+    ACTIVE = ("queued", "running")
+    COLUMNS = "id, url, bvid, quality, is_collection, output_dir, priority, status, error"
+
+    def __init__(self, db_path, config, workers=2, rate=0.5, burst=2, log_callback=None, on_update=None):
+        self.config = config
+        self.workers = max(1, int(workers))
+        self.limiter = RateLimiter(rate, burst)
+        self.log_callback = log_callback or download_logger.info
+        self.on_update = on_update
+        self._cond = threading.Condition()
+        self._stop_events = {}
+        self._progress = {}
+        self._threads = []
+        self._closing = False
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        with self._conn:
+            self._conn.execute("UPDATE download_jobs SET status = 'queued' WHERE status = 'running'")
+
+    def _row_to_job(self, row):
+        job = dict(zip(("id", "url", "bvid", "quality", "is_collection", "output_dir", "priority", "status", "error"), row))
+        job["is_collection"] = bool(job["is_collection"])
+        job.update(self._progress.get(job["id"], {"percent": 0, "speed": 0, "eta": None}))
+        return job
+
+    def _set_status(self, job_id, status, error=None):
+        with self._cond, self._conn:
+            self._conn.execute(
+                "UPDATE download_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id)
+            )
+        self._notify(job_id)
+
+    def _notify(self, job_id):
+        if self.on_update:
+            job = self.get(job_id)
+            if job:
+                self.on_update(job)
+
+    # ---------- 任务管理 ----------
+
+    def enqueue(self, url, quality, is_collection=False, output_dir=None, priority=0):
+        """加入队列，返回任务ID；bvid 已下载或已在队列中时返回 None"""
+        bvid = BilibiliDownloader._get_bvid_from_url(url)
+        if bvid and BilibiliDownloader.is_downloaded(bvid):
+            self.log_callback(f"已下载过，跳过：{bvid}")
+            return None
+        with self._cond:
+            if bvid and self._conn.execute(
+                "SELECT 1 FROM download_jobs WHERE bvid = ? AND status IN (?, ?)", (bvid, *self.ACTIVE)
+            ).fetchone():
+                self.log_callback(f"已在下载队列中，跳过：{bvid}")
+                return None
+            now = time.time()
+            with self._conn:
+                job_id = self._conn.execute(
+                    "INSERT INTO download_jobs (url, bvid, quality, is_collection, output_dir, priority,"
+                    " status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (url, bvid or None, int(quality), int(bool(is_collection)),
+                     output_dir or self.config.get('output_dir', ''), int(priority), now, now)
+                ).lastrowid
+            self._cond.notify()
+        self._notify(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        """取消任务：排队中的直接取消，运行中的终止 yutto；返回是否取消成功"""
+        with self._cond:
+            row = self._conn.execute("SELECT status FROM download_jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row or row[0] not in self.ACTIVE:
+                return False
+            stop_event = self._stop_events.get(job_id)
+            if stop_event is not None:
+                stop_event.set()
+                return True
+        self._set_status(job_id, "cancelled")
+        return True
+
+    def cancel_all(self):
+        with self._cond:
+            job_ids = [row[0] for row in self._conn.execute(
+                "SELECT id FROM download_jobs WHERE status IN (?, ?)", self.ACTIVE
+            )]
+        for job_id in job_ids:
+            self.cancel(job_id)
+
+    def set_priority(self, job_id, priority):
+        with self._cond, self._conn:
+            self._conn.execute("UPDATE download_jobs SET priority = ? WHERE id = ?", (int(priority), job_id))
+        self._notify(job_id)
+
+    def clear_finished(self):
+        """删除已结束（完成、失败、取消）的任务"""
+        with self._cond, self._conn:
+            self._conn.execute("DELETE FROM download_jobs WHERE status NOT IN (?, ?)", self.ACTIVE)
+
+    def get(self, job_id):
+        with self._cond:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM download_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            return self._row_to_job(row) if row else None
+
+    def jobs(self, statuses=None):
+        """按优先级与入队顺序列出任务"""
+        query = f"SELECT {self.COLUMNS} FROM download_jobs"
+        params = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' * len(statuses))})"
+            params = tuple(statuses)
+        with self._cond:
+            rows = self._conn.execute(query + " ORDER BY priority DESC, id", params).fetchall()
+            return [self._row_to_job(row) for row in rows]
+
+    def counts(self):
+        with self._cond:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM download_jobs GROUP BY status"))
+
+    # ---------- 执行 ----------
+
+    def start(self):
+        with self._cond:
+            self._closing = False
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._worker, name=f"download-{len(self._threads) + 1}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def set_workers(self, workers):
+        """调整同时下载数；减少时多出的线程在完成当前任务后退出"""
+        with self._cond:
+            self.workers = max(1, int(workers))
+            self._cond.notify_all()
+        if not self._closing:
+            self.start()
+
+    def _claim(self):
+        """取出优先级最高的排队任务并标记为运行中；关闭或线程数超出设置时返回 None"""
+        with self._cond:
+            while not self._closing:
+                alive = [t for t in self._threads if t.is_alive()]
+                if len(alive) > self.workers:
+                    self._threads.remove(threading.current_thread())
+                    return None
+                row = self._conn.execute(
+                    f"SELECT {self.COLUMNS} FROM download_jobs WHERE status = 'queued'"
+                    " ORDER BY priority DESC, id LIMIT 1"
+                ).fetchone()
+                if row:
+                    with self._conn:
+                        self._conn.execute(
+                            "UPDATE download_jobs SET status = 'running', updated_at = ? WHERE id = ?",
+                            (time.time(), row[0])
+                        )
+                    self._stop_events[row[0]] = threading.Event()
+                    return self._row_to_job(row)
+                self._cond.wait()
+        return None
+
+    def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                return
+            self._notify(job["id"])
+            self._run(job)
+
+    def _run(self, job):
+        job_id = job["id"]
+        stop_event = self._stop_events[job_id]
+
+        # 进度由下载线程写入、由其他线程在锁内读取，写入时同样持有锁
+        def on_progress(percent):
+            with self._cond:
+                self._progress.setdefault(job_id, {}).update(percent=percent)
+            self._notify(job_id)
+
+        def on_status(event):
+            with self._cond:
+                self._progress[job_id] = {"percent": int(event.percent), "speed": event.speed, "eta": event.eta}
+            self._notify(job_id)
+
+        status, error = "failed", None
+        try:
+            with tracer.span("rate_limit", "download", job=job_id):
+                acquired = self.limiter.acquire(stop_event)
+            if not acquired:
+                status = "queued" if self._closing else "cancelled"
+                return
+            self.log_callback(f"[任务{job_id}] 开始下载：{job['url']}")
+            success = BilibiliDownloader.download_video(
+                url=job["url"],
+                quality=job["quality"],
+                is_collection=job["is_collection"],
+                output_dir=job["output_dir"],
+                cache_root=self.config.get('cache_root', ''),
+                sessdata=self.config.get('sessdata', ''),
+                progress_callback=on_progress,
+                log_callback=lambda msg: self.log_callback(f"[任务{job_id}] {msg}"),
+                stop_event=stop_event,
+                status_callback=on_status
+            )
+            if success:
+                status = "done"
+            elif stop_event.is_set():
+                # 退出程序时被终止的任务重新排队，用户取消的任务标记为已取消
+                status = "queued" if self._closing else "cancelled"
+        except Exception as e:
+            error = str(e)
+            download_logger.exception(f"下载任务 {job_id} 出错")
+        finally:
+            # 结束（完成、失败、取消或重新排队）的任务不再保留实时进度
+            with self._cond:
+                self._stop_events.pop(job_id, None)
+                self._progress.pop(job_id, None)
+            self._set_status(job_id, status, error)
+
+    def stop(self, cancel_running=True, timeout=None):
+        """停止下载线程；cancel_running 时同时终止正在运行的任务（下次启动时重新排队）"""
+        with self._cond:
+            self._closing = True
+            if cancel_running:
+                for stop_event in self._stop_events.values():
+                    stop_event.set()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def close(self):
+        """停止下载线程并关闭数据库；超时后仍有线程未退出时不关闭连接，留给它们写回任务状态"""
+        self.stop(timeout=5)
+        alive = [thread.name for thread in self._threads if thread.is_alive()]
+        if alive:
+            download_logger.warning(f"下载线程未能在超时内退出（{', '.join(alive)}），暂不关闭下载队列数据库")
+            return
+        with self._cond:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,54 +1,181 @@
 import tkinter as tk
 from tkinter import ttk, scrolledtext, filedialog, messagebox, simpledialog
-import json
 import logging
 import os
-import queue
 import threading
 import sys
-import subprocess
 from pathlib import Path
 from datetime import datetime
 
-from download_module import BilibiliDownloader
-from merge_module import merge_m4s_files
-from reload_module import CacheReloader
-from search_module import AdvancedSearchEngine
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+from config_module import load_config, save_config
+from log_module import GUI_MODULE, LOG_MODULES, LOG_SPILL_FILE, LOG_VIEW_LINES, LogSink, LogSinkHandler, LogView
 
+# 下载、合并、重载、搜索模块在第一次用到时才导入（见各方法内的 import），窗口先显示出来
+SCRIPT_DIR = Path(__file__).parent
 
-class GUIHandler(logging.Handler):
-    def __init__(self, log_queue: queue.Queue):
-        super().__init__()
-        self.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        self.log_queue = log_queue
 
-    def emit(self, record):
-        log_entry = self.format(record)
-        try:
-            self.log_queue.put_nowait(log_entry)
-        except queue.Full:
-            pass
+def setup_logging():
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(SCRIPT_DIR / 'app.log', encoding='utf-8'),
+            logging.StreamHandler()
+        ]
+    )
 
 
 class AppLogger:
     @classmethod
-    def setup(cls, log_queue: queue.Queue):
-        gui_handler = GUIHandler(log_queue)
+    def setup(cls, log_sink: LogSink):
+        gui_handler = LogSinkHandler(log_sink)
         for name in ['DownloadModule', 'ReloadModule', 'SearchModule']:
             logger = logging.getLogger(name)
             logger.addHandler(gui_handler)
             logger.propagate = False
 
 
+class VirtualResultView:
+    """
+    虚拟化的结果列表：Treeview 中只保留可见的行（加少量余量），滚动时按偏移量重新填充；
+    滚动条按 store 的总行数换算，选中状态按 store 行号保存，排序、删除后依然有效
+    """
+    MARGIN = 5
+    HEADER_HEIGHT = 25
+
+    def __init__(self, parent, store, headings):
+        self.store = store
+        self.headings = headings  # {列名: (标题, 宽度)}，顺序与 store 的列一致
+        self.offset = 0
+        self.cursor = None
+        self.selected = set()
+        self._clicked = False
+        self._click_extends = False
+
+        frame = ttk.Frame(parent)
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(frame, columns=list(headings), show="headings", selectmode="extended")
+        self.scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        for name, (text, width) in headings.items():
+            self.tree.heading(name, text=text, command=lambda n=name: self.sort_by(n))
+            self.tree.column(name, width=width)
+
+        self.tree.bind("<Configure>", lambda e: self.refresh())
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Button-1>", self._on_click)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<Up>", lambda e: self._move(-1))
+        self.tree.bind("<Down>", lambda e: self._move(1))
+        self.tree.bind("<Prior>", lambda e: self._move(-self._visible_rows()))
+        self.tree.bind("<Next>", lambda e: self._move(self._visible_rows()))
+        self.tree.bind("<Home>", lambda e: self._move(-len(self.store)))
+        self.tree.bind("<End>", lambda e: self._move(len(self.store)))
+
+    def _visible_rows(self):
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        return max(1, (self.tree.winfo_height() - self.HEADER_HEIGHT) // row_height)
+
+    def refresh(self):
+        """按当前偏移量重新填充可见窗口"""
+        total = len(self.store)
+        visible = self._visible_rows()
+        self.offset = max(0, min(self.offset, total - visible))
+        rows = self.store.window(self.offset, self.offset + visible + self.MARGIN)
+        self.tree.delete(*self.tree.get_children())
+        for row_id, values in rows:
+            self.tree.insert('', 'end', iid=str(row_id), values=values)
+        self.tree.selection_set([str(row_id) for row_id, _ in rows if row_id in self.selected])
+        self.tree.yview_moveto(0)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll(self, rows):
+        self.offset += rows
+        self.refresh()
+        return "break"
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.offset = int(float(value) * len(self.store))
+        elif action == "scroll":
+            self.offset += int(value) * (self._visible_rows() if unit == "pages" else 1)
+        self.refresh()
+
+    def _on_click(self, event):
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return
+        # 按住 Shift/Ctrl 点击时保留窗口外已选中的行
+        self._clicked = True
+        self._click_extends = bool(event.state & 0x0005)
+        row = self.tree.identify_row(event.y)
+        if row:
+            self.cursor = self.offset + self.tree.index(row)
+
+    def _on_select(self, event):
+        # 只响应鼠标点击引起的选择变化，refresh 中恢复选中状态产生的事件忽略
+        if not self._clicked:
+            return
+        self._clicked = False
+        window = {int(row) for row in self.tree.get_children()}
+        chosen = {int(row) for row in self.tree.selection()}
+        if self._click_extends:
+            self.selected = (self.selected - window) | chosen
+        else:
+            self.selected = chosen
+
+    def _move(self, delta):
+        total = len(self.store)
+        if total:
+            pos = 0 if self.cursor is None else max(0, min(total - 1, self.cursor + delta))
+            self.cursor = pos
+            self.selected = {self.store.row_id_at(pos)}
+            visible = self._visible_rows()
+            if pos < self.offset:
+                self.offset = pos
+            elif pos >= self.offset + visible:
+                self.offset = pos - visible + 1
+            self.refresh()
+        return "break"
+
+    def sort_by(self, column):
+        """点击列标题排序，再次点击同一列倒序"""
+        reverse = self.store.sort_column == column and not self.store.sort_reverse
+        self.store.sort(column, reverse)
+        self._update_headings()
+        self.cursor = None
+        self.refresh()
+
+    def _update_headings(self):
+        for name, (text, _) in self.headings.items():
+            if name == self.store.sort_column:
+                text += " ▼" if self.store.sort_reverse else " ▲"
+            self.tree.heading(name, text=text)
+
+    def selection(self):
+        """选中行的 store 行号，按当前显示顺序"""
+        return [row_id for row_id in self.store.ordered() if row_id in self.selected]
+
+    def remove(self, row_ids):
+        self.store.remove(row_ids)
+        self.selected.difference_update(row_ids)
+        self.cursor = None
+        self.refresh()
+
+    def clear(self):
+        self.store.clear()
+        self.selected.clear()
+        self.offset = 0
+        self.cursor = None
+        self._update_headings()
+        self.refresh()
+
+
 class BilibiliToolkitGUI:
     QUALITY_OPTIONS = [
         ("8K", 127), ("4K", 126), ("1080P60", 125),
@@ -59,20 +186,49 @@ class BilibiliToolkitGUI:
     def __init__(self, root):
         self.bilibilio_url = '感觉不错的话就充个电支持一下吧~'
         self.root = root
-        self.config = self.load_config()
-        self.log_queue = queue.Queue(maxsize=200)
-        self.download_stop_event = threading.Event()
+        self.config = load_config()
+        self.log_sink = LogSink(spill_path=SCRIPT_DIR / LOG_SPILL_FILE)
         self.reload_stop_event = threading.Event()
+        self.merge_stop_event = threading.Event()
         self.current_reloader = None
-        self.download_running = False
         self.reload_running = False
+        self.search_generation = 0
+        self.search_result_count = 0
+        # 配置了 metrics_file / trace_file 时统计各阶段耗时、记录任务时间线，关闭窗口时写出（相对路径相对于脚本目录）
+        self.metrics_file = self.config.get('metrics_file')
+        if self.metrics_file:
+            from metrics_module import metrics
+            metrics.enable()
+        self.trace_file = self.config.get('trace_file')
+        if self.trace_file:
+            from trace_module import tracer
+            tracer.enable()
         self.setup_donation_links()
 
         self.setup_ui()
-        AppLogger.setup(self.log_queue)
-        self.start_log_poller()
+        AppLogger.setup(self.log_sink)
+        self.log_sink.attach(self.root, self.log_view.write)
+        self.download_queue = None
+        # 队列列表中每个任务的 (状态, 百分比)，整体进度的各项计数随任务更新按差值增减，不遍历列表
+        self.download_jobs = {}
+        self.download_totals = {"total": 0, "percent": 0, "done": 0, "running": 0, "queued": 0}
+        # 下载队列（恢复上次未完成的任务）在窗口显示之后再启动
+        self.root.after_idle(self.start_download_queue)
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
+    def start_download_queue(self):
+        from download_module import BilibiliDownloader, DownloadQueue
+
+        self.download_queue = DownloadQueue(
+            BilibiliDownloader._get_db_path(), self.config,
+            workers=self.config.get('download_workers', 2),
+            log_callback=lambda msg: self.log_message(msg, "DownloadModule"),
+            on_update=lambda job: self.root.after(0, self.update_download_job, job)
+        )
+        for job in self.download_queue.jobs():
+            self.update_download_job(job)
+        self.download_queue.start()
+
     def setup_donation_links(self):
         """在所有页面添加赞助链接"""
         bilibili_uid = "504668072"  # 例如：12345678
@@ -125,8 +281,19 @@ class BilibiliToolkitGUI:
 
         log_frame = ttk.LabelFrame(self.root, text="操作日志")
         log_frame.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
+        filter_frame = ttk.Frame(log_frame)
+        filter_frame.pack(fill=tk.X)
+        ttk.Label(filter_frame, text="显示模块:").pack(side=tk.LEFT)
+        self.log_filter_var = tk.StringVar(value="全部")
+        log_filter = ttk.Combobox(filter_frame, textvariable=self.log_filter_var,
+                                  values=["全部", *LOG_MODULES], state="readonly", width=16)
+        log_filter.pack(side=tk.LEFT, padx=5)
+        log_filter.bind("<<ComboboxSelected>>", lambda e: self.log_view.set_filter(
+            None if self.log_filter_var.get() == "全部" else self.log_filter_var.get()))
+        ttk.Label(filter_frame, text="（只显示最近的日志，完整记录见 operation.log）").pack(side=tk.LEFT)
         self.log_text = scrolledtext.ScrolledText(log_frame, state='disabled')
         self.log_text.pack(fill=tk.BOTH, expand=True)
+        self.log_view = LogView(self.log_text, max_lines=self.config.get('log_view_lines', LOG_VIEW_LINES))
 
     def setup_download_tab(self, notebook):
         tab = ttk.Frame(notebook)
@@ -146,25 +313,49 @@ class BilibiliToolkitGUI:
         )
         quality_combo.grid(row=1, column=1, padx=5, sticky='w')
 
+        option_frame = ttk.Frame(frame)
+        option_frame.grid(row=2, column=1, sticky='w')
         self.collection_var = tk.BooleanVar()
-        ttk.Checkbutton(frame, text="下载合集", variable=self.collection_var).grid(row=2, column=1, sticky='w')
+        ttk.Checkbutton(option_frame, text="下载合集", variable=self.collection_var).pack(side=tk.LEFT)
+        ttk.Label(option_frame, text="同时下载:").pack(side=tk.LEFT, padx=(15, 5))
+        self.download_workers_var = tk.IntVar(value=self.config.get('download_workers', 2))
+        workers_combo = ttk.Combobox(
+            option_frame, textvariable=self.download_workers_var,
+            values=[1, 2, 3, 4], state="readonly", width=4
+        )
+        workers_combo.pack(side=tk.LEFT)
+        workers_combo.bind("<<ComboboxSelected>>",
+                           lambda e: self.download_queue and self.download_queue.set_workers(self.download_workers_var.get()))
 
         self.download_progress = ttk.Progressbar(frame, orient="horizontal", mode="determinate", length=400)
         self.download_progress.grid(row=3, column=0, columnspan=2, pady=10)
 
         btn_frame = ttk.Frame(frame)
         btn_frame.grid(row=4, column=0, columnspan=2, pady=5)
-        self.download_btn = ttk.Button(btn_frame, text="开始下载", command=self.start_download)
+        self.download_btn = ttk.Button(btn_frame, text="加入下载队列", command=self.start_download)
         self.download_btn.pack(side=tk.LEFT, padx=5)
-        self.stop_download_btn = ttk.Button(btn_frame, text="停止下载", command=self.stop_download, state="disabled")
+        ttk.Button(btn_frame, text="取消所选", command=self.cancel_selected_downloads).pack(side=tk.LEFT, padx=5)
+        self.stop_download_btn = ttk.Button(btn_frame, text="全部取消", command=self.stop_download)
         self.stop_download_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="清除已结束", command=self.clear_finished_downloads).pack(side=tk.LEFT, padx=5)
+        self.download_status_var = tk.StringVar()
+        ttk.Label(btn_frame, textvariable=self.download_status_var).pack(side=tk.LEFT, padx=5)
+
+        self.download_tree = ttk.Treeview(
+            frame, columns=("id", "url", "status", "progress", "speed"), show="headings", height=6
+        )
+        for column, text, width in (("id", "任务", 50), ("url", "视频", 320), ("status", "状态", 80),
+                                    ("progress", "进度", 60), ("speed", "速度 / 剩余", 160)):
+            self.download_tree.heading(column, text=text)
+            self.download_tree.column(column, width=width, anchor='w' if column == "url" else 'center')
+        self.download_tree.grid(row=5, column=0, columnspan=2, pady=5, sticky='ew')
         self.add_donation_link(tab)
 
         text_frame = ttk.Frame(frame)
         text_frame.grid(row=6, column=1, columnspan=5, pady=5)
         ttk.Label(
             text_frame,
-            text="注意：AV号下载的视频有可能下载失败或者合并失败(导致视频大小为0)，\n可以去B站找到正确的BV号(原因可能是AV号获取BV号使用的B站API接口\n问题导致的不一致，但是都能正常访问)，合并错误只会在操作日志中显示",
+            text="注意：AV号下载的视频有可能下载失败或者合并失败(导致视频大小为0)，\n可以去B站找到对应的BV号后重试(AV号在本地换算为BV号，不再经过B站接口)，\n合并错误只会在操作日志中显示",
             foreground="red"
         ).grid(row=2, column=0, columnspan=3, padx=5)
 
@@ -242,7 +433,7 @@ class BilibiliToolkitGUI:
         text_frame.grid(row=6, column=1, columnspan=5, pady=5)
         ttk.Label(
             text_frame,
-            text="注意：AV号下载的视频有可能下载失败或者合并失败(导致视频大小为0)，\n可以去B站找到正确的BV号(原因可能是AV号获取BV号使用的B站API接口\n问题导致的不一致，但是都能正常访问)，合并错误只会在操作日志中显示",
+            text="注意：AV号下载的视频有可能下载失败或者合并失败(导致视频大小为0)，\n可以去B站找到对应的BV号后重试(AV号在本地换算为BV号，不再经过B站接口)，\n合并错误只会在操作日志中显示",
             foreground="red"
         ).grid(row=2, column=0, columnspan=3, padx=5)
 
@@ -301,7 +492,7 @@ class BilibiliToolkitGUI:
         self.merge_filename_entry.insert(0, "自定义名称")
         ttk.Label(
             output_frame,
-            text="注意，会生成临时文件，合并完成后会清除掉（因为电脑缓存的m4s文件头会多九个0）",
+            text="注意：电脑缓存的m4s文件头会多九个0，合并时会自动跳过（ffmpeg不支持时才生成临时文件，合并完成后清除）",
             foreground="red"
         ).grid(row=2, column=0, columnspan=3, padx=5)
 
@@ -315,6 +506,30 @@ class BilibiliToolkitGUI:
         )
         self.merge_btn.pack(side=tk.LEFT, padx=10)
 
+        # 批量合并：按目录自动配对音视频
+        batch_frame = ttk.LabelFrame(main_frame, text="批量合并")
+        batch_frame.pack(fill=tk.X, pady=5)
+
+        ttk.Label(batch_frame, text="缓存目录:").grid(row=0, column=0, padx=5, sticky='w')
+        self.batch_dir_entry = ttk.Entry(batch_frame, width=50)
+        self.batch_dir_entry.grid(row=0, column=1, padx=5)
+        ttk.Button(
+            batch_frame,
+            text="浏览",
+            command=lambda: self.select_dir(self.batch_dir_entry)
+        ).grid(row=0, column=2, padx=5)
+        self.batch_merge_btn = ttk.Button(batch_frame, text="批量合并", command=self.start_batch_merge)
+        self.batch_merge_btn.grid(row=0, column=3, padx=5)
+        self.stop_batch_merge_btn = ttk.Button(batch_frame, text="停止", command=self.stop_batch_merge,
+                                               state="disabled")
+        self.stop_batch_merge_btn.grid(row=0, column=4, padx=5)
+        ttk.Label(
+            batch_frame,
+            text="会扫描目录下所有子文件夹，自动识别每个缓存条目的视频和音频，输出到上方的输出目录",
+            foreground="gray"
+        ).grid(row=1, column=0, columnspan=5, padx=5, sticky='w')
+        self.batch_dir_entry.insert(0, self.config.get('cache_root', ''))
+
         self.merge_status = ttk.Label(main_frame, text="准备就绪", foreground="gray")
         self.merge_status.pack()
 
@@ -363,21 +578,21 @@ class BilibiliToolkitGUI:
         self.search_progress = ttk.Progressbar(frame, orient="horizontal", mode="determinate")
         self.search_progress.pack(fill=tk.X, pady=5)
 
-        self.search_results = ttk.Treeview(frame, columns=("title", "path", "bvid"), show="headings")
-        self.search_results.heading("title", text="视频标题")
-        self.search_results.heading("path", text="原缓存路径")
-        self.search_results.heading("bvid", text="BV号")
-        self.search_results.column("title", width=400)
-        self.search_results.column("path", width=300)
-        self.search_results.column("bvid", width=100)
-        self.search_results.pack(fill=tk.BOTH, expand=True)
+        from search_module import SearchResultStore
+
+        self.search_store = SearchResultStore()
+        self.search_view = VirtualResultView(frame, self.search_store, {
+            "title": ("视频标题", 400),
+            "path": ("原缓存路径", 300),
+            "bvid": ("BV号", 100)
+        })
         self.add_donation_link(tab)
 
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="打开文件夹", command=self.open_selected_folder)
         self.context_menu.add_command(label="重命名标题", command=self.rename_title)
         self.context_menu.add_command(label="删除记录", command=self.delete_record)
-        self.search_results.bind("<Button-3>", self.show_context_menu)
+        self.search_view.tree.bind("<Button-3>", self.show_context_menu)
 
     def setup_settings_tab(self, notebook):
         tab = ttk.Frame(notebook)
@@ -419,13 +634,9 @@ class BilibiliToolkitGUI:
         self.add_donation_link(tab)
 
     def start_download(self):
-        if self.download_running:
-            messagebox.showwarning("警告", "当前有下载任务正在运行")
-            return
-
-        self.download_stop_event.clear()
-        url = self.url_entry.get().strip()
-        if not url:
+        """把输入框中的链接（可用空格分隔多个）加入下载队列"""
+        urls = self.url_entry.get().split()
+        if not urls:
             messagebox.showerror("错误", "请输入视频URL")
             return
 
@@ -437,20 +648,19 @@ class BilibiliToolkitGUI:
             return
 
         quality = next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.quality_var.get())
-
-        self.download_running = True
-        BilibiliDownloader.start_download(
-            url=url,
-            quality=quality,
-            is_collection=self.collection_var.get(),
-            output_dir=self.config['output_dir'],
-            cache_root=self.config['cache_root'],
-            sessdata=self.config['sessdata'],
-            progress_callback=self.update_download_progress,
-            log_callback=self.log_message,
-            stop_event=self.download_stop_event
-        )
-        self.toggle_buttons(self.download_btn, self.stop_download_btn, False)
+        if self.download_queue is None:
+            self.start_download_queue()
+
+        added = 0
+        for url in urls:
+            job_id = self.download_queue.enqueue(
+                url, quality,
+                is_collection=self.collection_var.get(),
+                output_dir=self.config['output_dir']
+            )
+            added += job_id is not None
+        self.log_message(f"已加入下载队列 {added} 个，跳过 {len(urls) - added} 个")
+        self.url_entry.delete(0, tk.END)
 
     def start_merge(self):
         # 获取文件路径和输出目录
@@ -468,7 +678,7 @@ class BilibiliToolkitGUI:
             return
 
         # 开启后台线程执行合并
-        threading.Thread(target=self._do_merge, args=(video_path, audio_path, output_dir, filename)).start()
+        threading.Thread(target=self._do_merge, args=(video_path, audio_path, output_dir, filename), name="merge").start()
 
     def _do_merge(self, video_path, audio_path, output_dir, filename):
         try:
@@ -490,8 +700,13 @@ class BilibiliToolkitGUI:
 
             # 调用合并
             self.log_message("开始合并中，请稍候...")
-            merged_path = merge_m4s_files([video_path, audio_path], output_dir, filename)
+            from merge_module import merge_m4s_files
 
+            result = merge_m4s_files([video_path, audio_path], output_dir, filename)
+            merged_path = result["output"]
+
+            audio_mode = "直接复制" if result["audio_mode"] == "copy" else "转码为AAC"
+            self.log_message(f"视频编码：{result['video_codec']}，音频编码：{result['audio_codec']}（{audio_mode}），合并方式：{result['engine']}")
             self.log_message(f"合并成功：{merged_path}")
             self._set_merge_ui_state(text=f"✓ 合并完成：{Path(merged_path).name}", color="green")
             messagebox.showinfo("成功", f"文件已保存到：\n{merged_path}")
@@ -502,18 +717,74 @@ class BilibiliToolkitGUI:
         finally:
             self._set_merge_ui_state(disabled=False)
 
+    def start_batch_merge(self):
+        source_dir = self.batch_dir_entry.get().strip()
+        output_dir = self.merge_output_entry.get().strip()
+        if not source_dir or not os.path.isdir(source_dir):
+            messagebox.showwarning("提示", "请选择存在的缓存目录")
+            return
+        if not output_dir:
+            messagebox.showwarning("提示", "请填写输出目录")
+            return
+
+        # 每次批量合并使用新的停止事件，上一次停止后尚未退出的线程不会被"复活"
+        self.merge_stop_event = threading.Event()
+        self.batch_merge_btn.config(state="disabled")
+        self.stop_batch_merge_btn.config(state="normal")
+        threading.Thread(target=self._do_batch_merge, args=(source_dir, output_dir, self.merge_stop_event),
+                         name="batch-merge", daemon=True).start()
+
+    def stop_batch_merge(self):
+        """只发出停止信号：不再开始新条目，正在运行的 ffmpeg 被终止；线程退出后再恢复按钮"""
+        self.merge_stop_event.set()
+        self.stop_batch_merge_btn.config(state="disabled")
+        self.log_message("正在停止批量合并...")
+
+    def _do_batch_merge(self, source_dir, output_dir, stop_event):
+        def set_status(text, color):
+            self.root.after(0, lambda: self.merge_status.config(text=text, foreground=color))
+
+        try:
+            set_status("正在扫描...", "blue")
+            from download_module import BilibiliDownloader
+            from merge_module import batch_merge, find_merge_pairs
+
+            pairs = find_merge_pairs(source_dir)
+            total = len(pairs)
+            self.log_message(f"批量合并：找到 {total} 个缓存条目")
+            done = failed = 0
+            duplicate_mode = self.config.get('duplicate_mode', 'link')
+            fingerprints = BilibiliDownloader.get_fingerprint_index() if duplicate_mode != "off" else None
+            for result in batch_merge(pairs, output_dir, stop_event=stop_event,
+                                      fingerprints=fingerprints, duplicate_mode=duplicate_mode):
+                done += 1
+                if result["duplicate_of"]:
+                    action = f"已硬链接：{result['output']}" if result["output"] else "已跳过"
+                    self.log_message(f"[{done}/{total}] 与已合并的 {result['duplicate_of']} 内容相同，{action}")
+                elif result["ok"]:
+                    self.log_message(f"[{done}/{total}] 合并成功：{result['output']}（音频 {result['audio_codec']}：{result['audio_mode']}）")
+                else:
+                    failed += 1
+                    self.log_message(f"[{done}/{total}] 合并失败：{result['folder']}：{result['error']}")
+                set_status(f"批量合并中：{done}/{total}", "blue")
+            if stop_event.is_set():
+                set_status(f"批量合并已停止：成功 {done - failed}，失败 {failed}，未处理 {total - done}", "gray")
+            else:
+                set_status(f"✓ 批量合并完成：成功 {done - failed}，失败 {failed}", "green" if not failed else "red")
+        except Exception as e:
+            set_status("批量合并失败", "red")
+            self.log_message(f"批量合并错误：{str(e)}")
+        finally:
+            def reset_buttons():
+                self.batch_merge_btn.config(state="normal")
+                self.stop_batch_merge_btn.config(state="disabled")
+            self.root.after(0, reset_buttons)
+
     def _set_merge_ui_state(self, disabled=False, text="准备就绪", color="gray"):
         self.merge_btn.config(state="disabled" if disabled else "normal")
         self.merge_status.config(text=text, foreground=color)
         self.root.update_idletasks()
 
-    def log_message(self, message):
-        # 假设你有一个tk.Text控件self.log_box
-        self.log_box.config(state='normal')
-        self.log_box.insert(tk.END, message + "\n")
-        self.log_box.see(tk.END)
-        self.log_box.config(state='disabled')
-
     def _set_merge_ui_state(self, disabled=False, text="准备就绪", color="gray"):
         """统一更新合并界面状态"""
         self.merge_btn.config(state="disabled" if disabled else "normal")
@@ -533,19 +804,80 @@ class BilibiliToolkitGUI:
         self.toggle_reload_buttons(True)
         self.reload_running = False
 
-    def update_download_progress(self, value):
-        self.download_progress['value'] = value
-        if value >= 100:
-            self.root.after(100, lambda: self.download_progress.configure(value=0))
-            self.toggle_buttons(self.download_btn, self.stop_download_btn, True)
-            self.download_running = False
-        self.root.update_idletasks()
+    @staticmethod
+    def _format_size(size):
+        for unit in ("B", "KiB", "MiB", "GiB"):
+            if size < 1024 or unit == "GiB":
+                return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+            size /= 1024
+
+    DOWNLOAD_STATUS_LABELS = {
+        "queued": "排队中", "running": "下载中", "done": "已完成", "failed": "失败", "cancelled": "已取消"
+    }
+
+    def update_download_job(self, job):
+        """刷新队列列表中的一个任务，并汇总整体进度"""
+        if job["status"] == "running" and job["speed"]:
+            speed = f"{self._format_size(job['speed'])}/s"
+            if job["eta"] is not None:
+                minutes, seconds = divmod(int(job["eta"]), 60)
+                speed += f"，{minutes:02d}:{seconds:02d}"
+        else:
+            speed = ""
+        percent = 100 if job["status"] == "done" else job["percent"]
+        values = (job["id"], job["bvid"] or job["url"], self.DOWNLOAD_STATUS_LABELS.get(job["status"], job["status"]),
+                  f"{percent}%", speed)
+        iid = str(job["id"])
+        if self.download_tree.exists(iid):
+            self.download_tree.item(iid, values=values)
+        else:
+            self.download_tree.insert("", tk.END, iid=iid, values=values)
+
+        self._track_download_job(job["id"], (job["status"], int(percent)))
+        self._show_download_totals()
+
+    def _track_download_job(self, job_id, state):
+        """
+        记录任务的 (状态, 百分比)，state 为 None 时移除
+        整体进度：已完成计100%，排队中计0，失败和取消的不计入；先减去旧状态的计数再加上新状态的
+        """
+        totals = self.download_totals
+        for sign, entry in ((-1, self.download_jobs.pop(job_id, None)), (1, state)):
+            if entry is None or entry[0] not in ("done", "running", "queued"):
+                continue
+            status, percent = entry
+            totals["total"] += sign
+            totals["percent"] += sign * percent
+            totals[status] += sign
+        if state is not None:
+            self.download_jobs[job_id] = state
+
+    def _show_download_totals(self):
+        totals = self.download_totals
+        self.download_progress['value'] = totals["percent"] / totals["total"] if totals["total"] else 0
+        running, queued = totals["running"], totals["queued"]
+        self.download_status_var.set(f"下载中 {running}，排队 {queued}" if running or queued else "")
+
+    def cancel_selected_downloads(self):
+        if self.download_queue is None:
+            return
+        for iid in self.download_tree.selection():
+            self.download_queue.cancel(int(iid))
+
+    def clear_finished_downloads(self):
+        if self.download_queue is None:
+            return
+        self.download_queue.clear_finished()
+        finished = [job_id for job_id, (status, _) in self.download_jobs.items() if status not in ("queued", "running")]
+        for job_id in finished:
+            self._track_download_job(job_id, None)
+            if self.download_tree.exists(str(job_id)):
+                self.download_tree.delete(str(job_id))
+        self._show_download_totals()
 
     def stop_download(self):
-        self.download_stop_event.set()
-        self.toggle_buttons(self.download_btn, self.stop_download_btn, True)
-        self.download_progress['value'] = 0
-        self.download_running = False
+        if self.download_queue is not None:
+            self.download_queue.cancel_all()
 
     def start_reload(self):
         if self.reload_running:
@@ -562,9 +894,12 @@ class BilibiliToolkitGUI:
                 messagebox.showerror("错误", "选择的文件不存在")
                 return
 
-        self.reload_stop_event.clear()
+        # 每次重载使用新的停止事件：上一次重载停止后即使还没完全退出，也不会被这次重载"复活"
+        self.reload_stop_event = threading.Event()
         quality = next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.reload_quality_var.get())
 
+        from reload_module import CacheReloader
+
         self.reload_running = True
         self.current_reloader = CacheReloader(
             config=self.config,
@@ -579,6 +914,7 @@ class BilibiliToolkitGUI:
         reload_thread = threading.Thread(
             target=self.current_reloader.start_reload,
             args=(quality,),
+            name="reload-main",
             daemon=True
         )
         reload_thread.start()
@@ -591,6 +927,7 @@ class BilibiliToolkitGUI:
         self.root.update_idletasks()
 
     def update_reload_progress(self, value):
+        """重载线程结束时（finally 中）才会上报 100，此时才允许开始下一次重载"""
         self.reload_progress['value'] = value
         if value >= 100:
             self.toggle_reload_buttons(True)
@@ -598,12 +935,12 @@ class BilibiliToolkitGUI:
         self.root.update_idletasks()
 
     def stop_reload(self):
+        """只发出停止信号，等重载线程退出（上报 100）后再恢复按钮"""
         self.reload_stop_event.set()
         if self.current_reloader:
             self.current_reloader.stop_reload()
-        self.toggle_reload_buttons(True)
-        self.reload_progress['value'] = 0
-        self.reload_running = False
+        self.stop_reload_btn.config(state="disabled")
+        logging.getLogger('ReloadModule').info("正在停止重载，等待进行中的任务结束...")
 
     def start_search(self):
         keyword = self.search_entry.get().strip()
@@ -612,29 +949,42 @@ class BilibiliToolkitGUI:
             return
 
         self.search_progress['value'] = 0
-        self.search_results.delete(*self.search_results.get_children())
+        self.search_view.clear()
+        # 新搜索开始后，旧搜索线程产出的批次直接丢弃
+        self.search_generation += 1
+        self.search_result_count = 0
+        generation = self.search_generation
 
         def search_task():
+            from search_module import AdvancedSearchEngine
+
             try:
-                results = AdvancedSearchEngine.search_cache(
-                    keyword=keyword,
-                    progress_callback=lambda p: self.root.after(0, lambda: self.search_progress.configure(value=p)),
-                    cache_root=self.config['cache_root']
-                )
-                self.root.after(0, lambda: self.display_results(results))
+                for batch in AdvancedSearchEngine.iter_search(
+                    keyword,
+                    cache_root=self.config['cache_root'],
+                    progress_callback=lambda p: self.root.after(0, lambda: self.search_progress.configure(value=p))
+                ):
+                    if generation != self.search_generation:
+                        return
+                    self.root.after(0, self.display_results, batch, generation)
             except Exception as e:
-                self.log_message(f"搜索错误: {str(e)}")
+                logging.getLogger("SearchModule").error(f"搜索错误: {str(e)}")
             finally:
-                self.root.after(0, self.finish_search)
+                self.root.after(0, self.finish_search, generation)
 
         threading.Thread(target=search_task, daemon=True).start()
 
-    def display_results(self, results):
-        for result in results:
-            self.search_results.insert('', 'end', values=(result['title'], result['path'], result['bvid']))
-        self.log_message(f"找到 {len(results)} 个匹配结果")
+    def display_results(self, results, generation):
+        if generation != self.search_generation:
+            return
+        self.search_store.extend(results)
+        self.search_view.refresh()
+        self.search_result_count += len(results)
 
-    def finish_search(self):
+    def finish_search(self, generation):
+        if generation != self.search_generation:
+            return
+        self.log_message(f"找到 {self.search_result_count} 个匹配结果")
         self.search_progress['value'] = 100
         self.root.after(1000, lambda: self.search_progress.configure(value=0))
 
@@ -643,31 +993,26 @@ class BilibiliToolkitGUI:
         stop_btn.config(state="disabled" if enable else "normal")
         self.root.update_idletasks()
 
-    def log_message(self, msg):
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, msg + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state='disabled')
-
-    def load_config(self):
-        config_path = Path('config.json')
-        if config_path.exists():
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'cache_root': '', 'output_dir': '', 'sessdata': ''}
+    def log_message(self, msg, module=GUI_MODULE):
+        """可在任意线程调用，消息由 log_sink 按帧成批写入日志控件"""
+        self.log_sink.put(msg, module)
 
     def save_config(self):
-        config = {
+        # 保留界面上没有的配置项（如手动添加的 log_view_lines）
+        config = dict(self.config)
+        config.update({
             'cache_root': self.cache_entry.get(),
             'output_dir': self.output_entry.get(),
             'sessdata': self.sessdata_entry.get(),
             'thread_count': self.thread_var.get(),
+            'download_workers': self.download_workers_var.get(),
             'download_quality': next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.quality_var.get()),
             'reload_quality': next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.reload_quality_var.get())
-        }
-        with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2)
+        })
+        save_config(config)
         self.config = config
+        if self.download_queue is not None:
+            self.download_queue.config = config
         messagebox.showinfo("成功", "配置已保存")
 
     def select_dir(self, entry):
@@ -677,12 +1022,17 @@ class BilibiliToolkitGUI:
             entry.insert(0, path)
 
     def open_download_records(self):
-        record_file = Path(__file__).parent / "downloaded.txt"
+        from download_module import BilibiliDownloader
+
         try:
-            if record_file.exists():
+            store = BilibiliDownloader.get_record_store()
+            if store.count():
+                record_file = store.export_text()
                 if os.name == 'nt':
                     os.startfile(record_file)
                 else:
+                    import subprocess
+
                     opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
                     subprocess.call([opener, str(record_file)])
             else:
@@ -697,6 +1047,8 @@ class BilibiliToolkitGUI:
                 if os.name == 'nt':
                     os.startfile(error_file)
                 else:
+                    import subprocess
+
                     opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
                     subprocess.call([opener, str(error_file)])
             else:
@@ -705,11 +1057,11 @@ class BilibiliToolkitGUI:
             messagebox.showerror("错误", f"打开文件失败：{str(e)}")
 
     def open_selected_folder(self):
-        selected = self.search_results.selection()
+        selected = self.search_view.selection()
         if not selected:
             return
         try:
-            folder_name = self.search_results.item(selected[0])['values'][1]
+            folder_name = self.search_store.row(selected[0])[1]
             cache_root = self.config.get('cache_root', '')
             full_path = Path(cache_root) / folder_name
 
@@ -722,64 +1074,75 @@ class BilibiliToolkitGUI:
             logging.error(f"打开目录失败：{str(e)}")
 
     def rename_title(self):
-        selected = self.search_results.selection()
+        """单选时直接输入新标题；多选时对所有选中记录的标题做查找替换，一次提交"""
+        from download_module import BilibiliDownloader
+
+        selected = self.search_view.selection()
         if not selected:
             return
 
-        item = self.search_results.item(selected[0])
-        bvid = item['values'][2]
-        old_title = item['values'][0]
-
-        new_title = simpledialog.askstring(
-            "重命名标题",
-            "请输入新的视频标题：",
-            initialvalue=old_title,
-            parent=self.root
-        )
+        rows = {row_id: self.search_store.row(row_id) for row_id in selected}
+        if len(selected) == 1:
+            old_title = rows[selected[0]][0]
+            new_title = simpledialog.askstring(
+                "重命名标题",
+                "请输入新的视频标题：",
+                initialvalue=old_title,
+                parent=self.root
+            )
+            if not new_title or new_title == old_title:
+                return
+            renamed = {selected[0]: new_title}
+        else:
+            find = simpledialog.askstring(
+                "批量重命名", f"已选中 {len(selected)} 条记录，请输入要替换的文字：", parent=self.root
+            )
+            if not find:
+                return
+            replace = simpledialog.askstring("批量重命名", f"将“{find}”替换为：", parent=self.root)
+            if replace is None:
+                return
+            renamed = {row_id: rows[row_id][0].replace(find, replace) for row_id in selected}
+            renamed = {row_id: title for row_id, title in renamed.items() if title != rows[row_id][0]}
+            if not renamed:
+                messagebox.showinfo("提示", "选中的标题中没有要替换的文字", parent=self.root)
+                return
 
-        if new_title and new_title != old_title:
-            try:
-                record_file = Path(__file__).parent / "downloaded.txt"
-                updated_lines = []
-                with open(record_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if line.startswith(bvid):
-                            parts = line.strip().split("|")
-                            if len(parts) >= 3:
-                                updated_line = f"{parts[0]}|{parts[1]}|{new_title}\n"
-                                updated_lines.append(updated_line)
-                            else:
-                                updated_lines.append(line)
-                        else:
-                            updated_lines.append(line)
-                with open(record_file, "w", encoding="utf-8") as f:
-                    f.writelines(updated_lines)
-                self.search_results.item(selected[0], values=(new_title, item['values'][1], bvid))
-                logging.getLogger("SearchModule").info(f"成功重命名：{bvid} -> {new_title}")
-            except Exception as e:
-                messagebox.showerror("错误", f"重命名失败：{str(e)}")
-                logging.getLogger("SearchModule").error(f"重命名失败：{str(e)}")
+        try:
+            count = BilibiliDownloader.get_record_store().update_titles(
+                {rows[row_id][2]: title for row_id, title in renamed.items()}
+            )
+            for row_id, title in renamed.items():
+                self.search_store.set_value(row_id, "title", title)
+            self.search_view.refresh()
+            if len(renamed) == 1:
+                row_id, title = next(iter(renamed.items()))
+                logging.getLogger("SearchModule").info(f"成功重命名：{rows[row_id][2]} -> {title}")
+            else:
+                logging.getLogger("SearchModule").info(f"成功批量重命名 {count} 条记录")
+        except Exception as e:
+            messagebox.showerror("错误", f"重命名失败：{str(e)}")
+            logging.getLogger("SearchModule").error(f"重命名失败：{str(e)}")
 
     def delete_record(self):
-        selected = self.search_results.selection()
+        from download_module import BilibiliDownloader
+
+        selected = self.search_view.selection()
         if not selected:
             return
 
-        bvid = self.search_results.item(selected[0])['values'][2]
-        if not messagebox.askyesno("确认删除", f"确定要删除 BV号 {bvid} 的记录吗？", parent=self.root):
+        bvids = [self.search_store.row(row_id)[2] for row_id in selected]
+        prompt = f"确定要删除 BV号 {bvids[0]} 的记录吗？" if len(bvids) == 1 else f"确定要删除选中的 {len(bvids)} 条记录吗？"
+        if not messagebox.askyesno("确认删除", prompt, parent=self.root):
             return
 
         try:
-            record_file = Path(__file__).parent / "downloaded.txt"
-            remaining_lines = []
-            with open(record_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    if not line.startswith(bvid):
-                        remaining_lines.append(line)
-            with open(record_file, "w", encoding="utf-8") as f:
-                f.writelines(remaining_lines)
-            self.search_results.delete(selected[0])
-            logging.getLogger("SearchModule").info(f"成功删除记录：{bvid}")
+            count = BilibiliDownloader.get_record_store().delete_many(bvids)
+            self.search_view.remove(selected)
+            if len(bvids) == 1:
+                logging.getLogger("SearchModule").info(f"成功删除记录：{bvids[0]}")
+            else:
+                logging.getLogger("SearchModule").info(f"成功删除 {count} 条记录")
         except Exception as e:
             messagebox.showerror("错误", f"删除失败：{str(e)}")
             logging.getLogger("SearchModule").error(f"删除记录失败：{str(e)}")
@@ -790,25 +1153,31 @@ class BilibiliToolkitGUI:
         finally:
             self.context_menu.grab_release()
 
-    def start_log_poller(self):
-        def poller():
-            while True:
-                try:
-                    msg = self.log_queue.get(timeout=0.1)
-                    self.log_message(msg)
-                except queue.Empty:
-                    if not self.root.winfo_exists():
-                        break
-
-        threading.Thread(target=poller, daemon=True).start()
-
     def on_close(self):
-        self.download_stop_event.set()
+        if self.download_queue is not None:
+            self.download_queue.close()
+        stats = self.log_sink.stats()
+        logging.info(f"界面日志：已显示 {stats['flushed']} 条，来不及显示 {stats['dropped']} 条（完整记录见 operation.log）")
+        if self.metrics_file:
+            from metrics_module import metrics
+            try:
+                metrics.write(SCRIPT_DIR / self.metrics_file)
+            except OSError as e:
+                logging.error(f"写入统计文件失败：{str(e)}")
+        if self.trace_file:
+            from trace_module import tracer
+            try:
+                tracer.write(SCRIPT_DIR / self.trace_file)
+            except OSError as e:
+                logging.error(f"写入时间线文件失败：{str(e)}")
         self.reload_stop_event.set()
+        self.merge_stop_event.set()
+        self.log_sink.close()
         self.root.destroy()
 
 
 if __name__ == "__main__":
+    setup_logging()
     root = tk.Tk()
     app = BilibiliToolkitGUI(root)
     root.mainloop()
@@ -0,0 +1,160 @@
+import logging
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+'''
+界面日志缓冲
+任意线程写入的日志先在写入线程中追加到按大小轮转的日志文件（完整记录，不丢条目），
+再进入显示用的环形缓冲区，由 Tk 主线程按固定帧率（root.after）成批取出写入控件：
+每帧只插入一次、滚动一次，工作线程从不直接操作控件；显示缓冲区满时只丢弃最旧的待显示记录并计数
+日志控件只保留最近 max_lines 行；
+按模块筛选时从内存中各模块的最近记录重建控件内容，不扫描控件文本
+'''
+
+LOG_BUFFER_CAPACITY = 20000
+LOG_FLUSH_FPS = 20
+LOG_VIEW_LINES = 2000
+LOG_SPILL_FILE = 'operation.log'
+LOG_SPILL_BYTES = 5 * 1024 * 1024
+LOG_SPILL_BACKUPS = 3
+# 界面自身（合并、下载队列等回调）产生的消息归入这个模块名
+GUI_MODULE = 'GUI'
+LOG_MODULES = ('DownloadModule', 'ReloadModule', 'SearchModule', GUI_MODULE)
+
+
+class LogSink:
+    """
+    线程安全的日志缓冲，每条记录为 (模块名, 文本)
+    spill_path 不为空时每条记录在 put 的线程中写入日志文件；显示缓冲区溢出不影响文件中的完整记录
+    flushed/dropped 统计已写入控件和因显示缓冲区溢出未显示的条数
+    """
+
+    def __init__(self, capacity=LOG_BUFFER_CAPACITY, spill_path=None, spill_bytes=LOG_SPILL_BYTES,
+                 spill_backups=LOG_SPILL_BACKUPS):
+        self.capacity = capacity
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._root = None
+        self._write = None
+        self._interval = 0
+        self.flushed = 0
+        self.dropped = 0
+        self._spill = None
+        if spill_path:
+            self._spill = RotatingFileHandler(spill_path, maxBytes=spill_bytes, backupCount=spill_backups,
+                                              encoding='utf-8', delay=True)
+            self._spill.setFormatter(logging.Formatter('%(message)s'))
+
+    def put(self, message, module=GUI_MODULE):
+        if self._spill is not None:
+            # RotatingFileHandler 自带锁，多个线程同时写入时按行完整写出
+            self._spill.handle(logging.makeLogRecord({"msg": f"[{module}] {message}", "levelno": logging.INFO}))
+        with self._lock:
+            if len(self._buffer) >= self.capacity:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append((module, message))
+
+    def drain(self):
+        """取出缓冲区中的全部记录"""
+        with self._lock:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        return batch
+
+    def attach(self, root, write, fps=LOG_FLUSH_FPS):
+        """在 Tk 主线程中每秒 fps 次调用 write(记录列表)；窗口销毁后自动停止"""
+        self._root = root
+        self._write = write
+        self._interval = max(1, int(1000 / fps))
+        self._root.after(self._interval, self._tick)
+
+    def flush(self):
+        """立即把缓冲区写入控件（只能在 Tk 主线程调用）"""
+        batch = self.drain()
+        if batch and self._write is not None:
+            self._write(batch)
+            self.flushed += len(batch)
+
+    def _tick(self):
+        try:
+            self.flush()
+        except Exception:
+            logging.exception("日志写入控件失败")
+        try:
+            self._root.after(self._interval, self._tick)
+        except Exception:
+            pass  # 窗口已销毁（TclError），停止刷新
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._buffer)
+        return {"flushed": self.flushed, "dropped": self.dropped, "pending": pending}
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+
+
+class LogSinkHandler(logging.Handler):
+    """把日志记录格式化后写入 LogSink"""
+
+    def __init__(self, sink):
+        super().__init__()
+        self.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        self.sink = sink
+
+    def emit(self, record):
+        try:
+            self.sink.put(self.format(record), record.name)
+        except Exception:
+            self.handleError(record)
+
+
+class LogView:
+    """
+    有界的日志控件：write 由 LogSink.attach 在 Tk 主线程中调用
+    控件中超过 max_lines 的旧行被删除；每个模块在内存中保留最近 max_lines 条，用于切换筛选
+    完整记录由 LogSink 写入日志文件，这里只负责显示
+    """
+
+    def __init__(self, text_widget, max_lines=LOG_VIEW_LINES):
+        self.text = text_widget
+        self.max_lines = max(1, int(max_lines))
+        self.module_filter = None
+        self._all = deque(maxlen=self.max_lines)
+        self._by_module = {}
+
+    def write(self, records):
+        lines = []
+        for module, message in records:
+            self._all.append(message)
+            recent = self._by_module.get(module)
+            if recent is None:
+                recent = self._by_module[module] = deque(maxlen=self.max_lines)
+            recent.append(message)
+            if self.module_filter is None or module == self.module_filter:
+                lines.append(message)
+        if lines:
+            self._append(lines)
+
+    def _append(self, lines):
+        self.text.config(state='normal')
+        self.text.insert('end', "\n".join(lines) + "\n")
+        # 末尾总有一个空行，实际行数为 end-1c 的行号减一
+        count = int(self.text.index('end-1c').split('.')[0]) - 1
+        if count > self.max_lines:
+            self.text.delete('1.0', f'{count - self.max_lines + 1}.0')
+        self.text.see('end')
+        self.text.config(state='disabled')
+
+    def set_filter(self, module=None):
+        """只显示指定模块的日志，None 显示全部"""
+        self.module_filter = module or None
+        lines = self._all if self.module_filter is None else self._by_module.get(self.module_filter, ())
+        self.text.config(state='normal')
+        self.text.delete('1.0', 'end')
+        self.text.config(state='disabled')
+        if lines:
+            self._append(list(lines))
@@ -1,10 +1,40 @@
 import os
+import re
+import json
+import time
+import shutil
+import struct
+import hashlib
+import sqlite3
+import threading
 import subprocess
 import tempfile
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
 
+from metrics_module import metrics
+from trace_module import tracer
+from process_module import run_process
+
+# 电脑缓存的 m4s 文件头部多出的9个ASCII零
+ZERO_PREFIX = b'0' * 9
+
+# 可以直接复制进 MP4 容器的音频编码（stsd 中的样本描述类型）
+# AAC 为 mp4a，杜比为 ec-3/ac-3，Hi-Res 为 fLaC
+MP4_AUDIO_COPY = {'mp4a', 'ec-3', 'ac-3', 'fLaC', 'Opus'}
+# 旧版 ffmpeg 中 FLAC/Opus 写入 MP4 仍属实验特性
+MP4_AUDIO_EXPERIMENTAL = {'fLaC', 'Opus'}
+_CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+INVALID_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\r\n\t]')
+# 内容指纹：在去掉前缀的内容中均匀抽取这么多块（含首尾），每块这么多字节
+FINGERPRINT_SAMPLES = 8
+FINGERPRINT_BLOCK = 64 * 1024
+# 遇到内容相同的已合并条目时：link 硬链接已有输出，skip 跳过不输出，off 不检测
+DUPLICATE_MODES = ("link", "skip", "off")
+
 
 def validate_files(file_paths):
     """
@@ -21,15 +51,134 @@ def validate_files(file_paths):
     return True
 
 
-def process_file(file_path, temp_files):
+@lru_cache(maxsize=None)
+def ffmpeg_supports_subfile():
+    """当前 ffmpeg 是否支持 subfile 协议（按偏移读取输入文件的一段）"""
+    try:
+        result = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-protocols'],
+            capture_output=True, text=True, timeout=10
+        )
+    except Exception:
+        return False
+    return 'subfile' in result.stdout.split()
+
+
+def has_zero_prefix(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(ZERO_PREFIX)) == ZERO_PREFIX
+
+
+def subfile_input(file_path, offset=len(ZERO_PREFIX)):
     """
-    处理单个文件：检查前导9个零，需要时创建临时文件
-    返回处理后的文件路径
+    生成 ffmpeg 的 subfile 输入：从 offset 开始读到文件末尾（end 为 0 表示读到结尾），
+    内层使用 file: 协议，避免 Windows 盘符中的冒号被当作协议名
     """
-    with open(file_path, 'rb') as f:
-        head = f.read(9)
+    return f"subfile,,start,{offset},end,0,,:file:{Path(file_path).resolve().as_posix()}"
+
+
+def _iter_boxes(f, start, end):
+    """遍历 [start, end) 范围内的 MP4 box，产出 (类型, 内容起点, box终点)"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(8)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield kind, pos + header_size, pos + size
+        pos += size
+
+
+def probe_m4s(file_path):
+    """
+    读取 m4s 的 moov 中第一条轨道的类型与编码，只解析文件头部的 box，不读取媒体数据
+    返回 {"handler": 'vide'/'soun', "codec": 'avc1'/'hev1'/'mp4a'/...}，解析失败的字段为 None
+    """
+    result = {"handler": None, "codec": None}
+    start = len(ZERO_PREFIX) if has_zero_prefix(file_path) else 0
+    end = os.path.getsize(file_path)
+
+    def walk(f, box_start, box_end):
+        for kind, body, box_stop in _iter_boxes(f, box_start, box_end):
+            if kind == b'hdlr' and result["handler"] is None:
+                # version/flags(4) + pre_defined(4) + handler_type(4)
+                f.seek(body + 8)
+                result["handler"] = f.read(4).decode('latin-1')
+            elif kind == b'stsd' and result["codec"] is None:
+                # version/flags(4) + entry_count(4) + 第一条样本描述的 size(4) + type(4)
+                f.seek(body + 12)
+                result["codec"] = f.read(4).decode('latin-1')
+            elif kind in _CONTAINER_BOXES:
+                walk(f, body, box_stop)
+
+    try:
+        with open(file_path, 'rb') as f:
+            for kind, body, box_stop in _iter_boxes(f, start, end):
+                if kind == b'moov':
+                    walk(f, body, box_stop)
+                    break
+                if kind in (b'moof', b'mdat'):
+                    break
+    except (OSError, struct.error) as e:
+        logging.warning(f"解析文件头失败 {file_path}: {e}")
+    return result
+
+
+def verify_mp4(file_path):
+    """
+    检查 MP4 是否完整：顶层 box 首尾相接正好覆盖整个文件，且包含 moov 和 mdat
+    （写到一半被中断的文件最后一个 box 会超出文件末尾）
+    """
+    with metrics.stage("verify_mp4"):
+        try:
+            size = os.path.getsize(file_path)
+            kinds = set()
+            end = 0
+            with open(file_path, 'rb') as f:
+                for kind, _, box_stop in _iter_boxes(f, 0, size):
+                    kinds.add(kind)
+                    end = box_stop
+            return end == size and {b'moov', b'mdat'} <= kinds
+        except (OSError, struct.error):
+            return False
+
+
+def audio_codec_args(probes):
+    """根据探测结果决定音频参数：可直接放入 MP4 的编码直接复制，其余转码为 AAC"""
+    codec = next((p["codec"] for p in probes if p["handler"] == 'soun'), None)
+    if codec in MP4_AUDIO_COPY:
+        args = ['-c:a', 'copy']
+        if codec in MP4_AUDIO_EXPERIMENTAL:
+            args += ['-strict', 'experimental']
+        return codec, 'copy', args
+    return codec, 'aac', ['-c:a', 'aac']
+
+
+def process_file(file_path, temp_files, zero_copy=True):
+    """
+    处理单个文件：检查前导9个零
+    zero_copy 且 ffmpeg 支持 subfile 时直接返回跳过前缀的 subfile 输入，不复制文件；
+    否则创建去掉前缀的临时文件
+    返回处理后的 ffmpeg 输入
+    """
+    with metrics.stage("strip") as stage:
+        return _process_file(file_path, temp_files, zero_copy, stage)
+
+
+def _process_file(file_path, temp_files, zero_copy, stage):
+    if has_zero_prefix(file_path):
+        if zero_copy and ffmpeg_supports_subfile():
+            return subfile_input(file_path)
 
-    if head == b'0' * 9:
         # 创建临时文件
         temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.m4s')
         temp_path = temp_file.name
@@ -37,12 +186,13 @@ def process_file(file_path, temp_files):
 
         try:
             with open(temp_path, 'wb') as f_out, open(file_path, 'rb') as f_in:
-                f_in.seek(9)  # 跳过前9字节
+                f_in.seek(len(ZERO_PREFIX))  # 跳过前9字节
                 while True:
-                    chunk = f_in.read(4096)  # 分块读取避免内存问题
+                    chunk = f_in.read(1024 * 1024)  # 分块读取避免内存问题
                     if not chunk:
                         break
                     f_out.write(chunk)
+                    stage.add_bytes(len(chunk))
             temp_files.append(temp_path)
             return temp_path
         except Exception as e:
@@ -52,24 +202,90 @@ def process_file(file_path, temp_files):
         return file_path
 
 
-def merge_m4s_files(file_list, output_dir, output_filename=None):
+def _run_ffmpeg(cmd, stop_event=None, timeout=None, stage=None):
+    """
+    运行 ffmpeg；stop_event 置位时终止进程并抛出 InterruptedError，超时抛出 TimeoutError
+    失败时抛出 CalledProcessError，stderr 为 ffmpeg 输出的最后一部分
+    stage 为 metrics.stage() 的计时器，用于在时间线上记录 ffmpeg 的进程号
+    """
+    result = run_process(cmd, stop_event=stop_event, timeout=timeout)
+    metrics.record_stage("ffmpeg_spawn", result.spawn_duration)
+    if stage is not None:
+        stage.set(pid=result.pid, spawn_ms=round(result.spawn_duration * 1000, 3), returncode=result.returncode)
+    if result.cancelled:
+        raise InterruptedError("合并已取消")
+    if result.timed_out:
+        raise TimeoutError(f"ffmpeg 运行超过 {timeout} 秒，已终止")
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd, stderr=result.stderr_tail)
+
+
+def pick_engine(engine, audio_mode):
+    """
+    选择合并方式：'ffmpeg' 或 'python'（remux_module 内置重封装，只能流复制）
+    auto：有 ffmpeg 时一律用 ffmpeg，只有本机没有 ffmpeg（且不需要转码音频）时才用内置重封装
     """
-    使用 ffmpeg 将两个 m4s 文件（视频和音频）合并为一个 MP4 文件。
-    自动处理前导9个零且不影响原文件
+    if engine not in ("auto", "ffmpeg", "python"):
+        raise ValueError(f"未知的合并方式：{engine}")
+    if engine == "python" and audio_mode != 'copy':
+        raise ValueError("内置重封装不支持音频转码，请使用 ffmpeg")
+    if engine != "auto":
+        return engine
+    if audio_mode != 'copy':
+        return "ffmpeg"
+    if shutil.which('ffmpeg') is None:
+        return "python"
+    return "ffmpeg"
+
+
+def merge_m4s_files(file_list, output_dir, output_filename=None, stop_event=None, zero_copy=True,
+                    engine="auto", timeout=None, stage_callback=None):
     """
+    将两个 m4s 文件（视频和音频）合并为一个 MP4 文件。
+    engine 为 'ffmpeg'、'python'（内置重封装，不依赖 ffmpeg）或 'auto'（见 pick_engine）；
+    auto 选中的内置重封装无法处理输入时自动改用 ffmpeg
+    自动处理前导9个零且不影响原文件（ffmpeg 默认通过 subfile 跳过前缀，失败时退回临时文件）
+    音频编码可直接放入 MP4 时直接复制，否则转码为 AAC
+    stop_event 置位时终止合并并抛出 InterruptedError；ffmpeg 运行超过 timeout 秒时终止并抛出 TimeoutError
+    stage_callback(阶段) 在处理前缀（'stripping'）和开始合并（'merging'）时调用
+    返回 {"output": 输出路径, "video_codec", "audio_codec", "audio_mode": 'copy'/'aac', "engine"}
+    """
+    with tracer.span("merge", "merge", output=output_filename) as span:
+        if tracer.enabled:
+            span.set(**_input_sizes(file_list))
+        result = _merge_m4s_files(file_list, output_dir, output_filename, stop_event, zero_copy, engine, timeout,
+                                  stage_callback)
+        span.set(engine=result["engine"], audio_mode=result["audio_mode"])
+        return result
+
+
+def _input_sizes(file_list):
+    """时间线参数：输入文件大小"""
+    sizes = {}
+    for key, path in zip(("video_bytes", "audio_bytes"), file_list):
+        try:
+            sizes[key] = os.path.getsize(path)
+        except OSError:
+            pass
+    return sizes
+
+
+def _merge_m4s_files(file_list, output_dir, output_filename, stop_event, zero_copy, engine, timeout, stage_callback):
     temp_files = []  # 用于记录临时文件路径
 
     try:
         # 验证文件
-        validate_files(file_list)
+        with metrics.stage("validate"):
+            validate_files(file_list)
         if len(file_list) != 2:
             raise ValueError("必须提供两个文件：一个视频和一个音频")
+        input_bytes = sum(os.path.getsize(path) for path in file_list)
 
-        # 处理前导零
-        processed_files = [
-            process_file(file_list[0], temp_files),
-            process_file(file_list[1], temp_files)
-        ]
+        # 探测编码（只读文件头）
+        probes = [probe_m4s(path) for path in file_list]
+        audio_codec, audio_mode, audio_args = audio_codec_args(probes)
+        video_codec = next((p["codec"] for p in probes if p["handler"] == 'vide'), None)
+        selected = pick_engine(engine, audio_mode)
 
         # 生成输出文件路径
         out_dir = Path(output_dir)
@@ -80,6 +296,37 @@ def merge_m4s_files(file_list, output_dir, output_filename=None):
         else:
             filename = "合并_" + datetime.now().strftime("%Y%m%d_%H%M%S")
         output_path = out_dir / f"{filename}.mp4"
+        result = {
+            "output": str(output_path),
+            "video_codec": video_codec,
+            "audio_codec": audio_codec,
+            "audio_mode": audio_mode,
+            "engine": selected
+        }
+
+        if selected == "python":
+            from remux_module import RemuxError, remux_m4s
+            if stage_callback:
+                stage_callback("merging")
+            try:
+                with metrics.stage("remux", input_bytes):
+                    remux_m4s(file_list[0], file_list[1], str(output_path), stop_event)
+                return result
+            except RemuxError as e:
+                if engine == "python" or shutil.which('ffmpeg') is None:
+                    raise RuntimeError(f"内置重封装失败: {e}")
+                logging.warning(f"内置重封装失败，改用 ffmpeg：{e}")
+                result["engine"] = "ffmpeg"
+
+        # 处理前导零
+        if stage_callback:
+            stage_callback("stripping")
+        processed_files = [
+            process_file(file_list[0], temp_files, zero_copy),
+            process_file(file_list[1], temp_files, zero_copy)
+        ]
+        if stage_callback:
+            stage_callback("merging")
 
         # 调用 ffmpeg 进行合并
         cmd = [
@@ -90,21 +337,37 @@ def merge_m4s_files(file_list, output_dir, output_filename=None):
             '-i', processed_files[0],
             '-i', processed_files[1],
             '-c:v', 'copy',
-            '-c:a', 'aac',
+            *audio_args,
             '-movflags', '+faststart',
             str(output_path)
         ]
-        subprocess.run(cmd, check=True)
+        try:
+            with metrics.stage("ffmpeg", input_bytes) as stage:
+                _run_ffmpeg(cmd, stop_event, timeout, stage)
+        except (InterruptedError, TimeoutError):
+            if output_path.exists():
+                os.remove(output_path)
+            raise
+        except subprocess.CalledProcessError:
+            if not any(p.startswith('subfile,') for p in processed_files):
+                raise
+            # subfile 输入失败时退回临时文件方式重试一次
+            logging.warning("subfile 输入合并失败，改用临时文件重试")
+            return merge_m4s_files(file_list, output_dir, output_filename, stop_event, zero_copy=False,
+                                   engine="ffmpeg", timeout=timeout, stage_callback=stage_callback)
 
         # 校验输出文件
-        if not output_path.exists():
-            raise RuntimeError("输出文件不存在")
-        if output_path.stat().st_size < 1024:
-            raise RuntimeError("输出文件过小，可能失败")
-        return str(output_path)
+        with metrics.stage("verify"):
+            if not output_path.exists():
+                raise RuntimeError("输出文件不存在")
+            if output_path.stat().st_size < 1024:
+                raise RuntimeError("输出文件过小，可能失败")
+        return result
 
     except subprocess.CalledProcessError as e:
         error_msg = f"FFmpeg处理出错: {e}"
+        if e.stderr:
+            error_msg += f"\n{e.stderr.strip()[-1000:]}"
         logging.error(error_msg)
         raise RuntimeError(error_msg)
     finally:
@@ -113,4 +376,290 @@ def merge_m4s_files(file_list, output_dir, output_filename=None):
             try:
                 os.remove(path)
             except Exception as e:
-                logging.error(f"删除临时文件失败 {path}: {e}")
\ No newline at end of file
+                logging.error(f"删除临时文件失败 {path}: {e}")
+
+
+def fingerprint_m4s(file_path):
+    """
+    m4s 的抽样指纹：去掉9个零前缀后的内容大小 + 均匀分布的 FINGERPRINT_SAMPLES 块的哈希，
+    每个文件最多读取 FINGERPRINT_SAMPLES * FINGERPRINT_BLOCK 字节；有无前缀的同一文件指纹相同
+    """
+    with open(file_path, 'rb') as f:
+        start = len(ZERO_PREFIX) if f.read(len(ZERO_PREFIX)) == ZERO_PREFIX else 0
+        size = os.fstat(f.fileno()).st_size - start
+        digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+        if size <= FINGERPRINT_SAMPLES * FINGERPRINT_BLOCK:
+            f.seek(start)
+            digest.update(f.read())
+        else:
+            step = (size - FINGERPRINT_BLOCK) / (FINGERPRINT_SAMPLES - 1)
+            for i in range(FINGERPRINT_SAMPLES):
+                f.seek(start + int(i * step))
+                digest.update(f.read(FINGERPRINT_BLOCK))
+    return digest.hexdigest()
+
+
+def fingerprint_pair(video, audio):
+    """音视频对的指纹（两个文件指纹按视频、音频顺序拼接）"""
+    with metrics.stage("fingerprint"):
+        return fingerprint_m4s(video) + fingerprint_m4s(audio)
+
+
+def link_output(existing, output_path):
+    """把已有的输出硬链接为 output_path（已存在时替换）；文件系统不支持硬链接时复制"""
+    output_path = Path(output_path)
+    if output_path.exists() and os.path.samefile(existing, output_path):
+        return
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output_path.with_name(output_path.name + ".link")
+    if tmp.exists():
+        os.remove(tmp)
+    try:
+        os.link(existing, tmp)
+    except OSError:
+        shutil.copyfile(existing, tmp)
+    os.replace(tmp, output_path)
+
+
+class FingerprintIndex:
+    """
+    m4s 音视频对的指纹 -> 已合并的 MP4（持久化在记录数据库中）
+    - 查询时校验输出文件仍存在且大小未变，否则删除该记录
+    - acquire/release 保证同一指纹同时只有一个任务在合并，其余任务等待它的结果
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS merge_fingerprints (
+            fingerprint TEXT PRIMARY KEY,
+            output TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+
+    def _lookup(self, fingerprint):
+        row = self._conn.execute(
+            "SELECT output, size FROM merge_fingerprints WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            if os.path.getsize(row[0]) == row[1]:
+                return row[0]
+        except OSError:
+            pass
+        with self._conn:
+            self._conn.execute("DELETE FROM merge_fingerprints WHERE fingerprint = ?", (fingerprint,))
+        return None
+
+    def lookup(self, fingerprint):
+        """返回指纹对应的已有输出路径，没有（或输出已被删除、修改）时返回 None"""
+        with self._lock:
+            return self._lookup(fingerprint)
+
+    def add(self, fingerprint, output):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO merge_fingerprints VALUES (?, ?, ?, ?)",
+                (fingerprint, str(output), os.path.getsize(output), time.time())
+            )
+
+    def acquire(self, fingerprint, stop_event=None):
+        """
+        返回已有输出路径；没有时登记为合并中并返回 None，调用方合并结束后必须调用 release
+        同一指纹正在由其他任务合并时等待其结束；stop_event 置位时抛出 InterruptedError
+        """
+        while True:
+            with self._lock:
+                existing = self._lookup(fingerprint)
+                if existing:
+                    return existing
+                event = self._inflight.get(fingerprint)
+                if event is None:
+                    self._inflight[fingerprint] = threading.Event()
+                    return None
+            while not event.wait(0.5):
+                if stop_event is not None and stop_event.is_set():
+                    raise InterruptedError("合并已取消")
+
+    def release(self, fingerprint, output=None):
+        """结束 acquire 登记的合并；output 为成功合并的输出路径，失败时为 None（等待的任务会自行合并）"""
+        try:
+            if output is not None:
+                self.add(fingerprint, output)
+        finally:
+            with self._lock:
+                event = self._inflight.pop(fingerprint, None)
+            if event is not None:
+                event.set()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def safe_filename(name, max_length=150):
+    """去掉文件名中的非法字符"""
+    return INVALID_FILENAME_CHARS.sub("_", name).strip()[:max_length]
+
+
+def _read_title(folder):
+    """
+    从缓存元数据中读取标题：电脑缓存为本目录的 .videoInfo，
+    手机缓存为上一级目录的 entry.json（m4s 位于 <cid>/<qn>/ 下）
+    """
+    for info_file, title_key, part_key in (
+        (folder / ".videoInfo", "groupTitle", "title"),
+        (folder / "entry.json", "title", None),
+        (folder.parent / "entry.json", "title", None),
+    ):
+        if not info_file.exists():
+            continue
+        try:
+            with open(info_file, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except Exception:
+            continue
+        title = info.get(title_key) or info.get("title")
+        part = info.get(part_key) if part_key else (info.get("page_data") or {}).get("part")
+        if title and part and part != title:
+            title = f"{title} - {part}"
+        if title:
+            return title
+    return None
+
+
+def find_merge_pairs(root):
+    """
+    在目录树中为每个缓存条目配对视频与音频 m4s
+    按文件头探测轨道类型；同一目录下有多个视频流（多画质）时取文件最大的一个
+    返回 [{"folder", "video", "audio", "name"}]，输出名在本批次内唯一
+    """
+    pairs = []
+    used_names = set()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        m4s_files = [Path(dirpath) / name for name in sorted(filenames) if name.lower().endswith('.m4s')]
+        if len(m4s_files) < 2:
+            continue
+        videos, audios = [], []
+        for path in m4s_files:
+            handler = probe_m4s(path)["handler"]
+            if handler == 'vide':
+                videos.append(path)
+            elif handler == 'soun':
+                audios.append(path)
+        if not videos or not audios:
+            # 探测失败时按文件名/大小区分
+            if len(m4s_files) != 2:
+                logging.warning(f"无法配对音视频文件：{dirpath}")
+                continue
+            by_size = sorted(m4s_files, key=lambda p: p.stat().st_size, reverse=True)
+            videos, audios = by_size[:1], by_size[1:]
+
+        folder = Path(dirpath)
+        name = safe_filename(_read_title(folder) or folder.name) or folder.name
+        if name in used_names:
+            name = safe_filename(f"{name}_{folder.name}")
+        used_names.add(name)
+        pairs.append({
+            "folder": str(folder),
+            "video": str(max(videos, key=lambda p: p.stat().st_size)),
+            "audio": str(max(audios, key=lambda p: p.stat().st_size)),
+            "name": name
+        })
+    return pairs
+
+
+def merge_concurrency(source_dir, output_dir):
+    """
+    批量合并的并发数：不超过 CPU 核数；源目录与输出目录在同一磁盘上时最多2个，
+    不同磁盘时最多4个（流复制时瓶颈主要在磁盘）
+    """
+    cpu_limit = os.cpu_count() or 1
+    try:
+        out = Path(output_dir)
+        while not out.exists() and out != out.parent:
+            out = out.parent
+        same_disk = os.stat(source_dir).st_dev == os.stat(out).st_dev
+    except OSError:
+        same_disk = True
+    return max(1, min(cpu_limit, 2 if same_disk else 4))
+
+
+def _batch_concurrency(folders, output_dir):
+    """
+    批量合并的并发数：按各条目的公共上级目录估算；条目分布在不同盘符（Windows）时 commonpath 抛出 ValueError，
+    改为每个盘符取一个目录分别估算，取最小值
+    """
+    try:
+        return merge_concurrency(os.path.commonpath(folders), output_dir)
+    except ValueError:
+        drives = {}
+        for folder in folders:
+            drives.setdefault(os.path.splitdrive(os.path.abspath(folder))[0].lower(), folder)
+        return min(merge_concurrency(folder, output_dir) for folder in drives.values())
+
+
+def batch_merge(pairs, output_dir, max_workers=None, stop_event=None, fingerprints=None, duplicate_mode="link"):
+    """
+    并发合并 find_merge_pairs 给出的条目，按完成顺序逐条产出结果：
+    {"folder", "name", "ok", "output", "audio_codec", "audio_mode", "error", "duplicate_of"}
+    stop_event 置位后不再启动新任务，正在运行的 ffmpeg 会被终止
+    传入 fingerprints（FingerprintIndex）时，与已合并条目内容相同的条目不再合并：
+    duplicate_mode 为 link 时硬链接已有输出，skip 时不输出（output 为 None），duplicate_of 为已有输出
+    """
+    if not pairs:
+        return
+    if max_workers is None:
+        max_workers = _batch_concurrency([p["folder"] for p in pairs], output_dir)
+
+    def run(pair):
+        result = {"folder": pair["folder"], "name": pair["name"], "ok": False, "output": None,
+                  "audio_codec": None, "audio_mode": None, "error": None, "duplicate_of": None}
+        fingerprint = output = None
+        try:
+            if fingerprints is not None and duplicate_mode != "off":
+                fingerprint = fingerprint_pair(pair["video"], pair["audio"])
+                existing = fingerprints.acquire(fingerprint, stop_event)
+                if existing:
+                    fingerprint = None
+                    result["duplicate_of"] = existing
+                    if duplicate_mode == "link":
+                        target = Path(output_dir) / f"{pair['name']}.mp4"
+                        link_output(existing, target)
+                        result["output"] = str(target)
+                    result["ok"] = True
+                    return result
+            merged = merge_m4s_files([pair["video"], pair["audio"]], output_dir, pair["name"], stop_event)
+            result.update(merged)
+            result["ok"] = True
+            output = merged["output"]
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            if fingerprint is not None:
+                fingerprints.release(fingerprint, output)
+        return result
+
+    pending = iter(pairs)
+    running = set()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="merge") as pool:
+        while True:
+            while len(running) < max_workers * 2 and not (stop_event and stop_event.is_set()):
+                pair = next(pending, None)
+                if pair is None:
+                    break
+                running.add(pool.submit(run, pair))
+            if not running:
+                break
+            done, running = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
@@ -0,0 +1,222 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+metadata_logger = logging.getLogger('DownloadModule')
+
+
+class VideoMetadataClient:
+    """
+    B站视频信息（x/web-interface/view）客户端
+    - 共享 keep-alive 会话（连接池）
+    - 内存 + 磁盘（SQLite）两级缓存，按 TTL 过期、按最近访问时间做 LRU 淘汰；
+      磁盘缓存超出 max_entries 一批（EVICT_BATCH 条）后才淘汰一次，每次只删最久未访问的多余条目
+    - 同一 bvid 的并发查询合并为一次请求
+    - get_many() 批量查询
+    """
+
+    API_BASE = "https://api.bilibili.com"
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "Referer": "https://www.bilibili.com/"
+    }
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS video_meta (
+            bvid TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS video_meta_accessed ON video_meta (accessed_at);
+    """
+    EVICT_BATCH = 1000
+
+    def __init__(self, cache_path=None, api_base=None, ttl=7 * 24 * 3600, max_entries=100000,
+                 timeout=10, pool_size=8):
+        self.api_base = (api_base or self.API_BASE).rstrip("/")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self._session = None
+
+        self._lock = threading.Lock()
+        self._memory = {}
+        self._inflight = {}
+        self._conn = None
+        self._disk_count = 0  # 磁盘缓存条数的上限估计（覆盖已有条目也计数，淘汰时重新统计）
+        if cache_path:
+            self._conn = sqlite3.connect(str(cache_path), timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+            self._disk_count = self._conn.execute("SELECT COUNT(*) FROM video_meta").fetchone()[0]
+
+    @property
+    def session(self):
+        """首次请求时才创建会话（requests 导入较慢，只查缓存时不需要）"""
+        with self._lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                session.headers.update(self.HEADERS)
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    @staticmethod
+    def _parse_view(data):
+        """只保留需要的字段"""
+        return {
+            "bvid": data.get("bvid"),
+            "aid": data.get("aid"),
+            "title": data.get("title"),
+            "duration": data.get("duration"),
+            "cid": data.get("cid"),
+            "pages": [
+                {
+                    "cid": page.get("cid"),
+                    "page": page.get("page"),
+                    "part": page.get("part"),
+                    "duration": page.get("duration")
+                }
+                for page in data.get("pages") or []
+            ]
+        }
+
+    def _cache_get(self, bvid):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.pop(bvid, None)
+            if entry and now - entry[1] < self.ttl:
+                self._memory[bvid] = entry  # 移到末尾，保持最近使用顺序
+                return entry[0]
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT data, fetched_at FROM video_meta WHERE bvid = ?", (bvid,)
+            ).fetchone()
+            if not row or now - row[1] >= self.ttl:
+                return None
+            with self._conn:
+                self._conn.execute("UPDATE video_meta SET accessed_at = ? WHERE bvid = ?", (now, bvid))
+            info = json.loads(row[0])
+            self._memory[bvid] = (info, row[1])
+            return info
+
+    def _cache_put(self, bvid, info):
+        now = time.time()
+        with self._lock:
+            self._memory[bvid] = (info, now)
+            if len(self._memory) > self.max_entries:
+                self._memory.pop(next(iter(self._memory)))
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO video_meta VALUES (?, ?, ?, ?)",
+                    (bvid, json.dumps(info, ensure_ascii=False), now, now)
+                )
+                self._disk_count += 1
+                if self._disk_count > self.max_entries + self.EVICT_BATCH:
+                    self._evict()
+
+    def _evict(self):
+        """删除最久未访问的条目，使磁盘缓存回到 max_entries 条（调用方持有锁并在事务中）"""
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM video_meta").fetchone()[0]
+        excess = self._disk_count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM video_meta WHERE bvid IN (SELECT bvid FROM video_meta ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self._disk_count = self.max_entries
+
+    def _fetch(self, bvid):
+        try:
+            response = self.session.get(
+                f"{self.api_base}/x/web-interface/view", params={"bvid": bvid}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            if data.get("code") == 0:
+                return self._parse_view(data["data"])
+            metadata_logger.warning(f"API返回错误: {data}")
+        except Exception as e:
+            metadata_logger.error(f"获取视频信息失败: {str(e)}")
+        return None
+
+    def get(self, bvid):
+        """返回视频信息字典（title/pages/cid/duration 等），失败时返回 None"""
+        info = self._cache_get(bvid)
+        if info is not None:
+            return info
+
+        with self._lock:
+            future = self._inflight.get(bvid)
+            owner = future is None
+            if owner:
+                future = self._inflight[bvid] = Future()
+        if not owner:
+            return future.result()
+
+        info = None
+        try:
+            info = self._fetch(bvid)
+            if info is not None:
+                self._cache_put(bvid, info)
+        finally:
+            with self._lock:
+                self._inflight.pop(bvid, None)
+            future.set_result(info)
+        return info
+
+    def get_title(self, bvid, default="未知标题"):
+        info = self.get(bvid)
+        return info["title"] if info and info.get("title") else default
+
+    def get_many(self, bvids, max_workers=4):
+        """批量查询，返回 {bvid: 信息或 None}；已缓存的不会发起请求"""
+        results = {}
+        missing = []
+        for bvid in dict.fromkeys(bvids):
+            info = self._cache_get(bvid)
+            if info is not None:
+                results[bvid] = info
+            else:
+                missing.append(bvid)
+        if missing:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                for bvid, info in zip(missing, pool.map(self.get, missing)):
+                    results[bvid] = info
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_default_client():
+    """进程内共享的客户端，磁盘缓存与下载记录放在同一目录"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = VideoMetadataClient(cache_path=Path(__file__).parent / "metadata_cache.db")
+        return _default_client
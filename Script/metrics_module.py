@@ -0,0 +1,238 @@
+import bisect
+import os
+import threading
+import time
+from pathlib import Path
+
+from trace_module import tracer
+
+'''
+耗时与数据量统计（默认关闭）
+各处理阶段用 metrics.stage(阶段名, 字节数) 包起来：记录耗时与字节数的直方图以及失败次数；
+启用了 trace_module 时同一个阶段还会记录为时间线上的区间（参数见 set）；
+两者都关闭时 stage() 直接返回一个共享的空计时器，只多一次属性判断
+统计结果可导出为 Prometheus 文本格式（供 node_exporter 的 textfile 收集器读取）或 JSON 快照
+'''
+
+STAGE_SECONDS = 'bili_export_stage_seconds'
+STAGE_BYTES = 'bili_export_stage_bytes'
+STAGE_ERRORS_TOTAL = 'bili_export_stage_errors_total'
+SEARCH_RESULTS_TOTAL = 'bili_export_search_results_total'
+
+# 直方图桶上界（不含 +Inf）
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800)
+SIZE_BUCKETS = tuple(1 << shift for shift in range(10, 36, 2))  # 1KB ~ 32GB
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """[(上界, 累计次数)]，最后一项的上界为 +Inf"""
+        total = 0
+        rows = []
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            rows.append((bound, total))
+        return rows
+
+
+class _StageTimer:
+    """
+    metrics.stage() 返回的计时器：add_bytes 补记处理的字节数，fail 标记失败（没有抛出异常时），
+    set 添加只写入时间线的参数（bvid、进程号等）
+    """
+    __slots__ = ("metrics", "name", "nbytes", "failed", "args", "start")
+
+    def __init__(self, metrics, name, nbytes):
+        self.metrics = metrics
+        self.name = name
+        self.nbytes = nbytes
+        self.failed = False
+        self.args = None
+
+    def add_bytes(self, nbytes):
+        self.nbytes += nbytes
+
+    def fail(self):
+        self.failed = True
+
+    def set(self, **args):
+        if self.args is None:
+            self.args = {}
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        # 只把普通异常计为失败，生成器提前关闭（GeneratorExit）等不算
+        failed = self.failed or (exc_type is not None and issubclass(exc_type, Exception))
+        self.metrics.record_stage(self.name, end - self.start, self.nbytes, failed)
+        if tracer.enabled:
+            args = dict(self.args or {})
+            if self.nbytes:
+                args["bytes"] = self.nbytes
+            if failed:
+                args["failed"] = True
+            tracer.complete(self.name, self.start, end, "stage", args)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def add_bytes(self, nbytes):
+        pass
+
+    def fail(self):
+        pass
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = [*key, *extra]
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class Metrics:
+    """线程安全的计数器与直方图集合，键为 (指标名, 标签)"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+
+    def enable(self, enabled=True):
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def stage(self, name, nbytes=0):
+        """计时一个处理阶段：with metrics.stage("strip", 字节数) as stage: ..."""
+        if not (self.enabled or tracer.enabled):
+            return _NULL_TIMER
+        return _StageTimer(self, name, nbytes)
+
+    def record_stage(self, name, seconds, nbytes=0, failed=False):
+        """直接记录一次阶段耗时（例如子进程结果里的启动耗时）"""
+        if not self.enabled:
+            return
+        self.observe(STAGE_SECONDS, seconds, stage=name)
+        if nbytes:
+            # 直方图的 _sum 即该阶段处理的总字节数
+            self.observe(STAGE_BYTES, nbytes, SIZE_BUCKETS, stage=name)
+        if failed:
+            self.inc(STAGE_ERRORS_TOTAL, stage=name)
+
+    def snapshot(self):
+        """返回可直接 JSON 序列化的快照"""
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            histograms = [
+                {
+                    "name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                    "mean": h.sum / h.count if h.count else 0.0,
+                    "buckets": [[_format_bound(bound), count] for bound, count in h.cumulative()]
+                }
+                for (name, labels), h in sorted(self._histograms.items())
+            ]
+        return {"timestamp": time.time(), "counters": counters, "histograms": histograms}
+
+    def to_prometheus(self):
+        """Prometheus 文本格式（0.0.4）"""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} counter")
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f"# TYPE {name} histogram")
+                for bound, count in h.cumulative():
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', _format_bound(bound)),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """写入文件：.json 为 JSON 快照，其余为 Prometheus 文本；先写临时文件再替换，收集器不会读到半个文件"""
+        import json
+
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8", newline="\n") as f:
+            if path.suffix.lower() == ".json":
+                json.dump(self.snapshot(), f, indent=2, ensure_ascii=False)
+                f.write("\n")
+            else:
+                f.write(self.to_prometheus())
+        os.replace(tmp, path)
+        return path
+
+
+# 进程内共享的统计实例
+metrics = Metrics()
@@ -0,0 +1,161 @@
+import os
+import signal
+import subprocess
+import time
+
+'''
+子进程运行器（yutto、ffmpeg 共用）
+在调用线程中用 asyncio（首次运行时才导入）同时读取 stdout 和 stderr，任何一个管道写满都不会卡住子进程；
+每隔 poll_interval 秒检查一次停止事件与超时，停止时先正常终止整个进程树，宽限期后强制结束
+'''
+
+# stderr 只保留最后这么多字节，用于判断错误原因
+STDERR_TAIL_BYTES = 64 * 1024
+READ_CHUNK = 64 * 1024
+
+
+class ProcessResult:
+    """子进程运行结果"""
+
+    def __init__(self, returncode, stderr_tail, cancelled=False, timed_out=False, duration=0.0, spawn_duration=0.0,
+                 pid=None):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.cancelled = cancelled
+        self.timed_out = timed_out
+        self.duration = duration
+        # 创建子进程本身的耗时（不含运行时间）
+        self.spawn_duration = spawn_duration
+        self.pid = pid
+
+    @property
+    def ok(self):
+        return self.returncode == 0 and not self.cancelled and not self.timed_out
+
+
+def _split_lines(buffer):
+    """按 \\n 或 \\r 切分出完整的行，返回 (行列表, 剩余的半行)；yutto 的进度条用 \\r 刷新"""
+    lines = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n").split(b"\n")
+    return lines[:-1], lines[-1]
+
+
+async def _read_stream(stream, on_line, tail, tail_bytes, activity):
+    pending = b""
+    while True:
+        chunk = await stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        activity[0] = time.monotonic()
+        if tail is not None:
+            tail.extend(chunk)
+            if len(tail) > tail_bytes:
+                del tail[:len(tail) - tail_bytes]
+        if on_line is None:
+            continue
+        lines, pending = _split_lines(pending + chunk)
+        for line in lines:
+            if line:
+                on_line(line.decode("utf-8", errors="replace"))
+    if on_line is not None and pending:
+        on_line(pending.decode("utf-8", errors="replace"))
+
+
+def _signal_tree(proc, force):
+    """向子进程及其子孙进程发送终止信号"""
+    if proc.returncode is not None:
+        return
+    try:
+        if os.name == "nt":
+            if force:
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                os.kill(proc.pid, signal.CTRL_BREAK_EVENT)
+        else:
+            os.killpg(proc.pid, signal.SIGKILL if force else signal.SIGTERM)
+    except (ProcessLookupError, PermissionError, OSError):
+        pass
+
+
+async def _run(cmd, on_stdout, on_stderr, stop_event, timeout, idle_timeout, kill_grace,
+               poll_interval, tail_bytes):
+    import asyncio
+
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True  # 独立进程组，停止时可以结束整个进程树
+    spawn_start = time.monotonic()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs
+    )
+
+    started = time.monotonic()
+    activity = [started]
+    tail = bytearray()
+    readers = [
+        asyncio.ensure_future(_read_stream(proc.stdout, on_stdout, None, tail_bytes, activity)),
+        asyncio.ensure_future(_read_stream(proc.stderr, on_stderr, tail, tail_bytes, activity)),
+    ]
+    cancelled = timed_out = False
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(proc.wait()), poll_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            if stop_event is not None and stop_event.is_set():
+                cancelled = True
+            elif timeout is not None and now - started > timeout:
+                timed_out = True
+            elif idle_timeout is not None and now - activity[0] > idle_timeout:
+                timed_out = True
+            else:
+                continue
+            _signal_tree(proc, force=False)
+            try:
+                await asyncio.wait_for(asyncio.shield(proc.wait()), kill_grace)
+            except asyncio.TimeoutError:
+                _signal_tree(proc, force=True)
+                await proc.wait()
+            break
+    finally:
+        if proc.returncode is None:
+            _signal_tree(proc, force=True)
+            await proc.wait()
+        # 孙进程可能仍持有管道，读取最多再等一个宽限期
+        _, pending = await asyncio.wait(readers, timeout=kill_grace)
+        for task in pending:
+            task.cancel()
+
+    return ProcessResult(
+        returncode=proc.returncode,
+        stderr_tail=bytes(tail).decode("utf-8", errors="replace"),
+        cancelled=cancelled,
+        timed_out=timed_out,
+        duration=time.monotonic() - started,
+        spawn_duration=started - spawn_start,
+        pid=proc.pid
+    )
+
+
+def run_process(cmd, on_stdout=None, on_stderr=None, stop_event=None, timeout=None, idle_timeout=None,
+                kill_grace=3.0, poll_interval=0.1, tail_bytes=STDERR_TAIL_BYTES):
+    """
+    运行子进程直到结束，阻塞调用线程（每次调用使用独立的事件循环，可在任意线程中使用）
+    on_stdout/on_stderr 按行回调（已解码）；stderr 的最后 tail_bytes 字节保存在结果的 stderr_tail 中
+    stop_event 置位、总时长超过 timeout 或超过 idle_timeout 秒没有任何输出时结束整个进程树：
+    先正常终止，kill_grace 秒后仍未退出则强制结束
+    """
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_run(
+            cmd, on_stdout, on_stderr, stop_event, timeout, idle_timeout, kill_grace, poll_interval, tail_bytes
+        ))
+    finally:
+        loop.close()
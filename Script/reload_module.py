@@ -1,814 +1,530 @@
-import tkinter as tk
-from tkinter import ttk, scrolledtext, filedialog, messagebox, simpledialog
+import hashlib
 import json
 import logging
 import os
-import queue
+import re
 import threading
-import sys
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from datetime import datetime
 
+from av import av2bv
 from download_module import BilibiliDownloader
-from merge_module import merge_m4s_files
-from reload_module import CacheReloader
-from search_module import AdvancedSearchEngine
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('app.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-
-
-class GUIHandler(logging.Handler):
-    def __init__(self, log_queue: queue.Queue):
-        super().__init__()
-        self.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
-        self.log_queue = log_queue
-
-    def emit(self, record):
-        log_entry = self.format(record)
-        try:
-            self.log_queue.put_nowait(log_entry)
-        except queue.Full:
-            pass
-
-
-class AppLogger:
-    @classmethod
-    def setup(cls, log_queue: queue.Queue):
-        gui_handler = GUIHandler(log_queue)
-        for name in ['DownloadModule', 'ReloadModule', 'SearchModule']:
-            logger = logging.getLogger(name)
-            logger.addHandler(gui_handler)
-            logger.propagate = False
-
-
-class BilibiliToolkitGUI:
-    QUALITY_OPTIONS = [
-        ("8K", 127), ("4K", 126), ("1080P60", 125),
-        ("1080P+", 120), ("1080P", 116), ("720P60", 112),
-        ("720P", 100), ("480P", 80), ("360P", 16)
-    ]
-
-    def __init__(self, root):
-        self.bilibilio_url = '感觉不错的话就充个电支持一下吧~'
-        self.root = root
-        self.config = self.load_config()
-        self.log_queue = queue.Queue(maxsize=200)
-        self.download_stop_event = threading.Event()
-        self.reload_stop_event = threading.Event()
-        self.current_reloader = None
-        self.download_running = False
-        self.reload_running = False
-        self.setup_donation_links()
-
-        self.setup_ui()
-        AppLogger.setup(self.log_queue)
-        self.start_log_poller()
-        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
-
-    def setup_donation_links(self):
-        """在所有页面添加赞助链接"""
-        bilibili_uid = "504668072"  # 例如：12345678
-        self.bilibili_url = f"https://space.bilibili.com/{bilibili_uid}"
-
-        # 统一样式配置
-        self.link_style = {
-            "foreground": "#00A1D6",  # B站主题色
-            "font": ("微软雅黑", 9, "underline"),
-            "cursor": "hand2"
-        }
-
-    def add_donation_link(self, parent):
-        """在指定父容器添加赞助链接"""
-        link_frame = ttk.Frame(parent)
-        link_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
-
-        label = ttk.Label(
-            link_frame,
-            text="♥ 作者B站:@郭逍遥",
-            **self.link_style
-        )
-        label.pack(side=tk.RIGHT, padx=10)
+from merge_module import DUPLICATE_MODES, fingerprint_pair, link_output, merge_m4s_files, safe_filename, verify_mp4
+from trace_module import tracer
+
+reload_logger = logging.getLogger('ReloadModule')
+
+# 电脑缓存 m4s 文件名形如 <cid>-<序号>-<编码>.m4s，编码 = 30000 + 画质 qn（视频）
+AUDIO_CODES = {30216, 30232, 30280, 30250, 30251}
+M4S_CODE_PATTERN = re.compile(r"-(\d+)\.m4s$", re.IGNORECASE)
+# 合并时先写入 <名称>.<key哈希>.<重载编号>.reloading.mp4，校验完整后再改名
+TEMP_SUFFIX = ".reloading"
+
+
+class ReloadJournal:
+    """
+    重载断点记录：输出目录下每个重载来源一个追加写入的 JSON Lines 文件，
+    每行记录一个条目的状态变化 pending -> stripping -> merging（或 downloading）-> verified / failed，
+    内容与已合并条目相同而跳过的条目为 duplicate；stripping / merging 时记下临时文件名（temp），
+    下次重载时据此清理崩溃留下的临时文件
+    打开时回放得到每个条目的最新状态（字典查找），并压缩成每个条目一行；
+    写到一半的最后一行（进程崩溃）直接忽略
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue
+            self._compact()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def path_for(output_dir, device_type, source):
+        """同一来源（设备类型 + 缓存目录或AV号列表文件）重复重载时使用同一个记录文件"""
+        run_id = hashlib.sha1(f"{device_type}|{source}".encode("utf-8")).hexdigest()[:12]
+        return Path(output_dir) / f".reload-{run_id}.journal"
+
+    def _compact(self):
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self.entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def mark(self, key, state, **info):
+        """记录条目的新状态；verified 时立即落盘，保证已完成的条目不会因崩溃而丢失"""
+        entry = {"key": key, "state": state, "time": time.time(), **info}
+        with self._lock:
+            self.entries[key] = entry
+            if self._file is None:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            if state == "verified":
+                os.fsync(self._file.fileno())
+
+    def mark_pending(self, keys):
+        """把尚无记录的条目登记为 pending（一次写入）"""
+        with self._lock:
+            lines = []
+            for key in keys:
+                if key not in self.entries:
+                    self.entries[key] = {"key": key, "state": "pending"}
+                    lines.append(json.dumps(self.entries[key], ensure_ascii=False) + "\n")
+            if lines and self._file is not None:
+                self._file.writelines(lines)
+                self._file.flush()
+
+    def stale_temps(self):
+        """未完成的条目记录的临时文件名（上次重载中断时可能留在输出目录中）"""
+        with self._lock:
+            return [entry["temp"] for entry in self.entries.values()
+                    if entry.get("temp") and entry["state"] not in ("verified", "duplicate")]
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReloadItem:
+    """一个待重载的缓存视频（一个分P）"""
+
+    def __init__(self, key, bvid, title, folder, video=None, audio=None):
+        self.key = key          # 相对 cache_root 的路径，或手机模式下的AV号
+        self.bvid = bvid
+        self.title = title
+        self.folder = folder    # 记录到下载记录中的文件夹名
+        self.video = video
+        self.audio = audio
+        self.name = None        # 本次重载内唯一的输出名，由 CacheReloader.assign_output_names 分配
+
+    @property
+    def is_local(self):
+        return bool(self.video and self.audio)
+
+    @property
+    def digest(self):
+        return hashlib.sha1(self.key.encode("utf-8")).hexdigest()[:8]
+
+    def output_name(self):
+        return self.name or safe_filename(self.title) or self.bvid or self.key
+
+    def temp_name(self, run_id):
+        """
+        合并时的临时文件名（不含扩展名），带上 key 的哈希与本次重载的编号：
+        不同条目、不同重载之间不会共用同一个临时文件，清理时只会删到本次写入的文件
+        """
+        return f"{self.output_name()}.{self.digest}.{run_id}{TEMP_SUFFIX}"
+
+
+class CacheReloader:
+    """
+    缓存重载引擎
+    - 电脑缓存：扫描 cache_root 下带 .videoInfo 的文件夹，选出画质最接近的视频流与音频流合并
+    - 手机缓存：按导出的AV号列表本地换算BV号；cache_root 下有手机缓存副本时直接合并，否则按画质重新下载
+    合并任务在 max_threads 个工作线程上执行（每个线程一个 ffmpeg 进程），进度按完成数汇总
+    每个条目的进度写入 ReloadJournal：中断后再次重载时跳过已校验的条目，重做写到一半的条目；
+    输出目录中已有、但记录里不属于该条目的文件不会被认领、覆盖或删除
+    与已合并条目内容（抽样指纹）相同的条目按配置 duplicate_mode 硬链接已有输出（link）、跳过（skip）或照常合并（off）
+    """
+
+    def __init__(self, config, stop_event, progress_callback, log_callback,
+                 device_type="computer", phone_file=None, max_threads=1):
+        self.config = config
+        self.cache_root = config.get('cache_root', '')
+        self.output_dir = config.get('output_dir', '') or os.getcwd()
+        self.stop_event = stop_event or threading.Event()
+        self.progress_callback = progress_callback
+        self.log_callback = log_callback
+        self.device_type = device_type
+        self.phone_file = phone_file
+        self.max_threads = max(1, int(max_threads or 1))
+        self._lock = threading.Lock()
+        self.total = 0
+        self.finished = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.skipped = 0
+        self.duplicates = 0
+        self.journal = None
+        self.duplicate_mode = config.get('duplicate_mode', 'link')
+        if self.duplicate_mode not in DUPLICATE_MODES:
+            raise ValueError(f"未知的重复条目处理方式：{self.duplicate_mode}")
+        self.fingerprints = None
+        self.run_id = os.urandom(4).hex()
+
+    # ---------- 扫描 ----------
+
+    @staticmethod
+    def _m4s_code(path):
+        match = M4S_CODE_PATTERN.search(path.name)
+        return int(match.group(1)) if match else None
+
+    @staticmethod
+    def _pick_streams(m4s_files, quality):
+        """
+        从一个缓存文件夹的 m4s 文件中选出 (视频, 音频)
+        视频取不高于所选画质的最高画质，都高于所选画质时取最低画质；
+        文件名中没有画质编码时按大小区分（大的为视频）
+        """
+        videos, audios, unknown = [], [], []
+        for path in m4s_files:
+            code = CacheReloader._m4s_code(path)
+            if code is None:
+                unknown.append(path)
+            elif code in AUDIO_CODES:
+                audios.append((code, path))
+            else:
+                videos.append((code - 30000 if 30000 < code < 30200 else code, path))
+
+        if not videos or not audios:
+            if len(m4s_files) != 2:
+                return None, None
+            video, audio = sorted(m4s_files, key=lambda p: p.stat().st_size, reverse=True)
+            return video, audio
 
-        label.bind("<Button-1>", lambda e: self.open_bilibili())
-        label.bind("<Enter>", lambda e: label.config(foreground="#FF6699"))
-        label.bind("<Leave>", lambda e: label.config(foreground="#00A1D6"))
+        lower = [v for v in videos if v[0] <= quality]
+        video = max(lower)[1] if lower else min(videos)[1]
+        audio = max(audios, key=lambda a: a[1].stat().st_size)[1]
+        return video, audio
 
-    def open_bilibili(self):
-        """打开B站主页"""
+    @staticmethod
+    def _read_json(path):
         try:
-            import webbrowser
-            webbrowser.open_new(self.bilibili_url)
-            self.log_message(f"已打开浏览器访问：{self.bilibilio_url}")
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
         except Exception as e:
-            messagebox.showerror("错误", f"无法打开链接：{str(e)}")
-            logging.error(f"链接打开失败：{str(e)}")
-
-    def setup_ui(self):
-        self.root.title("B站缓存工具箱(By.郭逍遥) v1.0")
-        self.root.geometry("1200x600")
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(fill='both', expand=True, padx=10, pady=10)
-
-        self.setup_download_tab(notebook)
-        self.setup_reload_tab(notebook)
-        self.setup_search_tab(notebook)
-        self.setup_merge_tab(notebook)
-        self.setup_settings_tab(notebook)
-
-        log_frame = ttk.LabelFrame(self.root, text="操作日志")
-        log_frame.pack(pady=5, padx=10, fill=tk.BOTH, expand=True)
-        self.log_text = scrolledtext.ScrolledText(log_frame, state='disabled')
-        self.log_text.pack(fill=tk.BOTH, expand=True)
-
-    def setup_download_tab(self, notebook):
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="视频下载")
-        frame = ttk.LabelFrame(tab, text="下载配置")
-        frame.pack(pady=10, padx=10, fill=tk.X)
-
-        ttk.Label(frame, text="视频URL:").grid(row=0, column=0, padx=5, sticky='w')
-        self.url_entry = ttk.Entry(frame, width=50)
-        self.url_entry.grid(row=0, column=1, padx=5, sticky='ew')
-
-        ttk.Label(frame, text="画质选择:").grid(row=1, column=0, padx=5, sticky='w')
-        self.quality_var = tk.StringVar(value="720P")
-        quality_combo = ttk.Combobox(
-            frame, textvariable=self.quality_var,
-            values=[q[0] for q in self.QUALITY_OPTIONS], state="readonly", width=15
-        )
-        quality_combo.grid(row=1, column=1, padx=5, sticky='w')
-
-        self.collection_var = tk.BooleanVar()
-        ttk.Checkbutton(frame, text="下载合集", variable=self.collection_var).grid(row=2, column=1, sticky='w')
-
-        self.download_progress = ttk.Progressbar(frame, orient="horizontal", mode="determinate", length=400)
-        self.download_progress.grid(row=3, column=0, columnspan=2, pady=10)
-
-        btn_frame = ttk.Frame(frame)
-        btn_frame.grid(row=4, column=0, columnspan=2, pady=5)
-        self.download_btn = ttk.Button(btn_frame, text="开始下载", command=self.start_download)
-        self.download_btn.pack(side=tk.LEFT, padx=5)
-        self.stop_download_btn = ttk.Button(btn_frame, text="停止下载", command=self.stop_download, state="disabled")
-        self.stop_download_btn.pack(side=tk.LEFT, padx=5)
-        self.add_donation_link(tab)
-
-        text_frame = ttk.Frame(frame)
-        text_frame.grid(row=6, column=1, columnspan=5, pady=5)
-        ttk.Label(
-            text_frame,
-            text="注意：AV号下载的视频有可能下载失败或者合并失败(导致视频大小为0)，\n可以去B站找到正确的BV号(原因可能是AV号获取BV号使用的B站API接口\n问题导致的不一致，但是都能正常访问)，合并错误只会在操作日志中显示",
-            foreground="red"
-        ).grid(row=2, column=0, columnspan=3, padx=5)
-
-    def setup_reload_tab(self, notebook):
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="缓存重载")
-        frame = ttk.LabelFrame(tab, text="重载配置")
-        frame.pack(pady=10, padx=10, fill=tk.X)
-
-        # 设备类型单选按钮
-        device_frame = ttk.Frame(frame)
-        device_frame.grid(row=0, column=0, columnspan=2, pady=5, sticky='w')
-
-        self.device_var = tk.StringVar(value="computer")
-        ttk.Radiobutton(
-            device_frame, text="电脑缓存",
-            variable=self.device_var,
-            value="computer",
-            command=self.toggle_device_input
-        ).pack(side=tk.LEFT, padx=5)
-
-        ttk.Radiobutton(
-            device_frame, text="手机缓存",
-            variable=self.device_var,
-            value="phone",
-            command=self.toggle_device_input
-        ).pack(side=tk.LEFT, padx=5)
-
-        # 手机文件选择框
-        self.phone_file_frame = ttk.Frame(frame)
-        self.phone_file_frame.grid(row=1, column=0, columnspan=2, pady=5, sticky='ew')
-
-        self.phone_file_entry = ttk.Entry(self.phone_file_frame, width=50)
-        self.phone_file_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-
-        ttk.Button(
-            self.phone_file_frame,
-            text="选择缓存文件",
-            command=self.select_phone_file
-        ).pack(side=tk.LEFT, padx=5)
-
-        config_frame = ttk.Frame(frame)
-        config_frame.grid(row=2, column=0, columnspan=3, pady=5, sticky='w')
-
-        # 画质选择
-        ttk.Label(config_frame, text="画质选择:").pack(side=tk.LEFT, padx=5)
-        self.reload_quality_var = tk.StringVar(value="720P")
-        quality_combo = ttk.Combobox(
-            config_frame, textvariable=self.reload_quality_var,
-            values=[q[0] for q in self.QUALITY_OPTIONS], state="readonly", width=12
-        )
-        quality_combo.pack(side=tk.LEFT, padx=5)
-
-        # 线程数选择
-        ttk.Label(config_frame, text="并发线程:").pack(side=tk.LEFT, padx=5)
-        self.thread_var = tk.IntVar(value=self.config.get('thread_count', 1))
-        thread_combo = ttk.Combobox(
-            config_frame, textvariable=self.thread_var,
-            values=[1, 2, 4, 8], state="readonly", width=4
-        )
-        thread_combo.pack(side=tk.LEFT, padx=5)
-
-        self.reload_progress = ttk.Progressbar(frame, orient="horizontal", mode="determinate", length=400)
-        self.reload_progress.grid(row=3, column=0, columnspan=3, pady=10)
-
-        btn_frame = ttk.Frame(frame)
-        btn_frame.grid(row=4, column=0, columnspan=3, pady=5)
-        self.reload_btn = ttk.Button(btn_frame, text="开始重载", command=self.start_reload)
-        self.reload_btn.pack(side=tk.LEFT, padx=5)
-        self.stop_reload_btn = ttk.Button(btn_frame, text="停止重载", command=self.stop_reload, state="disabled")
-        self.stop_reload_btn.pack(side=tk.LEFT, padx=5)
-        self.add_donation_link(tab)
-
-        text_frame = ttk.Frame(frame)
-        text_frame.grid(row=6, column=1, columnspan=5, pady=5)
-        ttk.Label(
-            text_frame,
-            text="注意：AV号下载的视频有可能下载失败或者合并失败(导致视频大小为0)，\n可以去B站找到正确的BV号(原因可能是AV号获取BV号使用的B站API接口\n问题导致的不一致，但是都能正常访问)，合并错误只会在操作日志中显示",
-            foreground="red"
-        ).grid(row=2, column=0, columnspan=3, padx=5)
-
-        # 初始隐藏手机文件框
-        self.phone_file_frame.grid_remove()
-
-    def setup_merge_tab(self, notebook):
-        """文件合并选项卡"""
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="文件合并")
-
-        main_frame = ttk.Frame(tab)
-        main_frame.pack(pady=20, padx=20, fill=tk.BOTH, expand=True)
-
-        # 文件选择部分
-        file_frame = ttk.LabelFrame(main_frame, text="选择文件")
-        file_frame.pack(fill=tk.X, pady=5)
-
-        # 视频文件
-        self.video_path = tk.StringVar()
-        ttk.Label(file_frame, text="文件一:").grid(row=0, column=0, padx=5, sticky='w')
-        ttk.Entry(file_frame, textvariable=self.video_path, width=50).grid(row=0, column=1, padx=5)
-        ttk.Button(
-            file_frame,
-            text="浏览",
-            command=lambda: self.select_file(self.video_path, [("MP4分段文件", "*.m4s")])
-        ).grid(row=0, column=2, padx=5)
-
-        # 音频文件
-        self.audio_path = tk.StringVar()
-        ttk.Label(file_frame, text="文件二:").grid(row=1, column=0, padx=5, sticky='w')
-        ttk.Entry(file_frame, textvariable=self.audio_path, width=50).grid(row=1, column=1, padx=5)
-        ttk.Button(
-            file_frame,
-            text="浏览",
-            command=lambda: self.select_file(self.audio_path, [("MP4分段文件", "*.m4s")])
-        ).grid(row=1, column=2, padx=5)
-
-        # 输出设置
-        output_frame = ttk.LabelFrame(main_frame, text="输出设置")
-        output_frame.pack(fill=tk.X, pady=5)
-
-        ttk.Label(output_frame, text="输出目录:").grid(row=0, column=0, padx=5, sticky='w')
-        self.merge_output_entry = ttk.Entry(output_frame, width=50)
-        self.merge_output_entry.grid(row=0, column=1, padx=5)
-        ttk.Button(
-            output_frame,
-            text="浏览",
-            command=lambda: self.select_dir(self.merge_output_entry)
-        ).grid(row=0, column=2, padx=5)
-
-        ttk.Label(output_frame, text="输出文件名:").grid(row=1, column=0, padx=5, sticky='w')
-        self.merge_filename_entry = ttk.Entry(output_frame, width=50)
-        self.merge_filename_entry.grid(row=1, column=1, padx=5)
-        # 如果有默认名字可以设置
-        self.merge_filename_entry.insert(0, "自定义名称")
-        ttk.Label(
-            output_frame,
-            text="注意，会生成临时文件，合并完成后会清除掉（因为电脑缓存的m4s文件头会多九个0）",
-            foreground="red"
-        ).grid(row=2, column=0, columnspan=3, padx=5)
-
-        # 合并按钮
-        btn_frame = ttk.Frame(main_frame)
-        btn_frame.pack(pady=10)
-        self.merge_btn = ttk.Button(
-            btn_frame,
-            text="开始合并",
-            command=self.start_merge
-        )
-        self.merge_btn.pack(side=tk.LEFT, padx=10)
-
-        self.merge_status = ttk.Label(main_frame, text="准备就绪", foreground="gray")
-        self.merge_status.pack()
-
-        self.add_donation_link(tab)
-
-        # 初始化输出目录
-        self.merge_output_entry.insert(0, self.config.get('output_dir', ''))
-
-    def toggle_device_input(self):
-        """切换设备类型显示"""
-        if self.device_var.get() == "phone":
-            self.phone_file_frame.grid()
+            reload_logger.warning(f"解析失败 {path}: {str(e)}")
+            return {}
+
+    def _discover_computer(self, quality):
+        index = BilibiliDownloader.get_cache_index()
+        index.refresh(self.cache_root)
+        root = Path(self.cache_root)
+        items = []
+        for folder, bvid in index.iter_folders(self.cache_root):
+            if self.stop_event.is_set():
+                break
+            folder = Path(folder)
+            info = self._read_json(folder / ".videoInfo")
+            title = info.get("groupTitle") or info.get("title") or bvid
+            part = info.get("title")
+            if info.get("groupTitle") and part and part != title:
+                title = f"{title} - P{info.get('p', '')} {part}"
+            video, audio = self._pick_streams(sorted(folder.glob("*.m4s")), quality)
+            if not video:
+                self.log_callback(f"跳过 {folder.name}：未找到可合并的音视频文件")
+                continue
+            relative = str(folder.relative_to(root)) if folder != root else folder.name
+            items.append(ReloadItem(relative, bvid, title, relative, video, audio))
+        return items
+
+    def _discover_phone_local(self, folder, quality):
+        """解析 cache_root/<AV号> 下的手机缓存副本：c_<cid>/entry.json + <qn>/video.m4s、audio.m4s"""
+        items = []
+        for part_dir in sorted(p for p in folder.iterdir() if p.is_dir()):
+            entry = self._read_json(part_dir / "entry.json") if (part_dir / "entry.json").exists() else {}
+            streams = []
+            for qn_dir in part_dir.iterdir():
+                video, audio = qn_dir / "video.m4s", qn_dir / "audio.m4s"
+                if qn_dir.is_dir() and video.exists() and audio.exists():
+                    qn = int(qn_dir.name) if qn_dir.name.isdigit() else 0
+                    streams.append((qn, video, audio))
+            if not streams:
+                continue
+            lower = [s for s in streams if s[0] <= quality]
+            _, video, audio = max(lower) if lower else min(streams)
+            title = entry.get("title") or folder.name
+            page = entry.get("page_data") or {}
+            if page.get("part") and page.get("part") != title:
+                title = f"{title} - P{page.get('page', '')} {page['part']}"
+            relative = f"{folder.name}/{part_dir.name}"
+            items.append(ReloadItem(relative, entry.get("bvid") or "", title, relative, video, audio))
+        return items
+
+    def _discover_phone(self, quality):
+        with open(self.phone_file, "r", encoding="utf-8", errors="ignore") as f:
+            names = [line.strip() for line in f if line.strip()]
+        items = []
+        for name in names:
+            aid = name.lower().lstrip("av")
+            if not aid.isdigit():
+                self.log_callback(f"跳过无法识别的文件夹名：{name}")
+                continue
+            try:
+                bvid = av2bv(aid)
+            except ValueError as e:
+                self.log_callback(f"跳过 {name}：{str(e)}")
+                continue
+            local = Path(self.cache_root) / name if self.cache_root else None
+            local_items = self._discover_phone_local(local, quality) if local and local.is_dir() else []
+            for item in local_items:
+                item.bvid = item.bvid or bvid
+            items.extend(local_items or [ReloadItem(name, bvid, bvid, name)])
+        return items
+
+    def discover(self, quality):
+        if self.device_type == "phone":
+            items = self._discover_phone(quality)
         else:
-            self.phone_file_frame.grid_remove()
-
-    def select_phone_file(self):
-        """选择手机缓存文件"""
-        file_path = filedialog.askopenfilename(
-            title="选择手机缓存文件",
-            filetypes=[("Text files", "*.txt")]
-        )
-        if file_path:
-            self.phone_file_entry.delete(0, tk.END)
-            self.phone_file_entry.insert(0, file_path)
-
-    def select_file(self, target_var, filetypes):
-        """文件选择方法"""
-        path = filedialog.askopenfilename(filetypes=filetypes)
-        if path:
-            target_var.set(path)
-
-    def setup_search_tab(self, notebook):
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="视频搜索")
-        frame = ttk.LabelFrame(tab, text="搜索配置")
-        frame.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
-
-        search_frame = ttk.Frame(frame)
-        search_frame.pack(fill=tk.X, pady=5)
-        ttk.Label(search_frame, text="关键词:").pack(side=tk.LEFT, padx=5)
-        self.search_entry = ttk.Entry(search_frame, width=40)
-        self.search_entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
-        self.search_entry.bind("<Return>", lambda e: self.start_search())
-        ttk.Button(search_frame, text="搜索", command=self.start_search).pack(side=tk.LEFT, padx=5)
-
-        self.search_progress = ttk.Progressbar(frame, orient="horizontal", mode="determinate")
-        self.search_progress.pack(fill=tk.X, pady=5)
-
-        self.search_results = ttk.Treeview(frame, columns=("title", "path", "bvid"), show="headings")
-        self.search_results.heading("title", text="视频标题")
-        self.search_results.heading("path", text="原缓存路径")
-        self.search_results.heading("bvid", text="BV号")
-        self.search_results.column("title", width=400)
-        self.search_results.column("path", width=300)
-        self.search_results.column("bvid", width=100)
-        self.search_results.pack(fill=tk.BOTH, expand=True)
-        self.add_donation_link(tab)
-
-        self.context_menu = tk.Menu(self.root, tearoff=0)
-        self.context_menu.add_command(label="打开文件夹", command=self.open_selected_folder)
-        self.context_menu.add_command(label="重命名标题", command=self.rename_title)
-        self.context_menu.add_command(label="删除记录", command=self.delete_record)
-        self.search_results.bind("<Button-3>", self.show_context_menu)
-
-    def setup_settings_tab(self, notebook):
-        tab = ttk.Frame(notebook)
-        notebook.add(tab, text="系统设置")
-        frame = ttk.LabelFrame(tab, text="配置管理")
-        frame.pack(pady=10, padx=10, fill=tk.BOTH, expand=True)
-
-        ttk.Label(frame, text="缓存目录:").grid(row=0, column=0, padx=5, sticky='w')
-        self.cache_entry = ttk.Entry(frame, width=50)
-        self.cache_entry.grid(row=0, column=1, padx=5)
-        ttk.Button(frame, text="浏览", command=lambda: self.select_dir(self.cache_entry)).grid(row=0, column=2)
-
-        ttk.Label(frame, text="输出目录:").grid(row=1, column=0, padx=5, sticky='w')
-        self.output_entry = ttk.Entry(frame, width=50)
-        self.output_entry.grid(row=1, column=1, padx=5)
-        ttk.Button(frame, text="浏览", command=lambda: self.select_dir(self.output_entry)).grid(row=1, column=2)
-
-        ttk.Label(frame, text="SESSDATA:").grid(row=2, column=0, padx=5, sticky='w')
-        self.sessdata_entry = ttk.Entry(frame, width=50, show="*")
-        self.sessdata_entry.grid(row=2, column=1, padx=5)
-
-        btn_frame = ttk.Frame(frame)
-        btn_frame.grid(row=3, column=0, columnspan=3, pady=10, sticky='ew')
-        ttk.Button(btn_frame, text="保存配置", command=self.save_config).pack(side=tk.LEFT, padx=5, fill=tk.X,
-                                                                              expand=True)
-        ttk.Button(btn_frame, text="打开下载记录", command=self.open_download_records).pack(side=tk.LEFT, padx=5,
-                                                                                            fill=tk.X, expand=True)
-        ttk.Button(btn_frame, text="打开错误日志", command=self.open_error_logs).pack(side=tk.LEFT, padx=5, fill=tk.X,
-                                                                                      expand=True)
-        ttk.Label(
-            frame,
-            text="如果觉得本工具不错的话，请支持一下作者哦~(By.郭逍遥)",
-            foreground="red"
-        ).grid(row=4, column=0, columnspan=3, pady=(10, 0), sticky='w')
-
-        self.cache_entry.insert(0, self.config.get('cache_root', ''))
-        self.output_entry.insert(0, self.config.get('output_dir', ''))
-        self.sessdata_entry.insert(0, self.config.get('sessdata', ''))
-        self.add_donation_link(tab)
-
-    def start_download(self):
-        if self.download_running:
-            messagebox.showwarning("警告", "当前有下载任务正在运行")
-            return
-
-        self.download_stop_event.clear()
-        url = self.url_entry.get().strip()
-        if not url:
-            messagebox.showerror("错误", "请输入视频URL")
-            return
-
-        if not os.path.exists(self.config['output_dir']):
-            messagebox.showerror("错误", "输出目录不存在！")
-            return
-        if not os.access(self.config['output_dir'], os.W_OK):
-            messagebox.showerror("错误", "输出目录无写入权限！")
-            return
-
-        quality = next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.quality_var.get())
-
-        self.download_running = True
-        BilibiliDownloader.start_download(
-            url=url,
+            items = self._discover_computer(quality)
+        self.assign_output_names(items)
+        return items
+
+    @staticmethod
+    def assign_output_names(items, max_length=150):
+        """
+        为每个条目分配本次重载内唯一的输出名（不区分大小写）：标题重复时依次尝试 标题_bvid、标题_key，
+        仍重复时再加序号；按扫描顺序分配，同样的缓存在多次重载之间得到同样的名称
+        """
+        used = set()
+        for item in items:
+            base = safe_filename(item.title) or item.bvid or safe_filename(item.key)
+            suffixes = [""]
+            if item.bvid:
+                suffixes.append(f"_{item.bvid}")
+            suffixes.append(f"_{safe_filename(item.key)}")
+            candidates = (safe_filename(base, max_length - len(suffix)) + suffix for suffix in suffixes)
+            name = next((c for c in candidates if c.lower() not in used), None)
+            number = 2
+            while name is None:
+                suffix = f"_{safe_filename(item.key)}_{number}"
+                candidate = safe_filename(base, max_length - len(suffix)) + suffix
+                name = candidate if candidate.lower() not in used else None
+                number += 1
+            used.add(name.lower())
+            item.name = name
+
+    # ---------- 执行 ----------
+
+    def _report(self, status):
+        with self._lock:
+            self.finished += 1
+            if status == "success":
+                self.succeeded += 1
+            elif status == "skipped":
+                self.skipped += 1
+            else:
+                self.failed += 1
+            percent = int(self.finished / self.total * 100) if self.total else 100
+        if percent < 100:
+            self.progress_callback(percent)
+
+    def _download_item(self, item, quality):
+        """手机模式下本地没有缓存副本时，按画质重新下载"""
+        entry = self.journal.get(item.key)
+        if entry and entry["state"] == "verified":
+            self.log_callback(f"已下载，跳过：{item.key}")
+            return "skipped"
+        self.journal.mark(item.key, "downloading")
+        # 以 yutto 的退出状态判断成败：进度到 100% 后非零退出仍算失败
+        success = BilibiliDownloader.download_video(
+            url=item.bvid,
             quality=quality,
-            is_collection=self.collection_var.get(),
-            output_dir=self.config['output_dir'],
-            cache_root=self.config['cache_root'],
-            sessdata=self.config['sessdata'],
-            progress_callback=self.update_download_progress,
-            log_callback=self.log_message,
-            stop_event=self.download_stop_event
+            is_collection=False,
+            output_dir=self.output_dir,
+            cache_root=self.cache_root,
+            sessdata=self.config.get('sessdata', ''),
+            progress_callback=lambda p: None,
+            log_callback=self.log_callback,
+            stop_event=self.stop_event
         )
-        self.toggle_buttons(self.download_btn, self.stop_download_btn, False)
-
-    def start_merge(self):
-        # 获取文件路径和输出目录
-        video_path = self.video_path.get()
-        audio_path = self.audio_path.get()
-        output_dir = self.merge_output_entry.get()
-        filename = self.merge_filename_entry.get().strip()
-
-        # 校验输入
-        if not all([video_path, audio_path, output_dir]):
-            messagebox.showwarning("提示", "请填写完整文件路径和输出目录")
-            return
-        if Path(video_path).resolve() == Path(audio_path).resolve():
-            messagebox.showwarning("提示", "视频和音频文件不能相同")
-            return
-
-        # 开启后台线程执行合并
-        threading.Thread(target=self._do_merge, args=(video_path, audio_path, output_dir, filename)).start()
-
-    def _do_merge(self, video_path, audio_path, output_dir, filename):
+        if not success:
+            if self.stop_event.is_set():
+                return "cancelled"
+            self.journal.mark(item.key, "failed", error="下载失败")
+            return "failed"
+        self.journal.mark(item.key, "verified")
+        return "success"
+
+    def _finished_output(self, item):
+        """记录中本条目已校验、且记录的输出文件仍在并且大小未变时返回该文件，否则返回 None"""
+        entry = self.journal.get(item.key)
+        if not entry or entry["state"] != "verified" or not entry.get("output"):
+            return None
+        output_path = Path(self.output_dir) / entry["output"]
         try:
-            self._set_merge_ui_state(disabled=True, text="正在合并...", color="blue")
-            self.log_message("开始验证文件")
-            # 验证文件存在
-            for p in [video_path, audio_path]:
-                if not Path(p).exists():
-                    raise FileNotFoundError(f"文件不存在：{p}")
-
-            # 生成输出路径（用用户自定义的名字）
-            if filename:
-                save_name = filename + ".mp4"
-            else:
-                save_name = "合并_" + datetime.now().strftime("%Y%m%d_%H%M%S")
-            output_path = Path(output_dir) / save_name
-
-            self.log_message(f"输出文件：{output_path}")
-
-            # 调用合并
-            self.log_message("开始合并中，请稍候...")
-            merged_path = merge_m4s_files([video_path, audio_path], output_dir, filename)
-
-            self.log_message(f"合并成功：{merged_path}")
-            self._set_merge_ui_state(text=f"✓ 合并完成：{Path(merged_path).name}", color="green")
-            messagebox.showinfo("成功", f"文件已保存到：\n{merged_path}")
-        except Exception as e:
-            self._set_merge_ui_state(text="合并失败", color="red")
-            self.log_message(f"错误：{str(e)}")
-            messagebox.showerror("错误", f"合并失败：\n{str(e)}")
+            size = output_path.stat().st_size
+        except OSError:
+            return None
+        return output_path if size == entry.get("size") else None
+
+    def _free_output_path(self, item):
+        """
+        本条目的输出路径：<名称>.mp4 已存在（不是本条目写入的文件）时改用 <名称>_<key哈希>.mp4，
+        仍存在时再加序号，不覆盖已有文件
+        """
+        name = item.output_name()
+        output_path = Path(self.output_dir) / f"{name}.mp4"
+        if not output_path.exists():
+            return output_path
+        number = 1
+        candidate = Path(self.output_dir) / f"{name}_{item.digest}.mp4"
+        while candidate.exists():
+            number += 1
+            candidate = Path(self.output_dir) / f"{name}_{item.digest}_{number}.mp4"
+        self.log_callback(f"{output_path.name} 已存在且不是本条目的输出，改为输出到：{candidate.name}")
+        return candidate
+
+    def _process(self, item, quality):
+        if self.stop_event.is_set():
+            return "cancelled"
+        if not item.is_local:
+            return self._download_item(item, quality)
+
+        finished = self._finished_output(item)
+        if finished is not None:
+            self.log_callback(f"已存在，跳过：{finished.name}")
+            return "skipped"
+        output_path = self._free_output_path(item)
+
+        fingerprint = None
+        if self.fingerprints is not None:
+            fingerprint = fingerprint_pair(str(item.video), str(item.audio))
+            existing = self.fingerprints.acquire(fingerprint, self.stop_event)
+            if existing:
+                return self._reuse_duplicate(item, existing, output_path)
+
+        temp_name = item.temp_name(self.run_id)
+        temp_path = Path(self.output_dir) / f"{temp_name}.mp4"
+        merged = False
+        try:
+            self.log_callback(f"开始合并：{item.key} -> {output_path.name}")
+            # 先记下临时文件名再开始写入，进程被杀掉时下次重载也能找到并清理它
+            self.journal.mark(item.key, "stripping", temp=temp_path.name)
+            result = merge_m4s_files(
+                [str(item.video), str(item.audio)], self.output_dir, temp_name,
+                stop_event=self.stop_event,
+                stage_callback=lambda stage: self.journal.mark(item.key, stage, temp=temp_path.name)
+            )
+            if not verify_mp4(temp_path):
+                raise RuntimeError("输出文件不完整")
+            os.replace(temp_path, output_path)
+            merged = True
+        except BaseException:
+            # 临时文件名带本次重载的编号，存在即为本次写入
+            if temp_path.exists():
+                os.remove(temp_path)
+            raise
         finally:
-            self._set_merge_ui_state(disabled=False)
-
-    def _set_merge_ui_state(self, disabled=False, text="准备就绪", color="gray"):
-        self.merge_btn.config(state="disabled" if disabled else "normal")
-        self.merge_status.config(text=text, foreground=color)
-        self.root.update_idletasks()
-
-    def log_message(self, message):
-        # 假设你有一个tk.Text控件self.log_box
-        self.log_box.config(state='normal')
-        self.log_box.insert(tk.END, message + "\n")
-        self.log_box.see(tk.END)
-        self.log_box.config(state='disabled')
-
-    def _set_merge_ui_state(self, disabled=False, text="准备就绪", color="gray"):
-        """统一更新合并界面状态"""
-        self.merge_btn.config(state="disabled" if disabled else "normal")
-        self.merge_status.config(text=text, foreground=color)
-        self.root.update_idletasks()
-
-    def update_reload_progress(self, value):
-        """更新重载进度并处理完成状态"""
-        self.reload_progress['value'] = value
-        if value >= 100:
-            self.root.after(100, self.reset_reload_ui)
-        self.root.update_idletasks()
-
-    def reset_reload_ui(self):
-        """重置重载界面状态"""
-        self.reload_progress['value'] = 0
-        self.toggle_reload_buttons(True)
-        self.reload_running = False
-
-    def update_download_progress(self, value):
-        self.download_progress['value'] = value
-        if value >= 100:
-            self.root.after(100, lambda: self.download_progress.configure(value=0))
-            self.toggle_buttons(self.download_btn, self.stop_download_btn, True)
-            self.download_running = False
-        self.root.update_idletasks()
-
-    def stop_download(self):
-        self.download_stop_event.set()
-        self.toggle_buttons(self.download_btn, self.stop_download_btn, True)
-        self.download_progress['value'] = 0
-        self.download_running = False
-
-    def start_reload(self):
-        if self.reload_running:
-            messagebox.showwarning("警告", "当前有重载任务正在运行")
-            return
-
-        # 手机模式验证
-        if self.device_var.get() == "phone":
-            phone_file = self.phone_file_entry.get().strip()
-            if not phone_file:
-                messagebox.showerror("错误", "请选择手机缓存文件")
-                return
-            if not os.path.isfile(phone_file):
-                messagebox.showerror("错误", "选择的文件不存在")
-                return
-
-        self.reload_stop_event.clear()
-        quality = next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.reload_quality_var.get())
-
-        self.reload_running = True
-        self.current_reloader = CacheReloader(
-            config=self.config,
-            stop_event=self.reload_stop_event,
-            progress_callback=lambda p: self.root.after(0, self.update_reload_progress, p),  # 修改这里
-            log_callback=lambda msg: logging.getLogger('ReloadModule').info(msg),
-            device_type=self.device_var.get(),
-            phone_file=self.phone_file_entry.get() if self.device_var.get() == "phone" else None,
-            max_threads=self.thread_var.get()
-        )
-
-        reload_thread = threading.Thread(
-            target=self.current_reloader.start_reload,
-            args=(quality,),
-            daemon=True
-        )
-        reload_thread.start()
-        self.toggle_reload_buttons(False)
-
-    def toggle_reload_buttons(self, enable):
-        """切换重载按钮状态"""
-        self.reload_btn.config(state="normal" if enable else "disabled")
-        self.stop_reload_btn.config(state="disabled" if enable else "normal")
-        self.root.update_idletasks()
-
-    def update_reload_progress(self, value):
-        self.reload_progress['value'] = value
-        if value >= 100:
-            self.toggle_reload_buttons(True)
-            self.reload_running = False
-        self.root.update_idletasks()
-
-    def stop_reload(self):
-        self.reload_stop_event.set()
-        if self.current_reloader:
-            self.current_reloader.stop_reload()
-        self.toggle_reload_buttons(True)
-        self.reload_progress['value'] = 0
-        self.reload_running = False
-
-    def start_search(self):
-        keyword = self.search_entry.get().strip()
-        if not keyword:
-            messagebox.showerror("错误", "请输入搜索关键词")
-            return
-
-        self.search_progress['value'] = 0
-        self.search_results.delete(*self.search_results.get_children())
-
-        def search_task():
+            if fingerprint is not None:
+                self.fingerprints.release(fingerprint, output_path if merged else None)
+        self.journal.mark(item.key, "verified", output=output_path.name, size=output_path.stat().st_size)
+        if item.bvid:
+            BilibiliDownloader._record_download(item.bvid, item.folder, item.title)
+        self.log_callback(f"合并完成：{output_path.name}（音频 {result['audio_codec']}：{result['audio_mode']}）")
+        return "success"
+
+    def _reuse_duplicate(self, item, existing, output_path):
+        """条目与已合并的 existing 内容相同：硬链接为本条目的输出，或直接跳过"""
+        with self._lock:
+            self.duplicates += 1
+        if self.duplicate_mode == "skip":
+            self.journal.mark(item.key, "duplicate", duplicate_of=existing)
+            self.log_callback(f"与已合并的 {Path(existing).name} 内容相同，跳过：{item.key}")
+            return "skipped"
+        link_output(existing, output_path)
+        self.journal.mark(item.key, "verified", output=output_path.name, size=output_path.stat().st_size,
+                          duplicate_of=existing)
+        if item.bvid:
+            BilibiliDownloader._record_download(item.bvid, item.folder, item.title)
+        self.log_callback(f"与已合并的 {Path(existing).name} 内容相同，已硬链接：{output_path.name}")
+        return "success"
+
+    def _remove_stale_temps(self):
+        """删除上次重载中断时留下的临时文件（只删记录里属于本来源、且未完成的条目的文件）"""
+        for name in self.journal.stale_temps():
+            path = Path(self.output_dir) / name
+            if not path.name.endswith(f"{TEMP_SUFFIX}.mp4") or path.parent != Path(self.output_dir):
+                continue
+            try:
+                path.unlink()
+                self.log_callback(f"已删除上次中断留下的临时文件：{path.name}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.log_callback(f"无法删除临时文件 {path.name}：{str(e)}")
+
+    def _run_item(self, item, quality, submitted=None):
+        """submitted 为提交到线程池的时间（perf_counter），时间线上记录排队等待了多久"""
+        with tracer.span("reload_item", "reload", key=item.key, bvid=item.bvid) as span:
+            if submitted is not None:
+                span.set(queued_ms=round((time.perf_counter() - submitted) * 1000, 3))
             try:
-                results = AdvancedSearchEngine.search_cache(
-                    keyword=keyword,
-                    progress_callback=lambda p: self.root.after(0, lambda: self.search_progress.configure(value=p)),
-                    cache_root=self.config['cache_root']
-                )
-                self.root.after(0, lambda: self.display_results(results))
+                status = self._process(item, quality)
+            except InterruptedError:
+                status = "cancelled"
             except Exception as e:
-                self.log_message(f"搜索错误: {str(e)}")
-            finally:
-                self.root.after(0, self.finish_search)
-
-        threading.Thread(target=search_task, daemon=True).start()
-
-    def display_results(self, results):
-        for result in results:
-            self.search_results.insert('', 'end', values=(result['title'], result['path'], result['bvid']))
-        self.log_message(f"找到 {len(results)} 个匹配结果")
-
-    def finish_search(self):
-        self.search_progress['value'] = 100
-        self.root.after(1000, lambda: self.search_progress.configure(value=0))
-
-    def toggle_buttons(self, start_btn, stop_btn, enable):
-        start_btn.config(state="normal" if enable else "disabled")
-        stop_btn.config(state="disabled" if enable else "normal")
-        self.root.update_idletasks()
-
-    def log_message(self, msg):
-        self.log_text.config(state='normal')
-        self.log_text.insert(tk.END, msg + "\n")
-        self.log_text.see(tk.END)
-        self.log_text.config(state='disabled')
-
-    def load_config(self):
-        config_path = Path('config.json')
-        if config_path.exists():
-            with open(config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {'cache_root': '', 'output_dir': '', 'sessdata': ''}
-
-    def save_config(self):
-        config = {
-            'cache_root': self.cache_entry.get(),
-            'output_dir': self.output_entry.get(),
-            'sessdata': self.sessdata_entry.get(),
-            'thread_count': self.thread_var.get(),
-            'download_quality': next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.quality_var.get()),
-            'reload_quality': next(q[1] for q in self.QUALITY_OPTIONS if q[0] == self.reload_quality_var.get())
-        }
-        with open('config.json', 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2)
-        self.config = config
-        messagebox.showinfo("成功", "配置已保存")
-
-    def select_dir(self, entry):
-        path = filedialog.askdirectory()
-        if path:
-            entry.delete(0, tk.END)
-            entry.insert(0, path)
-
-    def open_download_records(self):
-        record_file = Path(__file__).parent / "downloaded.txt"
-        try:
-            if record_file.exists():
-                if os.name == 'nt':
-                    os.startfile(record_file)
-                else:
-                    opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
-                    subprocess.call([opener, str(record_file)])
-            else:
-                messagebox.showinfo("提示", "暂无下载记录")
-        except Exception as e:
-            messagebox.showerror("错误", f"打开文件失败：{str(e)}")
-
-    def open_error_logs(self):
-        error_file = Path(__file__).parent / "errors.log"
-        try:
-            if error_file.exists():
-                if os.name == 'nt':
-                    os.startfile(error_file)
-                else:
-                    opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
-                    subprocess.call([opener, str(error_file)])
-            else:
-                messagebox.showinfo("提示", "暂无错误记录")
-        except Exception as e:
-            messagebox.showerror("错误", f"打开文件失败：{str(e)}")
-
-    def open_selected_folder(self):
-        selected = self.search_results.selection()
-        if not selected:
-            return
+                status = "failed"
+                self.journal.mark(item.key, "failed", error=str(e))
+                self.log_callback(f"重载失败 {item.key}：{str(e)}")
+                BilibiliDownloader._log_error(item.bvid, item.title, f"重载失败: {str(e)}")
+            span.set(status=status)
+        if status != "cancelled":
+            self._report(status)
+        return status
+
+    def start_reload(self, quality):
+        """阻塞执行整个重载流程，由调用方放在后台线程中运行"""
         try:
-            folder_name = self.search_results.item(selected[0])['values'][1]
-            cache_root = self.config.get('cache_root', '')
-            full_path = Path(cache_root) / folder_name
+            self.log_callback("正在扫描缓存...")
+            items = self.discover(quality)
+            self.total = len(items)
+            self.log_callback(f"共发现 {self.total} 个缓存视频，使用 {self.max_threads} 个线程重载")
+            Path(self.output_dir).mkdir(parents=True, exist_ok=True)
+
+            source = self.phone_file if self.device_type == "phone" else self.cache_root
+            self.journal = ReloadJournal(ReloadJournal.path_for(self.output_dir, self.device_type, source))
+            verified = sum(1 for item in items if (self.journal.get(item.key) or {}).get("state") == "verified")
+            if verified:
+                self.log_callback(f"断点记录：{verified} 个已完成的条目将被跳过")
+            self._remove_stale_temps()
+            self.journal.mark_pending(item.key for item in items)
+            if self.duplicate_mode != "off":
+                self.fingerprints = BilibiliDownloader.get_fingerprint_index()
+
+            # 只保持有限个任务在途，停止时尚未提交的任务直接丢弃
+            pending = iter(items)
+            running = set()
+            with ThreadPoolExecutor(max_workers=self.max_threads, thread_name_prefix="reload") as pool:
+                while True:
+                    while not self.stop_event.is_set() and len(running) < self.max_threads * 2:
+                        item = next(pending, None)
+                        if item is None:
+                            break
+                        running.add(pool.submit(self._run_item, item, quality, time.perf_counter()))
+                    if not running:
+                        break
+                    _, running = wait(running, timeout=0.5, return_when=FIRST_COMPLETED)
 
-            if full_path.exists():
-                os.startfile(str(full_path))  # 打开缓存目录
+            if self.stop_event.is_set():
+                self.log_callback(f"重载已停止：完成 {self.succeeded}，跳过 {self.skipped}，失败 {self.failed}")
             else:
-                messagebox.showerror("错误", f"缓存目录不存在：{full_path}")
-        except Exception as e:
-            messagebox.showerror("错误", f"打开失败：{str(e)}")
-            logging.error(f"打开目录失败：{str(e)}")
-
-    def rename_title(self):
-        selected = self.search_results.selection()
-        if not selected:
-            return
-
-        item = self.search_results.item(selected[0])
-        bvid = item['values'][2]
-        old_title = item['values'][0]
-
-        new_title = simpledialog.askstring(
-            "重命名标题",
-            "请输入新的视频标题：",
-            initialvalue=old_title,
-            parent=self.root
-        )
-
-        if new_title and new_title != old_title:
-            try:
-                record_file = Path(__file__).parent / "downloaded.txt"
-                updated_lines = []
-                with open(record_file, "r", encoding="utf-8") as f:
-                    for line in f:
-                        if line.startswith(bvid):
-                            parts = line.strip().split("|")
-                            if len(parts) >= 3:
-                                updated_line = f"{parts[0]}|{parts[1]}|{new_title}\n"
-                                updated_lines.append(updated_line)
-                            else:
-                                updated_lines.append(line)
-                        else:
-                            updated_lines.append(line)
-                with open(record_file, "w", encoding="utf-8") as f:
-                    f.writelines(updated_lines)
-                self.search_results.item(selected[0], values=(new_title, item['values'][1], bvid))
-                logging.getLogger("SearchModule").info(f"成功重命名：{bvid} -> {new_title}")
-            except Exception as e:
-                messagebox.showerror("错误", f"重命名失败：{str(e)}")
-                logging.getLogger("SearchModule").error(f"重命名失败：{str(e)}")
-
-    def delete_record(self):
-        selected = self.search_results.selection()
-        if not selected:
-            return
-
-        bvid = self.search_results.item(selected[0])['values'][2]
-        if not messagebox.askyesno("确认删除", f"确定要删除 BV号 {bvid} 的记录吗？", parent=self.root):
-            return
-
-        try:
-            record_file = Path(__file__).parent / "downloaded.txt"
-            remaining_lines = []
-            with open(record_file, "r", encoding="utf-8") as f:
-                for line in f:
-                    if not line.startswith(bvid):
-                        remaining_lines.append(line)
-            with open(record_file, "w", encoding="utf-8") as f:
-                f.writelines(remaining_lines)
-            self.search_results.delete(selected[0])
-            logging.getLogger("SearchModule").info(f"成功删除记录：{bvid}")
+                self.log_callback(f"重载完成：成功 {self.succeeded}，跳过 {self.skipped}，失败 {self.failed}")
         except Exception as e:
-            messagebox.showerror("错误", f"删除失败：{str(e)}")
-            logging.getLogger("SearchModule").error(f"删除记录失败：{str(e)}")
-
-    def show_context_menu(self, event):
-        try:
-            self.context_menu.tk_popup(event.x_root, event.y_root)
+            self.log_callback(f"重载出错：{str(e)}")
+            reload_logger.exception("重载出错")
         finally:
-            self.context_menu.grab_release()
-
-    def start_log_poller(self):
-        def poller():
-            while True:
-                try:
-                    msg = self.log_queue.get(timeout=0.1)
-                    self.log_message(msg)
-                except queue.Empty:
-                    if not self.root.winfo_exists():
-                        break
+            if self.journal is not None:
+                self.journal.close()
+            self.progress_callback(100)
 
-        threading.Thread(target=poller, daemon=True).start()
-
-    def on_close(self):
-        self.download_stop_event.set()
-        self.reload_stop_event.set()
-        self.root.destroy()
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    app = BilibiliToolkitGUI(root)
-    root.mainloop()
+    def stop_reload(self):
+        """停止重载：不再提交新任务，正在运行的 ffmpeg 会被终止"""
+        self.stop_event.set()
@@ -0,0 +1,469 @@
+import os
+import struct
+import sys
+from array import array
+from itertools import groupby
+
+from merge_module import ZERO_PREFIX, has_zero_prefix, _iter_boxes
+
+'''
+纯 Python 的 m4s 重封装：把B站 DASH 的分片 MP4（moov + 若干 moof/mdat）合并为普通 MP4，不依赖 ffmpeg
+第一遍只读取 moov/moof（跳过 mdat），把各分片的 trun 汇总成完整的样本表；
+第二遍按解码时间交错复制媒体数据，输出 ftyp + moov + mdat（moov 在前，无需 faststart 二次处理）
+内存占用只与样本数有关（每个样本约十几字节），媒体数据按固定大小的缓冲区复制
+'''
+
+COPY_BUFFER = 1024 * 1024
+MOVIE_TIMESCALE = 1000
+MATRIX = struct.pack('>9I', 0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000)
+NON_SYNC_SAMPLE = 0x00010000
+
+# tfhd / trun 的标志位
+TFHD_BASE_DATA_OFFSET = 0x000001
+TFHD_SAMPLE_DESCRIPTION_INDEX = 0x000002
+TFHD_DEFAULT_DURATION = 0x000008
+TFHD_DEFAULT_SIZE = 0x000010
+TFHD_DEFAULT_FLAGS = 0x000020
+TFHD_DEFAULT_BASE_IS_MOOF = 0x020000
+TRUN_DATA_OFFSET = 0x000001
+TRUN_FIRST_SAMPLE_FLAGS = 0x000004
+TRUN_DURATION = 0x000100
+TRUN_SIZE = 0x000200
+TRUN_FLAGS = 0x000400
+TRUN_CTS = 0x000800
+
+
+class RemuxError(Exception):
+    """输入无法直接重封装（不是分片 MP4、数据越界等），调用方可改用 ffmpeg"""
+
+
+class _Track:
+    """一条输入轨道：原样保留的描述 box 与从各分片汇总的样本表"""
+
+    def __init__(self, path):
+        self.path = path
+        self.track_id = None
+        self.handler = None
+        self.timescale = MOVIE_TIMESCALE
+        self.language = 0x55c4  # 'und'
+        self.volume = 0
+        self.size_fields = bytes(8)  # tkhd 中 16.16 定点的宽、高
+        self.hdlr = None
+        self.media_header = None
+        self.dinf = None
+        self.stsd = None
+        self.edits = []  # 源 elst：(片段时长（影片时间刻度）, 媒体起点（-1 为空片段）)
+        self.defaults = (1, 0, 0, 0)  # trex：样本描述序号、时长、大小、标志
+        self.sizes = array('I')
+        self.durations = array('I')
+        self.cts = array('i')
+        self.has_cts = False
+        self.sync = array('I')  # 关键帧的样本序号（从1开始）
+        self.has_non_sync = False
+        self.chunks = []  # (源文件偏移, 样本数, 字节数, 起始解码时间)
+        self.decode_time = 0
+
+    @property
+    def codec(self):
+        return self.stsd[20:24].decode('latin-1') if self.stsd and len(self.stsd) >= 24 else None
+
+
+def _children(data, start, end):
+    """遍历内存中 [start, end) 范围内的 box，产出 (类型, box起点, 内容起点, box终点)"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size or pos + size > end:
+            raise RemuxError(f"box 长度错误：{kind!r}")
+        yield kind, pos, pos + header_size, pos + size
+        pos += size
+
+
+def _box(kind, *payloads):
+    data = b''.join(payloads)
+    return struct.pack('>I4s', 8 + len(data), kind) + data
+
+
+def _full_box(kind, version, flags, *payloads):
+    return _box(kind, struct.pack('>I', (version << 24) | flags), *payloads)
+
+
+def _be_array(typecode, values):
+    """按大端序打包整数数组"""
+    values = array(typecode, values)
+    if sys.byteorder == 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+# ---------- 读取 ----------
+
+def _parse_trak(data, start, end, track):
+    for kind, box_start, body, stop in _children(data, start, end):
+        if kind == b'tkhd':
+            version = data[body]
+            track.track_id = struct.unpack_from('>I', data, body + (20 if version == 1 else 12))[0]
+            track.volume = struct.unpack_from('>h', data, stop - 48)[0]
+            track.size_fields = data[stop - 8:stop]
+        elif kind == b'mdhd':
+            version = data[body]
+            if version == 1:
+                track.timescale, _, track.language = struct.unpack_from('>IQH', data, body + 20)
+            else:
+                track.timescale, _, track.language = struct.unpack_from('>IIH', data, body + 12)
+        elif kind == b'hdlr':
+            track.hdlr = data[box_start:stop]
+            track.handler = data[body + 8:body + 12].decode('latin-1')
+        elif kind in (b'vmhd', b'smhd', b'sthd', b'nmhd'):
+            track.media_header = data[box_start:stop]
+        elif kind == b'dinf':
+            track.dinf = data[box_start:stop]
+        elif kind == b'stsd':
+            track.stsd = data[box_start:stop]
+        elif kind == b'edts':
+            for child, _, child_body, _ in _children(data, body, stop):
+                if child == b'elst':
+                    track.edits = _parse_elst(data, child_body)
+        elif kind in (b'mdia', b'minf', b'stbl'):
+            _parse_trak(data, body, stop, track)
+
+
+def _parse_elst(data, body):
+    version = data[body]
+    count = struct.unpack_from('>I', data, body + 4)[0]
+    entry = '>Qq4x' if version == 1 else '>Ii4x'
+    return [struct.unpack_from(entry, data, body + 8 + i * struct.calcsize(entry)) for i in range(count)]
+
+
+def _parse_moov(data, path):
+    tracks = {}
+    defaults = {}
+    movie_timescale = MOVIE_TIMESCALE
+    for kind, _, body, stop in _children(data, 0, len(data)):
+        if kind == b'mvhd':
+            movie_timescale = struct.unpack_from('>I', data, body + (20 if data[body] == 1 else 12))[0] or MOVIE_TIMESCALE
+        elif kind == b'trak':
+            track = _Track(path)
+            _parse_trak(data, body, stop, track)
+            if track.track_id is None or track.stsd is None:
+                raise RemuxError(f"轨道信息不完整：{path}")
+            tracks[track.track_id] = track
+        elif kind == b'mvex':
+            for child, _, child_body, _ in _children(data, body, stop):
+                if child == b'trex':
+                    track_id, *values = struct.unpack_from('>5I', data, child_body + 4)
+                    defaults[track_id] = tuple(values)
+    for track_id, values in defaults.items():
+        if track_id in tracks:
+            tracks[track_id].defaults = values
+    # elst 的片段时长按源文件的影片时间刻度记录，换算为输出的 MOVIE_TIMESCALE
+    for track in tracks.values():
+        track.edits = [(duration * MOVIE_TIMESCALE // movie_timescale, media_time)
+                       for duration, media_time in track.edits]
+    return tracks
+
+
+def _parse_trun(data, body, stop, track, defaults, cursor, file_size):
+    """解析一个 trun，把样本追加到轨道的样本表，返回这段数据之后的文件偏移"""
+    flags, count = struct.unpack_from('>II', data, body)
+    flags &= 0xFFFFFF
+    pos = body + 8
+    if flags & TRUN_DATA_OFFSET:
+        cursor = defaults["base"] + struct.unpack_from('>i', data, pos)[0]
+        pos += 4
+    first_flags = None
+    if flags & TRUN_FIRST_SAMPLE_FLAGS:
+        first_flags = struct.unpack_from('>I', data, pos)[0]
+        pos += 4
+    if count == 0:
+        return cursor
+
+    fields = [bit for bit in (TRUN_DURATION, TRUN_SIZE, TRUN_FLAGS, TRUN_CTS) if flags & bit]
+    width = len(fields)
+    if pos + count * width * 4 > stop:
+        raise RemuxError("trun 样本数据不完整")
+    flat = struct.unpack_from(f'>{count * width}I', data, pos) if width else ()
+    columns = {bit: flat[i::width] for i, bit in enumerate(fields)}
+
+    first_index = len(track.sizes) + 1
+    if TRUN_DURATION in columns:
+        track.durations.extend(columns[TRUN_DURATION])
+    else:
+        track.durations.extend(array('I', [defaults["duration"]]) * count)
+    if TRUN_SIZE in columns:
+        sizes = array('I', columns[TRUN_SIZE])
+    else:
+        sizes = array('I', [defaults["size"]]) * count
+    track.sizes.extend(sizes)
+    if TRUN_CTS in columns:
+        # version 1 的偏移为有符号数，按位重新解释
+        offsets = array('i', array('I', columns[TRUN_CTS]).tobytes())
+        track.cts.extend(offsets)
+        track.has_cts = track.has_cts or any(offsets)
+    else:
+        track.cts.extend(array('i', [0]) * count)
+
+    if TRUN_FLAGS in columns:
+        sample_flags = columns[TRUN_FLAGS]
+    else:
+        sample_flags = [defaults["flags"]] * count
+        if first_flags is not None:
+            sample_flags[0] = first_flags
+    sync = [first_index + i for i, value in enumerate(sample_flags) if not value & NON_SYNC_SAMPLE]
+    track.has_non_sync = track.has_non_sync or len(sync) < count
+    track.sync.extend(sync)
+
+    nbytes = sum(sizes)
+    if cursor < 0 or cursor + nbytes > file_size:
+        raise RemuxError("样本数据超出文件范围")
+    start_time = track.decode_time / track.timescale
+    track.chunks.append((cursor, count, nbytes, start_time))
+    track.decode_time += sum(track.durations[first_index - 1:])
+    return cursor + nbytes
+
+
+def _parse_moof(data, moof_pos, tracks, file_size, start=0):
+    """
+    moof_pos 为 moof 在文件中的绝对位置；start 为前导零的长度，
+    tfhd 中显式的 base_data_offset 相对去掉前导零后的文件，要加上 start 才是绝对位置
+    """
+    previous_end = moof_pos
+    for kind, _, body, stop in _children(data, 0, len(data)):
+        if kind != b'traf':
+            continue
+        track = None
+        defaults = {}
+        cursor = None
+        for child, _, child_body, child_stop in _children(data, body, stop):
+            if child == b'tfhd':
+                flags, track_id = struct.unpack_from('>II', data, child_body)
+                flags &= 0xFFFFFF
+                track = tracks.get(track_id)
+                if track is None:
+                    raise RemuxError(f"分片引用了不存在的轨道：{track_id}")
+                _, duration, size, sample_flags = track.defaults
+                pos = child_body + 8
+                base = previous_end
+                if flags & TFHD_BASE_DATA_OFFSET:
+                    base = start + struct.unpack_from('>Q', data, pos)[0]
+                    pos += 8
+                elif flags & TFHD_DEFAULT_BASE_IS_MOOF:
+                    base = moof_pos
+                if flags & TFHD_SAMPLE_DESCRIPTION_INDEX:
+                    pos += 4
+                if flags & TFHD_DEFAULT_DURATION:
+                    duration = struct.unpack_from('>I', data, pos)[0]
+                    pos += 4
+                if flags & TFHD_DEFAULT_SIZE:
+                    size = struct.unpack_from('>I', data, pos)[0]
+                    pos += 4
+                if flags & TFHD_DEFAULT_FLAGS:
+                    sample_flags = struct.unpack_from('>I', data, pos)[0]
+                defaults = {"base": base, "duration": duration, "size": size, "flags": sample_flags}
+                cursor = base
+            elif child == b'trun':
+                if track is None:
+                    raise RemuxError("trun 出现在 tfhd 之前")
+                cursor = _parse_trun(data, child_body, child_stop, track, defaults, cursor, file_size)
+        if cursor is not None:
+            previous_end = cursor
+
+
+def read_fragments(path):
+    """
+    读取一个分片 MP4 的轨道描述与全部样本表，跳过前导9个零；只读取 moov/moof，不读取媒体数据
+    返回 _Track 列表
+    """
+    start = len(ZERO_PREFIX) if has_zero_prefix(path) else 0
+    file_size = os.path.getsize(path)
+    tracks = None
+    with open(path, 'rb') as f:
+        # 顶层 box 首尾相接，上一个 box 的终点即下一个 box 的起点（moof 的基准偏移）
+        next_start = start
+        for kind, body, stop in _iter_boxes(f, start, file_size):
+            box_start, next_start = next_start, stop
+            if kind not in (b'moov', b'moof'):
+                continue
+            f.seek(body)
+            data = f.read(stop - body)
+            if kind == b'moov':
+                tracks = _parse_moov(data, path)
+            elif tracks is None:
+                raise RemuxError(f"moof 出现在 moov 之前：{path}")
+            else:
+                _parse_moof(data, box_start, tracks, file_size, start)
+    if not tracks:
+        raise RemuxError(f"未找到 moov：{path}")
+    tracks = [t for t in tracks.values() if t.sizes]
+    if not tracks:
+        raise RemuxError(f"没有分片样本（不是 DASH 分片 MP4）：{path}")
+    return tracks
+
+
+# ---------- 写出 ----------
+
+def _stbl(track, chunk_offsets, co64):
+    stts = [(len(list(group)), value) for value, group in groupby(track.durations)]
+    boxes = [
+        track.stsd,
+        _full_box(b'stts', 0, 0, struct.pack('>I', len(stts)), _be_array('I', [v for entry in stts for v in entry])),
+    ]
+    if track.has_cts:
+        ctts = [(len(list(group)), value) for value, group in groupby(track.cts)]
+        version = 1 if any(value < 0 for _, value in ctts) else 0
+        packed = b''.join(struct.pack('>Ii' if version else '>II', count, value) for count, value in ctts)
+        boxes.append(_full_box(b'ctts', version, 0, struct.pack('>I', len(ctts)), packed))
+    if track.has_non_sync:
+        boxes.append(_full_box(b'stss', 0, 0, struct.pack('>I', len(track.sync)), _be_array('I', track.sync)))
+
+    stsc = []
+    for index, (_, count, _, _) in enumerate(track.chunks, 1):
+        if not stsc or stsc[-1][1] != count:
+            stsc.append((index, count, track.defaults[0] or 1))
+    boxes.append(_full_box(b'stsc', 0, 0, struct.pack('>I', len(stsc)),
+                           _be_array('I', [v for entry in stsc for v in entry])))
+
+    if track.sizes and track.sizes.count(track.sizes[0]) == len(track.sizes):
+        boxes.append(_full_box(b'stsz', 0, 0, struct.pack('>II', track.sizes[0], len(track.sizes))))
+    else:
+        boxes.append(_full_box(b'stsz', 0, 0, struct.pack('>II', 0, len(track.sizes)), _be_array('I', track.sizes)))
+    if co64:
+        boxes.append(_full_box(b'co64', 0, 0, struct.pack('>I', len(chunk_offsets)), _be_array('Q', chunk_offsets)))
+    else:
+        boxes.append(_full_box(b'stco', 0, 0, struct.pack('>I', len(chunk_offsets)), _be_array('I', chunk_offsets)))
+    return _box(b'stbl', *boxes)
+
+
+def _edit_list(track, media_duration):
+    """
+    输出轨道的编辑列表：沿用源 elst（空片段保留，媒体片段的时长按合并后的总时长重算）；
+    源文件没有 elst 但有B帧时，按第一个样本的合成时间偏移生成，保证视频与音频同时开始
+    返回 (edts box 或 b'', 轨道时长（MOVIE_TIMESCALE）)
+    """
+    edits = [(duration, -1) for duration, media_time in track.edits if media_time == -1]
+    media_time = next((media_time for _, media_time in track.edits if media_time != -1), None)
+    if media_time is None:
+        media_time = track.cts[0] if track.has_cts and track.cts and track.cts[0] > 0 else 0
+    if not edits and media_time == 0:
+        return b'', media_duration * MOVIE_TIMESCALE // track.timescale
+    edits.append((max(media_duration - media_time, 0) * MOVIE_TIMESCALE // track.timescale, media_time))
+    version = 1 if any(duration > 0xFFFFFFFF or media_time > 0x7FFFFFFF for duration, media_time in edits) else 0
+    entry = '>QqHH' if version else '>IiHH'
+    elst = _full_box(b'elst', version, 0, struct.pack('>I', len(edits)),
+                     *(struct.pack(entry, duration, media_time, 1, 0) for duration, media_time in edits))
+    return _box(b'edts', elst), sum(duration for duration, _ in edits)
+
+
+def _trak(track, track_id, chunk_offsets, co64):
+    media_duration = sum(track.durations)
+    edts, duration = _edit_list(track, media_duration)
+    tkhd = _full_box(
+        b'tkhd', 0, 3,
+        struct.pack('>IIIII', 0, 0, track_id, 0, duration), bytes(8),
+        struct.pack('>hhhH', 0, 0, track.volume, 0), MATRIX, track.size_fields
+    )
+    if media_duration > 0xFFFFFFFF:
+        mdhd = _full_box(b'mdhd', 1, 0, struct.pack('>QQIQHH', 0, 0, track.timescale, media_duration, track.language, 0))
+    else:
+        mdhd = _full_box(b'mdhd', 0, 0, struct.pack('>IIIIHH', 0, 0, track.timescale, media_duration, track.language, 0))
+    if track.media_header:
+        media_header = track.media_header
+    elif track.handler == 'vide':
+        media_header = _full_box(b'vmhd', 0, 1, bytes(8))
+    else:
+        media_header = _full_box(b'smhd', 0, 0, bytes(4))
+    dinf = track.dinf or _box(b'dinf', _full_box(b'dref', 0, 0, struct.pack('>I', 1), _full_box(b'url ', 0, 1)))
+    minf = _box(b'minf', media_header, dinf, _stbl(track, chunk_offsets, co64))
+    return _box(b'trak', tkhd, edts, _box(b'mdia', mdhd, track.hdlr, minf)), duration
+
+
+def _moov(tracks, offsets, co64):
+    traks = []
+    movie_duration = 0
+    for track_id, (track, chunk_offsets) in enumerate(zip(tracks, offsets), 1):
+        trak, duration = _trak(track, track_id, chunk_offsets, co64)
+        traks.append(trak)
+        movie_duration = max(movie_duration, duration)
+    mvhd = _full_box(
+        b'mvhd', 0, 0,
+        struct.pack('>IIIIIH', 0, 0, MOVIE_TIMESCALE, movie_duration, 0x00010000, 0x0100),
+        bytes(10), MATRIX, bytes(24), struct.pack('>I', len(tracks) + 1)
+    )
+    return _box(b'moov', mvhd, *traks)
+
+
+def remux_m4s(video_path, audio_path, output_path, stop_event=None):
+    """
+    把视频、音频两个分片 m4s 重封装为一个 MP4（流复制，不转码），自动跳过前导9个零
+    输入不是分片 MP4 时抛出 RemuxError；stop_event 置位时删除未完成的输出并抛出 InterruptedError
+    返回 {"video_codec", "audio_codec"}
+    """
+    tracks = read_fragments(video_path) + read_fragments(audio_path)
+    tracks.sort(key=lambda t: t.handler != 'vide')
+
+    # 按解码时间交错排列各轨道的数据块
+    layout = sorted(
+        ((chunk[3], index, chunk) for index, track in enumerate(tracks) for chunk in track.chunks),
+        key=lambda item: (item[0], item[1])
+    )
+    payload = sum(chunk[2] for _, _, chunk in layout)
+
+    ftyp = _box(b'ftyp', b'isom', struct.pack('>I', 512), b'isomiso2avc1mp41')
+    mdat_header_size = 16 if payload + 8 > 0xFFFFFFFF else 8
+    placeholder = [[0] * len(t.chunks) for t in tracks]
+    co64 = False
+    moov_size = len(_moov(tracks, placeholder, co64))
+    if len(ftyp) + moov_size + mdat_header_size + payload > 0xFFFFFFFF:
+        co64 = True
+        moov_size = len(_moov(tracks, placeholder, co64))
+
+    # moov 的长度与块偏移的取值无关，先算出长度再填入真实偏移
+    offsets = [[] for _ in tracks]
+    position = len(ftyp) + moov_size + mdat_header_size
+    for _, index, chunk in layout:
+        offsets[index].append(position)
+        position += chunk[2]
+    moov = _moov(tracks, offsets, co64)
+
+    sources = {}
+    try:
+        for track in tracks:
+            if track.path not in sources:
+                sources[track.path] = open(track.path, 'rb')
+        with open(output_path, 'wb') as out:
+            out.write(ftyp)
+            out.write(moov)
+            if mdat_header_size == 16:
+                out.write(struct.pack('>I4sQ', 1, b'mdat', payload + 16))
+            else:
+                out.write(struct.pack('>I4s', payload + 8, b'mdat'))
+            buffer = memoryview(bytearray(COPY_BUFFER))
+            for _, index, (offset, _, nbytes, _) in layout:
+                if stop_event is not None and stop_event.is_set():
+                    raise InterruptedError("合并已取消")
+                source = sources[tracks[index].path]
+                source.seek(offset)
+                while nbytes:
+                    read = source.readinto(buffer[:min(nbytes, COPY_BUFFER)])
+                    if not read:
+                        raise RemuxError(f"源文件被截断：{tracks[index].path}")
+                    out.write(buffer[:read])
+                    nbytes -= read
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    finally:
+        for source in sources.values():
+            source.close()
+
+    return {
+        "video_codec": next((t.codec for t in tracks if t.handler == 'vide'), None),
+        "audio_codec": next((t.codec for t in tracks if t.handler == 'soun'), None),
+    }
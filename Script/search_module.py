@@ -1,49 +1,324 @@
+import bisect
 import logging
+import sqlite3
+import threading
+import time
 from pathlib import Path
 
+from metrics_module import SEARCH_RESULTS_TOTAL, metrics
+
+# 搜索结果每行的字段顺序，与结果列表的列一致
+RESULT_COLUMNS = ("title", "path", "bvid")
+
+
+class RecordSearchIndex:
+    """
+    下载记录的 trigram 倒排索引（SQLite FTS5，外部内容表）
+    - 与记录表位于同一数据库，由触发器在写入的同一事务中增量维护
+    - 长度 >= 3 的关键词走索引：FTS5 对各 trigram 的倒排表求交集，只返回候选记录
+    - 更短的关键词用 LIKE 在记录表上做 C 层扫描
+    候选记录最后都会按原有的小写子串规则再校验一次
+    """
+
+    SCHEMA = """
+        CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+            bvid, folder, title,
+            content='records', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS records_fts_ai AFTER INSERT ON records BEGIN
+            INSERT INTO records_fts (rowid, bvid, folder, title)
+            VALUES (new.id, new.bvid, new.folder, new.title);
+        END;
+        CREATE TRIGGER IF NOT EXISTS records_fts_ad AFTER DELETE ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, bvid, folder, title)
+            VALUES ('delete', old.id, old.bvid, old.folder, old.title);
+        END;
+        CREATE TRIGGER IF NOT EXISTS records_fts_au AFTER UPDATE ON records BEGIN
+            INSERT INTO records_fts (records_fts, rowid, bvid, folder, title)
+            VALUES ('delete', old.id, old.bvid, old.folder, old.title);
+            INSERT INTO records_fts (rowid, bvid, folder, title)
+            VALUES (new.id, new.bvid, new.folder, new.title);
+        END;
+    """
+
+    MIN_INDEXED_LENGTH = 3
+
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), timeout=30, check_same_thread=False)
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'records_fts'"
+        ).fetchone()
+        self._conn.executescript(self.SCHEMA)
+        if not exists:
+            logging.getLogger('SearchModule').info("正在建立搜索索引...")
+            with self._conn:
+                self._conn.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
+
+    FETCH_SIZE = 1000
+
+    def _iter_query(self, query, args=()):
+        """分块读取查询结果，每块单独加锁，避免长时间占用连接"""
+        with self._lock:
+            cursor = self._conn.execute(query, args)
+            rows = cursor.fetchmany(self.FETCH_SIZE)
+        while rows:
+            yield from rows
+            with self._lock:
+                rows = cursor.fetchmany(self.FETCH_SIZE)
+
+    def max_id(self):
+        with self._lock:
+            return self._conn.execute("SELECT MAX(id) FROM records").fetchone()[0] or 0
+
+    def scan(self):
+        """按写入顺序遍历全部 (id, bvid, folder, title)"""
+        return self._iter_query("SELECT id, bvid, folder, title FROM records ORDER BY id")
+
+    def candidates(self, keyword):
+        """
+        按写入顺序返回可能包含关键词的 (id, bvid, folder, title)
+        无法用索引/LIKE 精确筛选时返回 None，由调用方全量扫描
+        """
+        if len(keyword) >= self.MIN_INDEXED_LENGTH:
+            query = (
+                "SELECT r.id, r.bvid, r.folder, r.title FROM records_fts f "
+                "JOIN records r ON r.id = f.rowid WHERE records_fts MATCH ? ORDER BY f.rowid"
+            )
+            args = ('"' + keyword.replace('"', '""') + '"',)
+        elif keyword.isascii() or keyword.upper() == keyword.lower():
+            # SQLite 的 LIKE 只对 ASCII 做大小写折叠
+            pattern = "%" + keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            query = (
+                "SELECT id, bvid, folder, title FROM records WHERE "
+                "bvid LIKE ?1 ESCAPE '\\' OR folder LIKE ?1 ESCAPE '\\' OR title LIKE ?1 ESCAPE '\\' "
+                "ORDER BY id"
+            )
+            args = (pattern,)
+        else:
+            return None
+        return self._iter_query(query, args)
+
+
+class ProgressThrottle:
+    """
+    限制进度回调频率：百分比至少变化 step 且距上次回调至少 interval 秒才会回调，
+    100% 总是回调一次
+    """
+
+    def __init__(self, callback, interval=0.1, step=1):
+        self.callback = callback
+        self.interval = interval
+        self.step = step
+        self._last_value = -step
+        self._last_time = 0.0
+
+    def update(self, value):
+        if self.callback is None:
+            return
+        now = time.monotonic()
+        if value >= 100:
+            if self._last_value < 100:
+                self._last_value = 100
+                self.callback(100)
+            return
+        if value - self._last_value >= self.step and now - self._last_time >= self.interval:
+            self._last_value = value
+            self._last_time = now
+            self.callback(value)
+
+
+class SearchResultStore:
+    """
+    搜索结果的列式存储：每列一个字符串列表，行号为列表下标，删除只从 order 中移除，行号保持不变
+    order 为按排序列升序排列的行号列表（未排序时为追加顺序），倒序只是反向读取；
+    排序键（小写）按行号缓存，排序后追加的少量结果二分插入，不重新排序
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.columns = {name: [] for name in RESULT_COLUMNS}
+        self.order = []
+        self.sort_column = None
+        self.sort_reverse = False
+        self._keys = None
+
+    def __len__(self):
+        return len(self.order)
+
+    def extend(self, rows):
+        """追加 (title, path, bvid) 元组"""
+        first = len(self.columns["title"])
+        for name, values in zip(RESULT_COLUMNS, zip(*rows)):
+            self.columns[name].extend(values)
+        new_ids = range(first, first + len(rows))
+        if self._keys is None:
+            self.order.extend(new_ids)
+            return
+        self._keys.extend(value.lower() for value in self.columns[self.sort_column][first:])
+        if len(rows) * 32 < len(self.order):
+            for row_id in new_ids:
+                bisect.insort(self.order, row_id, key=self._keys.__getitem__)
+        else:
+            self.order.extend(new_ids)
+            self.order.sort(key=self._keys.__getitem__)
+
+    def row(self, row_id):
+        return tuple(self.columns[name][row_id] for name in RESULT_COLUMNS)
+
+    def row_id_at(self, pos):
+        return self.order[-1 - pos] if self.sort_reverse else self.order[pos]
+
+    def ordered(self):
+        """按显示顺序遍历行号"""
+        return reversed(self.order) if self.sort_reverse else iter(self.order)
+
+    def window(self, start, stop):
+        """显示顺序中 [start, stop) 范围内的 (行号, 行) 列表"""
+        if self.sort_reverse:
+            total = len(self.order)
+            row_ids = self.order[max(0, total - stop):max(0, total - start)][::-1]
+        else:
+            row_ids = self.order[start:stop]
+        return [(row_id, self.row(row_id)) for row_id in row_ids]
+
+    def sort(self, column, reverse=False):
+        if column != self.sort_column:
+            self._keys = [value.lower() for value in self.columns[column]]
+            self.order.sort(key=self._keys.__getitem__)
+            self.sort_column = column
+        self.sort_reverse = reverse
+
+    def set_value(self, row_id, column, value):
+        self.columns[column][row_id] = value
+        if column == self.sort_column:
+            self._keys[row_id] = value.lower()
+            if row_id in self.order:
+                self.order.remove(row_id)
+                bisect.insort(self.order, row_id, key=self._keys.__getitem__)
+
+    def remove(self, row_ids):
+        row_ids = set(row_ids)
+        self.order = [row_id for row_id in self.order if row_id not in row_ids]
+
 
 class AdvancedSearchEngine:
+    _index = None
+    _index_lock = threading.Lock()
+
     @staticmethod
-    def search_cache(keyword, progress_callback, cache_root:str):
-        """执行缓存搜索（支持BV号/路径/标题）"""
+    def _get_index():
+        """获取共享的搜索索引，当前 SQLite 不支持 FTS5 时返回 None"""
+        from download_module import BilibiliDownloader
+
+        with AdvancedSearchEngine._index_lock:
+            if AdvancedSearchEngine._index is None:
+                try:
+                    # 记录表由存储层创建（并导入旧记录），索引建在其上
+                    BilibiliDownloader.get_record_store()
+                    AdvancedSearchEngine._index = RecordSearchIndex(BilibiliDownloader._get_db_path())
+                except sqlite3.OperationalError as e:
+                    logging.getLogger('SearchModule').warning(f"搜索索引不可用，使用全量扫描：{str(e)}")
+                    AdvancedSearchEngine._index = False
+            return AdvancedSearchEngine._index or None
+
+    @staticmethod
+    def _display_path(folder, cache_root):
+        if folder == "网络":
+            return "网络下载"
+        elif folder[:5] == "文件下载_":
+            return folder
+        return str(Path(cache_root) / folder)
+
+    @staticmethod
+    def _needs_full_scan(keyword, cache_root):
+        """关键词落在缓存根目录或"网络下载"这类展示前缀上时，索引里的原始字段无法判断"""
+        prefix = str(Path(cache_root) / "_")[:-1].lower()
+        for display in (prefix, "网络下载"):
+            if keyword in display:
+                return True
+            if any(display.endswith(keyword[:k]) for k in range(1, len(keyword))):
+                return True
+        return False
+
+    @staticmethod
+    def _iter_records(keyword, cache_root):
+        """返回 (记录迭代器, 进度函数)，进度函数根据当前记录计算百分比"""
+        from download_module import BilibiliDownloader
+
+        index = AdvancedSearchEngine._get_index()
+        if index:
+            max_id = index.max_id() or 1
+            records = None
+            if not AdvancedSearchEngine._needs_full_scan(keyword, cache_root):
+                records = index.candidates(keyword)
+            if records is None:
+                records = index.scan()
+            return records, lambda pos, row: int(row[0] / max_id * 100)
+
+        rows = list(BilibiliDownloader.get_record_store().iter_records())
+        total = len(rows) or 1
+        records = ((pos, *row) for pos, row in enumerate(rows, 1))
+        return records, lambda pos, row: int(pos / total * 100)
+
+    @staticmethod
+    def iter_search(keyword, cache_root: str, progress_callback=None,
+                    batch_size=200, batch_interval=0.05, progress_interval=0.1):
+        """
+        流式搜索：按批次产出结果列表，每条结果为 (title, path, bvid) 元组
+        第一条命中立即产出，之后每满 batch_size 条或距上一批超过 batch_interval 秒产出一批；
+        进度回调经 ProgressThrottle 限频；统计的搜索耗时包含调用方处理各批结果的时间
+        """
+        from download_module import BilibiliDownloader
+
         logging.getLogger('SearchModule').info(f"开始搜索：{keyword}")
-        record_file = Path(__file__).parent / "downloaded.txt"
-        results = []
         keyword = keyword.lower()  # 统一转为小写
+        progress = ProgressThrottle(progress_callback, interval=progress_interval)
+        batch = []
+        first = True
+        last_yield = time.monotonic()
+        found = 0
 
-        try:
-            with open(record_file, "r", encoding="utf-8", errors="ignore") as f:
-                lines = f.readlines()
-                total = len(lines)
-
-                for idx, line in enumerate(lines):
-                    progress = int((idx + 1) / total * 100)
-                    progress_callback(progress)
-
-                    parts = line.strip().split("|")
-                    if len(parts) != 3:
-                        continue
-
-                    bvid, folder, title = parts
-                    if folder == "网络":
-                        full_path = "网络下载"
-                    elif folder[:5] == "文件下载_":
-                        full_path = folder
-                    else:
-                        full_path = str(Path(cache_root) / folder)
+        with metrics.stage("search"):
+            BilibiliDownloader.get_record_store().flush()
+            records, percent = AdvancedSearchEngine._iter_records(keyword, cache_root)
+            try:
+                for pos, row in enumerate(records, 1):
+                    progress.update(percent(pos, row))
+                    _, bvid, folder, title = row
+
+                    full_path = AdvancedSearchEngine._display_path(folder, cache_root)
 
                     # 检查所有字段
                     if (keyword in bvid.lower() or
                             keyword in full_path.lower() or
                             keyword in title.lower()):
-                        results.append({
-                            "bvid": bvid,
-                            "path": full_path,
-                            "title": title
-                        })
-
-        except FileNotFoundError:
-            logging.error("下载记录文件不存在")
+                        batch.append((title, full_path, bvid))
+                    if batch:
+                        now = time.monotonic()
+                        if first or len(batch) >= batch_size or now - last_yield >= batch_interval:
+                            found += len(batch)
+                            yield batch
+                            batch = []
+                            first = False
+                            last_yield = now
+
+                if batch:
+                    found += len(batch)
+                    yield batch
+            finally:
+                metrics.inc(SEARCH_RESULTS_TOTAL, found)
+        progress.update(100)
+
+    @staticmethod
+    def search_cache(keyword, progress_callback, cache_root:str):
+        """执行缓存搜索（支持BV号/路径/标题）"""
+        results = []
+        try:
+            for batch in AdvancedSearchEngine.iter_search(keyword, cache_root, progress_callback):
+                results.extend(dict(zip(RESULT_COLUMNS, row)) for row in batch)
         except Exception as e:
             logging.error(f"搜索失败：{str(e)}")
 
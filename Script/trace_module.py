@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+'''
+任务时间线（Chrome / Perfetto trace，默认关闭）
+下载线程、重载工作线程、合并线程在各任务与阶段的开始/结束处记录区间（带 bvid、文件大小、ffmpeg 进程号等参数），
+写出的 JSON 可直接在 chrome://tracing 或 ui.perfetto.dev 中打开，查看并发任务在时间上如何重叠
+（线程池是否空等、磁盘读写是否被串行化）
+关闭时 span() 直接返回一个共享的空区间，只多一次属性判断
+'''
+
+# 内存中最多保留的事件数，超出后丢弃新事件并计数
+TRACE_MAX_EVENTS = 1_000_000
+
+
+class _Span:
+    """tracer.span() 返回的区间，set 用于在区间内补充参数（例如结束时才知道的进程号、输出大小）"""
+    __slots__ = ("tracer", "name", "cat", "args", "start")
+
+    def __init__(self, tracer, name, cat, args):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer.complete(self.name, self.start, time.perf_counter(), self.cat, self.args)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """线程安全的 trace 事件缓冲区，事件为 Chrome trace 的完整区间（ph="X"），时间单位为微秒"""
+
+    def __init__(self, max_events=TRACE_MAX_EVENTS):
+        self.enabled = False
+        self.max_events = max_events
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._events = []
+        self._threads = {}
+        self._origin = time.perf_counter()
+
+    def enable(self, enabled=True):
+        if enabled and not self.enabled:
+            self._origin = time.perf_counter()
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
+            self._threads.clear()
+            self.dropped = 0
+        self._origin = time.perf_counter()
+
+    def span(self, name, cat="job", **args):
+        """记录一个区间：with tracer.span("merge", "merge", bvid=...) as span: ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, cat, args)
+
+    def complete(self, name, start, end, cat="job", args=None):
+        """直接记录一个区间，start/end 为 time.perf_counter() 的值"""
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        event = {
+            "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": thread.ident,
+            "ts": round((start - self._origin) * 1e6, 3), "dur": round((end - start) * 1e6, 3)
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return
+            self._threads.setdefault(thread.ident, thread.name)
+            self._events.append(event)
+
+    def events(self):
+        """全部事件（含线程名元数据），按开始时间排序"""
+        pid = os.getpid()
+        with self._lock:
+            events = sorted(self._events, key=lambda e: e["ts"])
+            threads = dict(self._threads)
+        meta = [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "BiliBili_Export"}}]
+        meta += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        return meta + events
+
+    def write(self, path):
+        """写出 Chrome trace JSON（先写临时文件再替换）"""
+        import json
+
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": self.events(),
+                "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped}
+            }, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return path
+
+
+# 进程内共享的 tracer
+tracer = Tracer()